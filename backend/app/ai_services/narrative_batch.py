@@ -0,0 +1,140 @@
+"""
+Batch precomputation of /insights/narrative for every active user.
+
+Walks the users with transactions in the last year and generates their
+week/month/year narratives into the persistent narrative cache, which the
+endpoint reads before calling the LLM. Meant to run nightly:
+
+    cd backend
+    python -m app.ai_services.narrative_batch --concurrency 8
+
+- Resumable: a (user, period) whose stored narrative still matches the
+  current fingerprint and is newer than --fresh-hours is skipped, so a
+  rerun after a crash picks up where the last one stopped.
+- Shardable: --shards N --shard i only takes users with id % N == i, run
+  one process per shard.
+- Failed LLM calls are retried --retries times with exponential backoff
+  and jitter; a user that still fails is reported and left for the next run.
+
+Against the local stub LLM:
+
+    python -m benchmarks.fake_gemini --port 8090 --latency 1.0 &
+    API_KEY=fake LLM_BASE_URL=http://127.0.0.1:8090 python -m app.ai_services.narrative_batch
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.ai_services.spending_analysis import narrative_for_user
+from app.database import AsyncSessionLocal
+from app.models.transactions import Transaction
+from app.models.user import User
+from app.src.narrative_cache import PERIOD_DAYS, load_persisted, narrative_fingerprint, period_window, persist
+from app.src.telemetry import current_route
+
+
+async def active_users(shard: int, shards: int) -> list[tuple[int, dict | None]]:
+    """(id, goals) of users with transactions in the longest window, in id order."""
+    since = datetime.utcnow() - timedelta(days=max(PERIOD_DAYS.values()))
+    active = select(Transaction.user_id).where(Transaction.date >= since).distinct()
+    query = select(User.id, User.goals).where(User.id.in_(active)).order_by(User.id)
+    if shards > 1:
+        query = query.where(User.id % shards == shard)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(query)
+        return [(user_id, goals) for user_id, goals in result]
+
+
+async def with_retries(make_call, retries: int, base_delay: float):
+    for attempt in range(retries + 1):
+        try:
+            return await make_call()
+        except Exception as exc:
+            if attempt == retries:
+                raise
+            delay = base_delay * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"  retrying in {delay:.1f}s after {exc!r}")
+            await asyncio.sleep(delay)
+
+
+async def precompute_user(user_id: int, goals: dict | None, args) -> tuple[int, int]:
+    """Returns (generated, skipped) narratives for one user."""
+    generated = skipped = 0
+    async with AsyncSessionLocal() as db:
+        for name in PERIOD_DAYS:
+            time_period, start_date = period_window(name)
+            fingerprint = await narrative_fingerprint(db, user_id, goals, time_period, start_date)
+            key = (user_id, time_period, fingerprint)
+            if await load_persisted(db, key, max_age=args.fresh_hours * 3600) is not None:
+                skipped += 1
+                continue
+            narrative = await with_retries(
+                lambda: narrative_for_user(db, user_id, goals, time_period, start_date),
+                args.retries,
+                args.backoff,
+            )
+            await persist(db, key, narrative)
+            generated += 1
+    return generated, skipped
+
+
+async def run(args):
+    current_route.set("batch:narrative")
+    users = await active_users(args.shard, args.shards)
+    print(f"Shard {args.shard}/{args.shards}: {len(users)} active users")
+
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    totals = {"generated": 0, "skipped": 0, "failed": 0}
+
+    async def one(user_id, goals):
+        async with slots:
+            started = time.perf_counter()
+            try:
+                generated, skipped = await precompute_user(user_id, goals, args)
+            except Exception as exc:
+                totals["failed"] += 1
+                print(f"User {user_id} failed: {exc!r}")
+                return
+            totals["generated"] += generated
+            totals["skipped"] += skipped
+            if generated:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(user_id, goals) for user_id, goals in users))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"Done in {elapsed:.1f}s: {totals['generated']} generated, {totals['skipped']} skipped, "
+        f"{totals['failed']} users failed"
+    )
+    if latencies:
+        latencies.sort()
+        print(
+            f"Throughput {totals['generated'] / elapsed:.2f} narratives/s, "
+            f"{len(latencies) / elapsed:.2f} users/s"
+        )
+        print(
+            f"Per-user latency p50 {statistics.median(latencies):.2f}s "
+            f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:.2f}s max {latencies[-1]:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    from app.models import budget, narrative, rollup, peer_group  # noqa: F401 - register mappers
+
+    parser = argparse.ArgumentParser(description="Precompute narratives for active users")
+    parser.add_argument("--concurrency", type=int, default=8, help="users processed at once")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--shard", type=int, default=0, help="0..shards-1")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=1.0, help="first retry delay in seconds")
+    parser.add_argument("--fresh-hours", type=float, default=20, help="keep stored narratives newer than this")
+    args = parser.parse_args()
+    asyncio.run(run(args))
@@ -0,0 +1,205 @@
+"""
+Deterministic spending pattern detection, no LLM involved.
+
+Spending is bucketed into a (users x categories x weeks) array with one
+np.bincount, then every series is scored at once: mean, spread, a least
+squares slope with its t statistic, and 4-week rolling means for the "lately vs
+before" numbers. Each (user, category) with enough activity is classified
+as one of SpendingPattern's types:
+
+- increasing / decreasing: the fitted line moves at least TREND_CHANGE of
+  the mean over the window and the slope's t statistic is at least TREND_T,
+  i.e. the trend stands out from week-to-week noise
+- irregular: no clear trend and the weekly amounts vary more than
+  IRREGULAR_CV times their mean
+- stable: the rest
+
+Works for one user (analyze_spending_patterns) or thousands at a time
+(patterns_for_users, for background jobs); see
+benchmarks/bench_patterns.py for numbers.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+
+from app.models.transactions import Transaction, TransactionCategory
+from app.schemas.ai_insights import SpendingPattern
+
+CATEGORIES = list(TransactionCategory)
+CATEGORY_INDEX = {category: i for i, category in enumerate(CATEGORIES)}
+
+MIN_ACTIVE_WEEKS = 3  # fewer weeks with spending than this -> no pattern
+ROLLING_WEEKS = 4
+TREND_CHANGE = 0.25  # fitted change across the window, relative to the mean
+TREND_T = 3.0  # slope / its standard error
+IRREGULAR_CV = 1.0  # std / mean of the weekly totals
+
+PATTERN_TYPES = ["increasing", "decreasing", "stable", "irregular"]
+INCREASING, DECREASING, STABLE, IRREGULAR = range(4)
+NO_PATTERN = -1
+
+
+def build_series(
+    user_index: np.ndarray,
+    category_index: np.ndarray,
+    days_ago: np.ndarray,
+    amounts: np.ndarray,
+    n_users: int,
+    n_buckets: int,
+    bucket_days: int = 7,
+) -> np.ndarray:
+    """
+    Sum amounts into [user, category, bucket], oldest bucket first.
+    bucket_days=1 gives daily series, 7 weekly. Rows outside the window are dropped.
+    """
+    bucket = n_buckets - 1 - days_ago // bucket_days
+    keep = (days_ago >= 0) & (bucket >= 0)
+    flat = (user_index[keep] * len(CATEGORIES) + category_index[keep]) * n_buckets + bucket[keep]
+    totals = np.bincount(flat, weights=amounts[keep], minlength=n_users * len(CATEGORIES) * n_buckets)
+    return totals.reshape(n_users, len(CATEGORIES), n_buckets)
+
+
+def rolling_mean(series: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over the last axis; element i covers buckets i-window+1..i."""
+    cumulative = np.cumsum(series, axis=-1)
+    cumulative[..., window:] = cumulative[..., window:] - cumulative[..., :-window]
+    return cumulative[..., window - 1:] / window
+
+
+def series_stats(series: np.ndarray) -> dict[str, np.ndarray]:
+    """Per-series statistics over the last axis."""
+    n = series.shape[-1]
+    t = np.arange(n, dtype=np.float64) - (n - 1) / 2  # centered time
+    mean = series.mean(axis=-1)
+    centered = series - mean[..., None]
+    ss_t = float(t @ t)
+    ss_y = np.einsum("...i,...i->...", centered, centered)
+    slope = centered @ t / ss_t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(ss_y > 0, slope * slope * ss_t / ss_y, 0.0)
+        t_stat = np.where(r2 < 1, np.sqrt(r2 * (n - 2) / (1 - r2)), np.inf)
+    rolling = rolling_mean(series, ROLLING_WEEKS)
+    return {
+        "mean": mean,
+        "std": np.sqrt(ss_y / n),
+        "slope": slope,
+        "r2": r2,
+        "t": t_stat,
+        "active": np.count_nonzero(series, axis=-1),
+        "peak": series.max(axis=-1),
+        "recent": rolling[..., -1],
+        "previous": rolling[..., -1 - ROLLING_WEEKS] if rolling.shape[-1] > ROLLING_WEEKS else rolling[..., 0],
+    }
+
+
+def classify(stats: dict[str, np.ndarray], n_buckets: int) -> np.ndarray:
+    mean = stats["mean"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(mean > 0, stats["slope"] * (n_buckets - 1) / mean, 0.0)
+        cv = np.where(mean > 0, stats["std"] / mean, 0.0)
+    trending = (np.abs(change) >= TREND_CHANGE) & (stats["t"] >= TREND_T)
+    codes = np.full(mean.shape, STABLE, dtype=np.int8)
+    codes[cv >= IRREGULAR_CV] = IRREGULAR
+    codes[trending & (change > 0)] = INCREASING
+    codes[trending & (change < 0)] = DECREASING
+    codes[stats["active"] < MIN_ACTIVE_WEEKS] = NO_PATTERN
+    return codes
+
+
+def describe(code: int, category: str, stats: dict, at: tuple, weeks: int) -> SpendingPattern:
+    mean = float(stats["mean"][at])
+    recent = float(stats["recent"][at])
+    previous = float(stats["previous"][at])
+    if code == INCREASING:
+        description = f"{category} spending is rising: {recent:.2f} a week lately, up from {previous:.2f}."
+        suggestion = f"Set a weekly cap for {category} around {previous:.0f}."
+    elif code == DECREASING:
+        description = f"{category} spending is falling: {recent:.2f} a week lately, down from {previous:.2f}."
+        suggestion = f"Nice work, try to keep {category} near {recent:.0f} a week."
+    elif code == IRREGULAR:
+        active = int(stats["active"][at])
+        description = (
+            f"{category} spending comes in bursts: {active} of the last {weeks} weeks, "
+            f"up to {float(stats['peak'][at]):.2f} in one week."
+        )
+        suggestion = f"Put aside {mean:.0f} a week for {category} so the spikes don't hurt."
+    else:
+        description = f"{category} spending is steady at about {mean:.2f} a week."
+        suggestion = f"Budget {mean * 52 / 12:.0f} a month for {category}."
+    return SpendingPattern(
+        pattern_type=PATTERN_TYPES[code],
+        category=category,
+        description=description,
+        suggestion=suggestion,
+    )
+
+
+def detect_patterns(
+    user_ids: np.ndarray,
+    categories: np.ndarray,
+    dates: np.ndarray,
+    amounts: np.ndarray,
+    end: datetime,
+    weeks: int,
+) -> dict[int, list[SpendingPattern]]:
+    """
+    Patterns for every user in the rows. categories are CATEGORIES indexes,
+    dates datetime64; the window is the `weeks` weeks up to end.
+    """
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    days_ago = (np.datetime64(end, "D") - dates.astype("datetime64[D]")).astype(np.int64)
+    series = build_series(user_index, categories, days_ago, amounts.astype(np.float64), len(users), weeks)
+    stats = series_stats(series)
+    codes = classify(stats, weeks)
+
+    patterns: dict[int, list[SpendingPattern]] = {int(user_id): [] for user_id in users}
+    for u, c in zip(*np.nonzero(codes != NO_PATTERN)):
+        patterns[int(users[u])].append(
+            describe(int(codes[u, c]), CATEGORIES[c].value, stats, (u, c), weeks)
+        )
+    return patterns
+
+
+def _rows_to_arrays(rows) -> tuple[np.ndarray, ...]:
+    user_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    categories = np.fromiter((CATEGORY_INDEX[TransactionCategory(row[1])] for row in rows), dtype=np.int64, count=len(rows))
+    dates = np.array([row[2] for row in rows], dtype="datetime64[D]")
+    amounts = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+    return user_ids, categories, dates, amounts
+
+
+def _pattern_query(start: datetime):
+    return select(
+        Transaction.user_id, Transaction.category, Transaction.date, Transaction.amount
+    ).where(Transaction.date >= start)
+
+
+def patterns_for_users(
+    connection: Connection,
+    user_ids: list[int],
+    weeks: int,
+    chunk_size: int = 2000,
+) -> dict[int, list[SpendingPattern]]:
+    """Batch version for background jobs, chunk_size users per array build."""
+    end = datetime.utcnow()
+    start = end - timedelta(weeks=weeks)
+    patterns = {}
+    for i in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[i:i + chunk_size]
+        rows = connection.execute(_pattern_query(start).where(Transaction.user_id.in_(chunk))).all()
+        patterns.update({user_id: [] for user_id in chunk})
+        if rows:
+            patterns.update(detect_patterns(*_rows_to_arrays(rows), end, weeks))
+    return patterns
+
+
+async def patterns_for_user(db, user_id: int, weeks: int) -> list[SpendingPattern]:
+    end = datetime.utcnow()
+    start = end - timedelta(weeks=weeks)
+    result = await db.execute(_pattern_query(start).where(Transaction.user_id == user_id))
+    rows = result.all()
+    if not rows:
+        return []
+    return detect_patterns(*_rows_to_arrays(rows), end, weeks).get(user_id, [])
@@ -1,13 +1,369 @@
-from app.models.transactions import Transaction
-from datetime import datetime
-from app.src.llm_caller import LLMCaller
-
-async def generate_financial_narrative(user_id: int, time_period: str):
-    # Gets spending data
-    # Calls Claude with prompt about values analysis
-    # Returns narrative text
-    return
-
-async def analyze_spending_patterns(transactions: list):
-    # Categorization, trend detection
-    return
\ No newline at end of file
+import heapq
+import json
+import math
+from contextlib import aclosing
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.budget import Budget
+from app.models.transactions import Transaction, TransactionCategory
+from app.schemas.ai_insights import NarrativeResponse, SpendingPattern
+from app.ai_services.pattern_engine import patterns_for_user
+from app.src.llm_caller import generate_text, stream_text
+from app.src.narrative_cache import PERIOD_DAYS
+
+settings = get_settings()
+
+NARRATIVE_PROMPT = """You are a friendly personal finance coach. Write a short "money story" for the user
+from their spending below. Point out where their spending lines up with their goals and where it doesn't.
+
+Period: {time_period}
+{summary}
+Budgets: {budgets}
+Goals: {goals}
+
+Answer with JSON only, in this shape:
+{{"narrative": "2-3 paragraphs", "key_insights": ["..."], "recommendations": ["..."]}}
+"""
+
+# streamed variant: plain narrative text first so it can be shown as it
+# arrives, the structured parts after a marker line
+INSIGHTS_MARKER = "---INSIGHTS---"
+STREAM_PROMPT = """You are a friendly personal finance coach. Write a short "money story" for the user
+from their spending below. Point out where their spending lines up with their goals and where it doesn't.
+
+Period: {time_period}
+{summary}
+Budgets: {budgets}
+Goals: {goals}
+
+First write the story as 2-3 plain text paragraphs. Then write a line containing only
+""" + INSIGHTS_MARKER + """ followed by JSON only, in this shape:
+{{"key_insights": ["..."], "recommendations": ["..."]}}
+"""
+
+STREAM_BATCH = 1000  # rows fetched per round trip while summarizing
+OUTLIER_Z = 2.5  # standard deviations above the category mean
+# (weeks, merchants, outliers) shown, most detailed first; the first level
+# that fits the token budget wins
+DETAIL_LEVELS = [(12, 10, 5), (8, 5, 3), (4, 3, 1), (2, 0, 0), (0, 0, 0)]
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English and numbers, close enough for budgeting
+    return len(text) // 4 + 1
+
+
+class SpendingSummary:
+    """
+    Compact view of a period's transactions for the narrative prompt:
+    per-category totals, top merchants, outliers and week-over-week totals.
+    Built one row at a time, so the rows are never all in memory.
+    """
+
+    def __init__(self, max_outliers: int = DETAIL_LEVELS[0][2]):
+        self.count = 0
+        self.max_outliers = max_outliers
+        self.categories: dict[str, list[float]] = {}  # category -> [total, count, mean, m2]
+        self.merchants: dict[str, float] = {}
+        self.weeks: dict[date, float] = {}  # monday -> total
+        self.largest: dict[str, list[tuple[float, str, str]]] = {}  # category -> min-heap of (amount, date, merchant)
+
+    def add(self, when: datetime, category, merchant: str | None, amount: float):
+        category = TransactionCategory(category).value
+        self.count += 1
+        stats = self.categories.get(category)
+        if stats is None:
+            stats = self.categories[category] = [0.0, 0, 0.0, 0.0]
+        # Welford, for the outlier cut-off
+        stats[0] += amount
+        stats[1] += 1
+        delta = amount - stats[2]
+        stats[2] += delta / stats[1]
+        stats[3] += delta * (amount - stats[2])
+
+        if merchant:
+            self.merchants[merchant] = self.merchants.get(merchant, 0.0) + amount
+        if when is not None:
+            monday = when.date() - timedelta(days=when.weekday())
+            self.weeks[monday] = self.weeks.get(monday, 0.0) + amount
+
+        # keep the few largest per category; which are outliers is decided at the end
+        heap = self.largest.setdefault(category, [])
+        if len(heap) < self.max_outliers:
+            heapq.heappush(heap, (amount, when.date().isoformat() if when else "", merchant or ""))
+        elif amount > heap[0][0]:
+            heapq.heapreplace(heap, (amount, when.date().isoformat() if when else "", merchant or ""))
+
+    def spending_by_category(self) -> dict[str, float]:
+        return {category: round(stats[0], 2) for category, stats in self.categories.items()}
+
+    def outliers(self) -> list[tuple[float, str, str, str]]:
+        found = []
+        for category, heap in self.largest.items():
+            _, count, mean, m2 = self.categories[category]
+            std = math.sqrt(m2 / count) if count > 1 else 0.0
+            for amount, when, merchant in heap:
+                if std and (amount - mean) / std >= OUTLIER_Z:
+                    found.append((amount, when, category, merchant))
+        return sorted(found, reverse=True)
+
+    def render(self, weeks: int, merchants: int, outliers: int) -> str:
+        lines = [f"Spending by category ({self.count} transactions):"]
+        for category, (total, count, mean, _) in sorted(self.categories.items(), key=lambda item: -item[1][0]):
+            lines.append(f"- {category}: {total:.2f} over {count} transactions (avg {mean:.2f})")
+
+        if weeks:
+            recent = sorted(self.weeks.items())[-(weeks + 1):]
+            lines.append("Week over week:")
+            for (_, previous), (monday, total) in zip(recent, recent[1:]):
+                change = f"{(total - previous) / previous * 100:+.0f}%" if previous else "new"
+                lines.append(f"- week of {monday.isoformat()}: {total:.2f} ({change})")
+
+        if merchants and self.merchants:
+            top = heapq.nlargest(merchants, self.merchants.items(), key=lambda item: item[1])
+            lines.append("Top merchants:")
+            lines.extend(f"- {merchant}: {total:.2f}" for merchant, total in top)
+
+        unusual = self.outliers()[:outliers]
+        if unusual:
+            lines.append("Unusual transactions:")
+            for amount, when, category, merchant in unusual:
+                mean = self.categories[category][2]
+                at = f" at {merchant}" if merchant else ""
+                lines.append(f"- {when} {category} {amount:.2f}{at} (usual {mean:.2f})")
+        return "\n".join(lines)
+
+    def render_within(self, token_budget: int) -> str:
+        """Most detailed rendering that fits token_budget, category totals are always kept."""
+        for level in DETAIL_LEVELS:
+            text = self.render(*level)
+            if estimate_tokens(text) <= token_budget:
+                return text
+        return text
+
+
+def build_prompt(
+    summary: SpendingSummary,
+    budgets: list,
+    user_goals: dict | None,
+    time_period: str,
+    template: str = NARRATIVE_PROMPT,
+) -> str:
+    budget_lines = {
+        TransactionCategory(budget.category).value: f"{budget.amount:.2f} {budget.period}"
+        for budget in budgets
+    }
+    fields = {
+        "time_period": time_period,
+        "budgets": json.dumps(budget_lines),
+        "goals": json.dumps(user_goals or {}),
+    }
+    fixed = estimate_tokens(template.format(summary="", **fields))
+    budget = max(0, settings.NARRATIVE_PROMPT_TOKEN_BUDGET - fixed)
+    return template.format(summary=summary.render_within(budget), **fields)
+
+
+def _load_json(text: str) -> dict | None:
+    # models like to wrap JSON in ``` fences
+    cleaned = text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    try:
+        data = json.loads(cleaned)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _parse_narrative(text: str) -> dict:
+    data = _load_json(text)
+    if data is None:
+        return {"narrative": text.strip(), "key_insights": [], "recommendations": []}
+    return {
+        "narrative": str(data.get("narrative", "")),
+        "key_insights": [str(item) for item in data.get("key_insights", [])],
+        "recommendations": [str(item) for item in data.get("recommendations", [])],
+    }
+
+
+async def generate_financial_narrative(
+    summary: SpendingSummary,
+    budgets: list,
+    user_goals: dict | None,
+    time_period: str = "month",
+) -> dict:
+    """
+    Build the NarrativeResponse for /insights/narrative.
+    Totals come from the summary, the LLM only writes the text parts.
+    """
+    prompt = build_prompt(summary, budgets, user_goals, time_period)
+    response = await generate_text(prompt)
+
+    return {
+        **_parse_narrative(response.text),
+        "spending_by_category": summary.spending_by_category(),
+        "generated_at": datetime.utcnow().isoformat(),
+    }
+
+
+async def stream_financial_narrative(
+    summary: SpendingSummary,
+    budgets: list,
+    user_goals: dict | None,
+    time_period: str = "month",
+):
+    """
+    Streaming generate_financial_narrative. Yields ("text", chunk) while the
+    narrative is being written, then ("done", NarrativeResponse dict).
+    """
+    prompt = build_prompt(summary, budgets, user_goals, time_period, template=STREAM_PROMPT)
+    narrative, tail = [], []
+    pending = ""
+    in_tail = False
+    async with aclosing(stream_text(prompt)) as chunks:
+        async for chunk in chunks:
+            if in_tail:
+                tail.append(chunk)
+                continue
+            pending += chunk
+            marker_at = pending.find(INSIGHTS_MARKER)
+            if marker_at >= 0:
+                text = pending[:marker_at]
+                tail.append(pending[marker_at + len(INSIGHTS_MARKER):])
+                pending = ""
+                in_tail = True
+            else:
+                # hold back anything that could be the start of the marker
+                split = max(0, len(pending) - len(INSIGHTS_MARKER) + 1)
+                text, pending = pending[:split], pending[split:]
+            if text:
+                narrative.append(text)
+                yield "text", text
+    if pending:
+        narrative.append(pending)
+        yield "text", pending
+
+    extras = _load_json("".join(tail)) or {}
+    yield "done", NarrativeResponse.model_validate({
+        "narrative": "".join(narrative).strip(),
+        "key_insights": [str(item) for item in extras.get("key_insights", [])],
+        "recommendations": [str(item) for item in extras.get("recommendations", [])],
+        "spending_by_category": summary.spending_by_category(),
+        "generated_at": datetime.utcnow().isoformat(),
+    }).model_dump()
+
+
+async def summarize_transactions(db: AsyncSession, user_id: int, start_date: datetime) -> SpendingSummary:
+    """Stream the window's rows (plain tuples, no ORM objects) into a SpendingSummary."""
+    summary = SpendingSummary()
+    result = await db.stream(select(
+        Transaction.date, Transaction.category, Transaction.merchant, Transaction.amount
+    ).where(
+        Transaction.user_id == user_id,
+        Transaction.date >= start_date
+    ).execution_options(yield_per=STREAM_BATCH))
+    async for when, category, merchant, amount in result:
+        summary.add(when, category, merchant, amount)
+    return summary
+
+
+async def narrative_for_user(
+    db: AsyncSession,
+    user_id: int,
+    user_goals: dict | None,
+    time_period: str,
+    start_date: datetime,
+) -> dict:
+    """Summarize the period's data and generate a validated NarrativeResponse dict."""
+    summary = await summarize_transactions(db, user_id, start_date)
+
+    result = await db.execute(select(Budget).where(Budget.user_id == user_id))
+    budgets = result.scalars().all()
+
+    narrative = await generate_financial_narrative(
+        summary=summary,
+        budgets=budgets,
+        user_goals=user_goals,
+        time_period=time_period,
+    )
+    return NarrativeResponse.model_validate(narrative).model_dump()
+
+
+BUDGET_PERIOD_DAYS = {"weekly": 7, "monthly": 30, "yearly": 365}
+
+
+def local_narrative(
+    spending_by_category: dict[str, float],
+    budgets: list,
+    time_period: str,
+) -> dict:
+    """
+    NarrativeResponse dict written without the LLM, for when the AI routes
+    shed load (see app.src.admission). Plain facts: total, top categories
+    and budgets the period's spending is on track to overshoot.
+    """
+    total = sum(spending_by_category.values())
+    ranked = sorted(spending_by_category.items(), key=lambda item: item[1], reverse=True)
+    days = PERIOD_DAYS.get(time_period, 365)
+
+    over_budget = []
+    for budget in budgets:
+        category = TransactionCategory(budget.category).value
+        allowed = budget.amount * days / BUDGET_PERIOD_DAYS.get(budget.period, 30)
+        spent = spending_by_category.get(category, 0.0)
+        if spent > allowed:
+            over_budget.append((category, spent, allowed))
+
+    if not ranked:
+        narrative = f"No spending recorded this {time_period} yet."
+    else:
+        top, top_amount = ranked[0]
+        narrative = (
+            f"You spent {total:.2f} this {time_period} across {len(ranked)} categories. "
+            f"{top} was the largest at {top_amount:.2f} ({top_amount / total:.0%} of the total)."
+        )
+    key_insights = [
+        f"{category}: {amount:.2f} ({amount / total:.0%})" for category, amount in ranked[:3]
+    ]
+    key_insights += [
+        f"{category} is at {spent:.2f}, over its {allowed:.2f} budget for the {time_period}"
+        for category, spent, allowed in over_budget
+    ]
+    recommendations = [f"Review your {category} spending to get back under budget" for category, _, _ in over_budget]
+    if not recommendations and ranked:
+        recommendations = [f"Look for savings in {ranked[0][0]}, your largest category"]
+
+    return NarrativeResponse(
+        narrative=narrative,
+        key_insights=key_insights,
+        spending_by_category=spending_by_category,
+        recommendations=recommendations,
+        generated_at=datetime.utcnow().isoformat(),
+        degraded=True,
+    ).model_dump()
+
+
+async def degraded_narrative(
+    db: AsyncSession,
+    user_id: int,
+    time_period: str,
+    start_date: datetime,
+) -> dict:
+    """local_narrative from one GROUP BY over the period plus the budget rows."""
+    result = await db.execute(select(
+        Transaction.category, func.sum(Transaction.amount)
+    ).where(
+        Transaction.user_id == user_id,
+        Transaction.date >= start_date
+    ).group_by(Transaction.category))
+    spending = {TransactionCategory(category).value: round(total, 2) for category, total in result}
+
+    result = await db.execute(select(Budget).where(Budget.user_id == user_id))
+    return local_narrative(spending, result.scalars().all(), time_period)
+
+
+async def analyze_spending_patterns(db: AsyncSession, user_id: int, weeks: int | None = None) -> list[SpendingPattern]:
+    """Per-category trend classification from the pattern engine, no LLM call."""
+    return await patterns_for_user(db, user_id, weeks or settings.PATTERN_WINDOW_WEEKS)
@@ -1,47 +1,200 @@
-from app.models.transactions import Transaction
+from app.models.transactions import Transaction, TransactionCategory
 from datetime import datetime
-from app.src.llm_caller import LLMCaller
-# Import your teammate's LLMCaller here
-# from app.services.llm_caller import LLMCaller
+import asyncio
+import hashlib
+import logging
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app.src.llm_caller import extract_expenses
+from typing import AsyncIterator
+import numpy as np
+from pydantic import ValidationError
+from app.config import get_settings
+from app.src.upload_dedup import recent_speech
+from app.schemas.voice import VoiceTransactionResponse
+from app.schemas.transactions import TransactionCreate
 
 
-async def process_voice_input(audio_data: bytes, user_id: int, db):
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+# speech fingerprints being extracted right now -> set once they're done
+_extracting: dict[tuple[int, str], asyncio.Event] = {}
+
+
+class NoExpenseFound(Exception):
+    """The model heard speech but no expense it could save."""
+
+
+class ExtractionFailed(Exception):
+    """The model call failed or its answer didn't fit VoiceExtraction."""
+
+
+async def process_voice_input(speech: AsyncIterator[np.ndarray], user_id: int) -> dict | None:
     """
-    Process voice input and create transaction.
-    
-    Use Gemini integration to extract:
-    - amount
-    - category  
-    - description
+    Process voice input and create a transaction per expense mentioned.
+
+    speech yields 16 kHz mono PCM blocks without the silence while the
+    upload is still being decoded (audio_pipeline.stream_speech). They are
+    hashed and collected as they come, at most VOICE_UPLOAD_MAX_SECONDS of
+    speech, and go to Gemini in one call once the upload is through
+    (llm_caller.extract_expenses). Returns the VoiceTransactionResponse as
+    a dict, None when there was no speech at all; raises NoExpenseFound
+    when the model found nothing to save, ExtractionFailed when the call
+    itself failed. Neither is remembered, a retry asks the model again.
+
+    The speech is fingerprinted (sha256 of the PCM) before the model hears
+    it: the same recording uploaded again within VOICE_DEDUP_TTL_SECONDS
+    gets the first upload's response back, no model call, no new
+    transactions (upload_dedup.recent_speech).
     """
-    
-    # TODO: Call Gemini audio API
-    # result = await llm_caller.call_audio(audio_data)
-    # extracted_data = result['tool_call_result']
-    
-    # Placeholder extraction
-    extracted_data = {
-        "amount": 25.50,
-        "category": "Food & Dining",
-        "description": "Coffee at Starbucks"
-    }
-    
-    # Create transaction
-    transaction = Transaction(
-        user_id=user_id,
-        amount=extracted_data["amount"],
-        category=extracted_data["category"],
-        merchant=extracted_data.get("description"),
-        date=datetime.utcnow(),
-        input_method="voice"
-    )
-    
-    db.add(transaction)
-    db.commit()
-    db.refresh(transaction)
-    
-    return {
-        "transcription": "Spent $25.50 on coffee at Starbucks",
-        "transaction": transaction,
-        "confidence": 0.95
-    }
\ No newline at end of file
+    pcm = bytearray()
+    fingerprint = hashlib.sha256()
+    async for block in speech:
+        fingerprint.update(block)
+        pcm += memoryview(block)
+    if not pcm:
+        return None
+
+    key = (user_id, fingerprint.hexdigest())
+    while (extracting := _extracting.get(key)) is not None:
+        await extracting.wait()  # a retry that caught up with its original
+    cached = recent_speech.get(key)
+    if cached is not None:
+        return cached
+    _extracting[key] = asyncio.Event()
+    try:
+        response = await _extract_and_save(user_id, pcm)
+        recent_speech.put(key, response)
+        return response
+    finally:
+        _extracting.pop(key).set()
+
+
+def _check_expense(amount, category, description) -> tuple[TransactionCreate | None, str | None]:
+    """The model's arguments, checked like any other client's: (data, None) or (None, why it wasn't saved)."""
+    try:
+        category = TransactionCategory(category)
+    except ValueError:
+        category = TransactionCategory.OTHER
+    try:
+        data = TransactionCreate(amount=amount, category=category, merchant=description)
+    except ValidationError as exc:
+        problems = "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in exc.errors())
+        return None, f"Not saved ({problems}), ask the user to repeat the expense"
+    if data.amount > settings.VOICE_MAX_AMOUNT:
+        return None, (f"Not saved, {data.amount} is more than {settings.VOICE_MAX_AMOUNT}: "
+                      "ask the user to confirm the amount")
+    return data, None
+
+
+async def _extract_and_save(user_id: int, pcm: bytes) -> dict:
+    try:
+        extraction = await extract_expenses(pcm)
+    except Exception as exc:
+        logger.exception("Voice extraction failed for user %s", user_id)
+        raise ExtractionFailed() from exc
+
+    # nobody to ask for a correction on an upload: what doesn't pass is left out
+    expenses = []
+    for item in extraction.expenses:
+        data, problem = _check_expense(item.amount, item.category, item.description)
+        if data is None:
+            logger.info("Dropped an expense from a voice upload of user %s: %s", user_id, problem)
+        else:
+            expenses.append(data)
+    if not expenses:
+        raise NoExpenseFound(extraction.transcription)
+
+    # Create transactions: queued together, they go out in one group commit
+    # (save_voice_transaction), taking turns with the other uploads' and the
+    # realtime sessions' writes instead of fighting them for SQLite's lock
+    now = datetime.utcnow()
+    transactions = [
+        Transaction(user_id=user_id, **data.model_dump(exclude={"date"}), date=now, input_method="voice")
+        for data in expenses
+    ]
+    await asyncio.gather(*(save_voice_transaction(transaction) for transaction in transactions))
+
+    return VoiceTransactionResponse.model_validate({
+        "transcription": extraction.transcription,
+        "transaction": transactions[0],
+        "transactions": transactions,
+        "confidence": extraction.confidence,
+    }).model_dump(mode="json")
+
+
+# SQLite has a single writer and the flush hooks (anomaly scores, rollups)
+# read before they write, so voice sessions committing concurrently fail
+# with "database is locked" instead of waiting. Writes take turns instead,
+# and whoever holds the lock commits everything queued up behind it in one
+# flush (group commit) on the sync engine in a worker thread: the hooks
+# issue a dozen statements per flush, and on the async engine each one
+# waits for a turn of an event loop that is busy moving audio.
+_voice_writes = asyncio.Lock()
+_pending_writes: list[tuple[Transaction, asyncio.Future]] = []
+
+
+def _commit_transactions(transactions: list[Transaction]) -> list[int]:
+    # not expired on commit: uploads return the saved rows whole
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        db.add_all(transactions)
+        db.flush()
+        ids = [transaction.id for transaction in transactions]
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+
+async def _flush_voice_writes():
+    async with _voice_writes:
+        if not _pending_writes:
+            return  # an earlier flush took ours along
+        batch = _pending_writes[:]
+        _pending_writes.clear()
+        try:
+            ids = await run_in_threadpool(_commit_transactions, [transaction for transaction, _ in batch])
+        except Exception as exc:
+            for _, saved in batch:
+                if not saved.done():
+                    saved.set_exception(exc)
+        else:
+            for (_, saved), transaction_id in zip(batch, ids):
+                if not saved.done():  # done = its session went away
+                    saved.set_result(transaction_id)
+
+
+async def save_voice_transaction(transaction: Transaction) -> int:
+    """Queue the row for the next group commit; returns its id once committed."""
+    saved = asyncio.get_running_loop().create_future()
+    _pending_writes.append((transaction, saved))
+    # shielded: a session hanging up mid-commit must not cancel the others' rows
+    await asyncio.shield(_flush_voice_writes())
+    return await saved
+
+
+def voice_tools(user_id: int) -> dict:
+    """
+    Tools for a realtime AudioSession of one user.
+
+    Writes go through save_voice_transaction, so a voice conversation that
+    runs for minutes doesn't hold a database connection.
+    """
+
+    async def add_to_database(amount: float, category: str = "Other", description: str | None = None):
+        data, problem = _check_expense(amount, category, description)
+        if data is None:
+            return {"error": problem}
+        transaction = Transaction(
+            user_id=user_id,
+            **data.model_dump(exclude={"date"}),
+            date=datetime.utcnow(),
+            input_method="voice"
+        )
+        transaction_id = await save_voice_transaction(transaction)
+        return {"status": "saved", "transaction_id": transaction_id, "category": data.category.value}
+
+    return {"add_to_database": add_to_database}
@@ -1,22 +1,40 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+from contextlib import aclosing
 
-from app.database import get_db
-from app.models.user import User
-from app.models.transactions import Transaction
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+
+from app.database import get_db, AsyncSessionLocal
 from app.models.budget import Budget
+from app.models.rollup import SpendingRollup
+from app.models.transactions import Transaction
+from app.config import get_settings
 from app.api.auth import get_current_user
-from app.schemas.ai_insights import NarrativeRequest, NarrativeResponse
-from app.ai_services.spending_analysis import generate_financial_narrative
+from app.src.principal_cache import AuthenticatedUser
+from app.schemas.ai_insights import NarrativeRequest, NarrativeResponse, SpendingPattern
+from app.schemas.transactions import TransactionResponse
+from app.ai_services.spending_analysis import (
+    narrative_for_user, summarize_transactions, stream_financial_narrative, analyze_spending_patterns,
+    degraded_narrative, local_narrative
+)
+from app.src.narrative_cache import narrative_fingerprint, period_window, lookup, store
+from app.src.admission import ai_admission, ClientGone, Rejected
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.post("/narrative", response_model=NarrativeResponse)
 async def get_financial_narrative(
     request: NarrativeRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generate AI-powered financial narrative (money story).
@@ -24,58 +42,144 @@ async def get_financial_narrative(
     - Analyzes user's spending patterns
     - Identifies value alignment/misalignment
     - Provides personalized insights
+    - Cached until the underlying data changes (X-Cache: HIT/MISS)
+    - Under load, or while the AI is failing, answers at once with a local
+      summary instead (degraded: true, X-Degraded: <reason>)
     """
-    # Get transactions for time period
-    if request.time_period == "week":
-        start_date = datetime.utcnow() - timedelta(days=7)
-    elif request.time_period == "month":
-        start_date = datetime.utcnow() - timedelta(days=30)
-    else:  # year
-        start_date = datetime.utcnow() - timedelta(days=365)
+    time_period, start_date = period_window(request.time_period)
     
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.date >= start_date
-    ).all()
+    # Same inputs -> same narrative, skip the LLM
+    fingerprint = await narrative_fingerprint(db, current_user.id, current_user.goals, time_period, start_date)
+    key = (current_user.id, time_period, fingerprint)
+    cached, tier = await lookup(db, key)
+    if cached is not None:
+        response.headers["X-Cache"] = "HIT"
+        response.headers["X-Cache-Tier"] = tier
+        return cached
     
-    # Get budgets
-    budgets = db.query(Budget).filter(Budget.user_id == current_user.id).all()
-    
-    # Generate narrative using AI
-    narrative = await generate_financial_narrative(
-        transactions=transactions,
-        budgets=budgets,
-        user_goals=current_user.goals
-    )
+    # Generate narrative using AI, unless admission control sheds the request
+    try:
+        async with ai_admission.admit():
+            narrative = await asyncio.wait_for(
+                narrative_for_user(db, current_user.id, current_user.goals, time_period, start_date),
+                settings.AI_DEADLINE_SECONDS,
+            )
+    except Rejected as exc:
+        response.headers["X-Degraded"] = exc.reason
+        return await degraded_narrative(db, current_user.id, time_period, start_date)
+    except asyncio.TimeoutError:
+        logger.warning("Narrative generation passed AI_DEADLINE_SECONDS, answering the local narrative")
+        response.headers["X-Degraded"] = "deadline"
+        return await degraded_narrative(db, current_user.id, time_period, start_date)
+    except Exception:
+        logger.exception("Narrative generation failed, answering the local narrative")
+        response.headers["X-Degraded"] = "error"
+        return await degraded_narrative(db, current_user.id, time_period, start_date)
     
+    await store(db, key, narrative)
+    response.headers["X-Cache"] = "MISS"
     return narrative
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/narrative/stream")
+async def stream_financial_narrative_sse(
+    request: NarrativeRequest,
+    http_request: Request,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Same as /narrative, streamed as server-sent events.
+    
+    - event: narrative, data: {"text": ...} as the model writes it
+    - event: done, data: the full NarrativeResponse
+    - event: error, data: {"detail": ...} if generation fails midway
+    - Shed or failed before any text: the local summary as one narrative
+      event, then done with degraded: true
+    - Closing the connection cancels the LLM call
+    """
+    time_period, start_date = period_window(request.time_period)
+    fingerprint = await narrative_fingerprint(db, current_user.id, current_user.goals, time_period, start_date)
+    key = (current_user.id, time_period, fingerprint)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    
+    cached, tier = await lookup(db, key)
+    if cached is not None:
+        async def replay():
+            yield _sse("narrative", {"text": cached["narrative"]})
+            yield _sse("done", cached)
+        headers.update({"X-Cache": "HIT", "X-Cache-Tier": tier})
+        return StreamingResponse(replay(), media_type="text/event-stream", headers=headers)
+    
+    # everything that needs the request's session happens before streaming,
+    # it is closed by the time the body is sent
+    summary = await summarize_transactions(db, current_user.id, start_date)
+    result = await db.execute(select(Budget).where(Budget.user_id == current_user.id))
+    budgets = result.scalars().all()
+    
+    async def events():
+        narrative = None
+        started = False
+        try:
+            async with ai_admission.admit():
+                async with aclosing(stream_financial_narrative(
+                    summary, budgets, current_user.goals, time_period
+                )) as stream:
+                    async for kind, payload in stream:
+                        if await http_request.is_disconnected():
+                            raise ClientGone  # closing the stream cancels the upstream call
+                        if kind == "text":
+                            started = True
+                            yield _sse("narrative", {"text": payload})
+                        else:
+                            narrative = payload
+        except ClientGone:
+            return
+        except Exception as exc:
+            if not isinstance(exc, Rejected):
+                logger.exception("Narrative stream failed")
+            if started:
+                yield _sse("error", {"detail": "Narrative generation failed"})
+                return
+            fallback = local_narrative(summary.spending_by_category(), budgets, time_period)
+            yield _sse("narrative", {"text": fallback["narrative"]})
+            yield _sse("done", fallback)
+            return
+        async with AsyncSessionLocal() as session:
+            await store(session, key, narrative)
+        yield _sse("done", narrative)
+    
+    headers["X-Cache"] = "MISS"
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
 @router.get("/spending-analysis")
 async def get_spending_analysis(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get detailed spending analysis.
     
     - Breakdown by category
-    - Trends over time
-    - Unusual patterns
+    - Trends over time (see /insights/patterns)
+    - Unusual transactions (see /insights/anomalies)
     """
-    # Calculate spending by category
-    from sqlalchemy import func
-    
-    spending_by_category = db.query(
-        Transaction.category,
-        func.sum(Transaction.amount).label('total'),
-        func.count(Transaction.id).label('count'),
-        func.avg(Transaction.amount).label('avg')
-    ).filter(
-        Transaction.user_id == current_user.id
+    # Calculate spending by category from the monthly rollups
+    result = await db.execute(select(
+        SpendingRollup.category,
+        func.sum(SpendingRollup.total).label('total'),
+        func.sum(SpendingRollup.count).label('count')
+    ).where(
+        SpendingRollup.user_id == current_user.id
     ).group_by(
-        Transaction.category
-    ).all()
+        SpendingRollup.category
+    ))
+    spending_by_category = result.all()
     
     return {
         "categories": [
@@ -83,8 +187,45 @@ async def get_spending_analysis(
                 "category": cat,
                 "total": float(total),
                 "count": count,
-                "average": float(avg)
+                "average": float(total) / count
             }
-            for cat, total, count, avg in spending_by_category
+            for cat, total, count in spending_by_category
         ]
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/patterns", response_model=list[SpendingPattern])
+async def get_spending_patterns(
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Spending trend per category over the last PATTERN_WINDOW_WEEKS weeks.
+    
+    - increasing / decreasing / stable / irregular
+    - Computed locally, no AI call
+    """
+    return await analyze_spending_patterns(db, current_user.id)
+
+
+@router.get("/anomalies", response_model=list[TransactionResponse])
+async def get_anomalies(
+    threshold: float | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Unusually large (or small) transactions, newest first.
+    
+    - anomaly_score is the amount's z-score against the user's earlier
+      transactions in the same category, fixed when the transaction is written
+    - threshold defaults to ANOMALY_THRESHOLD; |score| at or above it is listed
+    """
+    if threshold is None:
+        threshold = settings.ANOMALY_THRESHOLD
+    result = await db.execute(select(Transaction).where(
+        Transaction.user_id == current_user.id,
+        (Transaction.anomaly_score >= threshold) | (Transaction.anomaly_score <= -threshold)
+    ).order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit))
+    return result.scalars().all()
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 
 from app.database import get_db
 from app.models.user import User
-from app.schemas.auth import RegisterRequest, LoginRequest, TokenResponse, UserResponse, UpdateProfileRequest
-from app.src.security import hash_password, verify_password
+from app.schemas.auth import RegisterRequest, LoginRequest, TokenResponse, UserResponse, UpdateProfileRequest, ChangePasswordRequest
+from app.src.security import hash_password_async, verify_password_async, PasswordHasherBusy
+from app.src.principal_cache import AuthenticatedUser, principal_cache
 from app.config import get_settings
 from app.models.user import IncomeRange
 
@@ -28,17 +30,41 @@ def create_access_token(data: dict):
     )
     return encoded_jwt
 
+def hasher_busy_exception():
+    """503 for when the password hashing pool is saturated."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 # OAuth2 scheme for JWT tokens
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db)
+) -> AuthenticatedUser:
     """
     Dependency to get current authenticated user from JWT token.
-    Use in other endpoints like: current_user: User = Depends(get_current_user)
+    Use in other endpoints like: current_user: AuthenticatedUser = Depends(get_current_user)
+
+    Returns a read-only snapshot, cached per token (see principal_cache),
+    so most requests skip both JWT verification and the users query.
+    """
+    return await authenticate_token(token, db)
+
+
+async def authenticate_token(token: str, db: AsyncSession) -> AuthenticatedUser:
+    """
+    get_current_user without the dependency wiring, for callers that get the
+    token some other way (e.g. the ?token= of the voice WebSocket).
+    Raises a 401 HTTPException when the token is invalid.
     """
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -57,48 +83,62 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = await db.get(User, int(user_id))
     if user is None:
         raise credentials_exception
     
-    return user
+    current_user = AuthenticatedUser.from_user(user)
+    principal_cache.put(token, current_user, payload.get("exp"))
+    return current_user
 
 # endpoints
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: RegisterRequest, db: Session = Depends(get_db)):
+async def register(user_data: RegisterRequest, db: AsyncSession = Depends(get_db)):
     # Check if user exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    result = await db.execute(select(User).where(User.email == user_data.email))
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
+    # bcrypt runs on the hashing pool, not the event loop
+    try:
+        hashed_password = await hash_password_async(user_data.password)
+    except PasswordHasherBusy:
+        raise hasher_busy_exception()
+    
     # Create new user
     new_user = User(
         firstname=user_data.firstname,
         lastname=user_data.lastname,
         email=user_data.email,
-        hashed_password=hash_password(user_data.password),
+        hashed_password=hashed_password,
         income_range=user_data.income_range,
         goals=user_data.goals
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return new_user
 
 @router.post("/login", response_model=TokenResponse)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Find user
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    result = await db.execute(select(User).where(User.email == form_data.username))
+    user = result.scalars().first()
+    try:
+        valid = user is not None and await verify_password_async(form_data.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise hasher_busy_exception()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -111,35 +151,64 @@ async def login(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: AuthenticatedUser = Depends(get_current_user)):
     # Get current logged-in user's information.
     return current_user
 
 @router.put("/me", response_model=UserResponse)
 async def update_user_profile(
     profile_data: UpdateProfileRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update user profile (income range, goals)."""
+    user = await db.get(User, current_user.id)
     if profile_data.income_range is not None:
-        current_user.income_range = profile_data.income_range
+        user.income_range = profile_data.income_range
     if profile_data.goals is not None:
-        current_user.goals = profile_data.goals
+        user.goals = profile_data.goals
     
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    await db.commit()
+    await db.refresh(user)
+    principal_cache.invalidate_user(user.id)
+    return user
+
+@router.put("/password")
+async def change_password(
+    password_data: ChangePasswordRequest,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Change password. Cached sessions for this user are dropped."""
+    user = await db.get(User, current_user.id)
+    try:
+        valid = (
+            password_data.email == user.email
+            and await verify_password_async(password_data.oldPass, user.hashed_password)
+        )
+        if not valid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Incorrect email or password"
+            )
+        user.hashed_password = await hash_password_async(password_data.newPass)
+    except PasswordHasherBusy:
+        raise hasher_busy_exception()
+    
+    await db.commit()
+    principal_cache.invalidate_user(user.id)
+    return {"message": "Password updated"}
 
-@router.delete("/me", response_model=UserResponse)
+@router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete user profile -  PERMANENT & IRREVERSIBLE WARNING
     this automatically deletes all user budgets and transactions
     """
-    db.delete(current_user)
-    db.commit()
-    return None
+    user = await db.get(User, current_user.id)
+    await db.delete(user)
+    await db.commit()
+    principal_cache.invalidate_user(current_user.id)
     
\ No newline at end of file
@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from typing import Awaitable, Callable
+
+from app.config import get_settings
+from app.database import JobSessionLocal
+from app.models.job import Job
+from app.api.auth import get_current_user
+from app.src.principal_cache import AuthenticatedUser
+from app.src.jobs import FINISHED, SUCCEEDED, JobLimitExceeded, job_queue
+from app.schemas.job import JobResponse
+
+settings = get_settings()
+
+router = APIRouter()
+
+
+# helper functions
+def replay_job(job: Job, response: Response) -> Job:
+    """Answer a repeated request with the job the first one started: 200 once it's done."""
+    if job.status in FINISHED:
+        response.status_code = 200
+    response.headers["Location"] = f"/jobs/{job.id}"
+    response.headers["Idempotent-Replayed"] = "true"
+    return job
+
+
+async def submit_job(
+    user_id: int,
+    kind: str,
+    file: UploadFile,
+    response: Response,
+    params: dict | None = None,
+    find_duplicate: Callable[[str], Awaitable[Job | None]] | None = None,
+) -> Job:
+    """
+    Queue the upload as a job for a 202 route; 429 when the user has too many unfinished.
+
+    find_duplicate(sha256) is asked once the file is spooled; a job it
+    returns is answered instead (replay_job) and nothing is queued.
+    """
+    try:
+        async with job_queue.spooled(user_id, file.file) as upload:
+            original = await find_duplicate(upload.sha256) if find_duplicate is not None else None
+            if original is not None:
+                return replay_job(original, response)
+            job = await job_queue.submit(user_id, kind, upload, params)
+    except JobLimitExceeded:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{settings.JOB_MAX_PENDING_PER_USER} jobs are already waiting, try again once they're done",
+            headers={"Retry-After": "5"},
+        )
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
+
+
+async def load_job(job_id: str, user_id: int, wait: float) -> Job:
+    """The user's job, after waiting up to `wait` seconds for it to finish."""
+    # short sessions: no connection is held while long-polling
+    async with JobSessionLocal() as db:
+        job = await db.get(Job, job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait and job.status not in FINISHED:
+        await job_queue.wait(job_id, wait)
+        async with JobSessionLocal() as db:
+            job = await db.get(Job, job_id)
+    return job
+
+
+@router.get("", response_model=list[JobResponse])
+async def list_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """The user's most recent jobs, newest first."""
+    async with JobSessionLocal() as db:
+        result = await db.execute(
+            select(Job).where(Job.user_id == current_user.id).order_by(Job.created_at.desc()).limit(limit)
+        )
+        return result.scalars().all()
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=settings.JOB_LONG_POLL_MAX_SECONDS),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """
+    Job status, with its result once it succeeded.
+
+    - ?wait=N long-polls: answers as soon as the job finishes, or after N
+      seconds with the status it has then
+    """
+    return await load_job(job_id, current_user.id, wait)
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=settings.JOB_LONG_POLL_MAX_SECONDS),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """
+    The job's outcome as the route would have answered it synchronously.
+
+    - succeeded: 200 with the result
+    - failed: the error's status and detail (e.g. 413 for a too long recording)
+    - not finished (after ?wait=N seconds of long-polling): 202 with the job status
+    """
+    job = await load_job(job_id, current_user.id, wait)
+    if job.status == SUCCEEDED:
+        return job.result
+    if job.status in FINISHED:
+        raise HTTPException(status_code=job.error_status or 500, detail=job.error)
+    return JSONResponse(
+        status_code=202,
+        content=JobResponse.model_validate(job).model_dump(mode="json"),
+        headers={"Retry-After": "1"},
+    )
@@ -1,20 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
 
 from app.database import get_db
-from app.models.user import User
-from app.models.transactions import Transaction
+from app.models.rollup import SpendingRollup
+from app.models.peer_group import PeerSketch, SpendingCircle
 from app.api.auth import get_current_user
+from app.src.principal_cache import AuthenticatedUser
 from app.schemas.peer_group import GroupComparison, GroupStats
+from app.src.peer_sketches import PeerDistribution
+from app.src.peer_stats import circle_distribution
 
 router = APIRouter()
 
 
 @router.post("/join")
 async def join_peer_group(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Opt into peer comparison.
@@ -35,8 +38,8 @@ async def join_peer_group(
 
 @router.get("/compare", response_model=GroupStats)
 async def compare_with_peers(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Compare your spending with peers in same income bracket.
@@ -44,6 +47,9 @@ async def compare_with_peers(
     - Shows category-by-category comparison
     - Anonymous aggregated data
     - Your percentile ranking
+    
+    Uses the live peer sketches (approximate, see app.src.peer_sketches)
+    and falls back to the last exact recompute if they were never built.
     """
     if not current_user.income_range:
         raise HTTPException(
@@ -51,51 +57,59 @@ async def compare_with_peers(
             detail="Please set your income range to compare with peers"
         )
     
-    # Get peers with same income range
-    peer_users = db.query(User).filter(
-        User.income_range == current_user.income_range,
-        User.id != current_user.id  # Exclude self
-    ).all()
+    # Distributions for this bracket (one per category + overall)
+    result = await db.execute(select(PeerSketch).where(
+        PeerSketch.income_range == current_user.income_range
+    ))
+    distributions: dict = {
+        row.category: PeerDistribution.from_sketch(row) for row in result.scalars().all()
+    }
+    if not distributions:
+        result = await db.execute(select(SpendingCircle).where(
+            SpendingCircle.income_range == current_user.income_range
+        ))
+        distributions = {
+            circle.category: circle_distribution(circle) for circle in result.scalars().all()
+        }
+    overall = distributions.get(None)
     
-    if len(peer_users) < 3:
+    if overall is None or overall.peer_count - 1 < 3:  # peers exclude yourself
         raise HTTPException(
             status_code=400,
             detail="Not enough peers in your income range for comparison"
         )
     
     # Calculate your spending by category
-    your_spending = db.query(
-        Transaction.category,
-        func.sum(Transaction.amount).label('total')
-    ).filter(
-        Transaction.user_id == current_user.id
-    ).group_by(Transaction.category).all()
-    
-    # Calculate peer averages by category
-    peer_ids = [p.id for p in peer_users]
-    peer_spending = db.query(
-        Transaction.category,
-        func.avg(Transaction.amount).label('avg'),
-        func.sum(Transaction.amount).label('total')
-    ).filter(
-        Transaction.user_id.in_(peer_ids)
-    ).group_by(Transaction.category).all()
+    result = await db.execute(select(
+        SpendingRollup.category,
+        func.sum(SpendingRollup.total).label('total')
+    ).where(
+        SpendingRollup.user_id == current_user.id
+    ).group_by(SpendingRollup.category))
+    your_spending = result.all()
     
     # Build comparisons
     comparisons = []
     your_spending_dict = {cat: float(total) for cat, total in your_spending}
     
-    for category, peer_avg, peer_total in peer_spending:
+    for category, peers in distributions.items():
+        if category is None:
+            continue
         your_amount = your_spending_dict.get(category, 0.0)
-        peer_avg_float = float(peer_avg)
+        peer_avg_float = peers.mean
+        if peer_avg_float == 0 and your_amount == 0:
+            continue  # nobody spends on this
         
         # Calculate comparison text
         if your_amount < peer_avg_float:
             diff_pct = int(((peer_avg_float - your_amount) / peer_avg_float) * 100)
             comparison_text = f"You spend {diff_pct}% less than peers"
         elif your_amount > peer_avg_float:
-            diff_pct = int(((your_amount - peer_avg_float) / peer_avg_float) * 100)
-            comparison_text = f"You spend {diff_pct}% more than peers"
+            if peer_avg_float > 0:
+                diff_pct = int(((your_amount - peer_avg_float) / peer_avg_float) * 100)
+                comparison_text = f"You spend {diff_pct}% more than peers"
+            else:
+                comparison_text = "Your peers don't spend on this"
         else:
             comparison_text = "You spend the same as peers"
         
@@ -103,14 +117,24 @@ async def compare_with_peers(
             category=category,
             your_spending=your_amount,
             peer_avg=peer_avg_float,
-            peer_median=peer_avg_float,  # Simplified for hackathon
-            percentile=50,  # Calculate properly later
+            peer_median=peers.median,
+            peer_p25=peers.p25,
+            peer_p75=peers.p75,
+            percentile=peers.percentile_of(your_amount),
             comparison_text=comparison_text
         ))
     
+    overall_percentile = overall.percentile_of(sum(your_spending_dict.values()))
+    if overall_percentile >= 75:
+        overall_rank = "top_25"
+    elif overall_percentile < 25:
+        overall_rank = "bottom_25"
+    else:
+        overall_rank = "middle_50"
+    
     return GroupStats(
         income_range=current_user.income_range,
-        peer_count=len(peer_users),
+        peer_count=overall.peer_count - 1,
         comparisons=comparisons,
-        overall_rank="middle_50"  # Calculate properly later
+        overall_rank=overall_rank
     )
\ No newline at end of file
@@ -1,8 +1,124 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, tuple_
+from datetime import datetime
+import base64
+
+from app.config import get_settings
+from app.database import get_db, SessionLocal
+from app.models.transactions import Transaction, TransactionCategory
+from app.models.job import Job
+from app.api.auth import get_current_user
+from app.api.jobs import submit_job
+from app.src.principal_cache import AuthenticatedUser
+from app.schemas.job import JobResponse
+from app.schemas.transactions import ImportResult, TransactionPage
+from app.src.importers import parse_upload, import_transactions
+from app.src.jobs import job_queue
 # from app.src.constants import TRANSACTION_CATEGORIES
 
+settings = get_settings()
+
 router = APIRouter()
 
+# helper functions
+def encode_cursor(transaction: Transaction) -> str:
+    """Opaque cursor pointing just past the given row in (date, id) order."""
+    raw = f"{transaction.date.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def run_import(user_id: int, rows) -> ImportResult:
+    # Bulk import runs in a worker thread on its own sync session
+    db = SessionLocal()
+    try:
+        return import_transactions(db, user_id, rows)
+    finally:
+        db.close()
+
+def run_import_file(user_id: int, path: str, filename: str | None) -> ImportResult:
+    with open(path, "rb") as upload:
+        return run_import(user_id, parse_upload(upload, filename))
+
+async def run_import_job(job: Job) -> dict:
+    # parsing + inserting is CPU/IO bound, keep it off the event loop
+    result = await run_in_threadpool(run_import_file, job.user_id, job.spool_path, job.params.get("filename"))
+    return result.model_dump(mode="json")
+
+job_queue.register("import", run_import_job, max_running=settings.JOB_MAX_RUNNING_IMPORTS)
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date, transaction_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(date), int(transaction_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("", response_model=TransactionPage)
+async def list_transactions(
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    category: TransactionCategory | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List transactions, newest first.
+
+    - Keyset pagination on (date, id): pass next_cursor back as ?cursor=
+    - Filters: category, amount range, date window
+    - Every page is an index seek on (user_id[, category], date, id),
+      so page N costs the same as page 1
+    """
+    query = select(Transaction).where(Transaction.user_id == current_user.id)
+
+    if category is not None:
+        query = query.where(Transaction.category == category)
+    if min_amount is not None:
+        query = query.where(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        query = query.where(Transaction.amount <= max_amount)
+    if start_date is not None:
+        query = query.where(Transaction.date >= start_date)
+    if end_date is not None:
+        query = query.where(Transaction.date < end_date)
+    if cursor is not None:
+        query = query.where(tuple_(Transaction.date, Transaction.id) < decode_cursor(cursor))
+
+    # fetch one extra row to know whether there is a next page
+    result = await db.execute(query.order_by(
+        Transaction.date.desc(), Transaction.id.desc()
+    ).limit(limit + 1))
+    rows = result.scalars().all()
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return TransactionPage(items=rows[:limit], next_cursor=next_cursor)
+
+
 @router.get("/categories")
 async def get_categories():
     return {"categories": "need to implement"}
+
+
+@router.post("/import", response_model=JobResponse, status_code=202)
+async def import_transactions_file(
+    response: Response,
+    file: UploadFile = File(...),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """
+    Bulk import transactions from a bank export, in the background.
+
+    - Accepts CSV (header: amount, category, merchant, date, notes) or OFX/QFX
+    - Answers 202 with a job (Location: /jobs/{id}) once the file is spooled;
+      GET /jobs/{id}/result?wait=30 returns the ImportResult
+    - Rows are streamed and inserted in batches
+    - Invalid rows are reported but don't stop the import
+    """
+    return await submit_job(current_user.id, "import", file, response, {"filename": file.filename})
@@ -1,52 +1,211 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, UploadFile, File, Header, HTTPException, Response, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from functools import partial
 import asyncio
+import json
+import logging
 
-from app.database import get_db
-from app.models.user import User
-from app.models.transactions import Transaction
-from app.api.auth import get_current_user
-from app.schemas.voice import VoiceTransactionResponse
-from app.ai_services.voice import process_voice_input
+from app.config import get_settings
+from app.database import AsyncSessionLocal, JobSessionLocal
+from app.models.job import Job
+from app.api.auth import get_current_user, authenticate_token
+from app.api.jobs import replay_job, submit_job
+from app.src.principal_cache import AuthenticatedUser
+from app.src.llm_caller import AudioSession, get_live_client, live_pool
+from app.src.audio_pipeline import AudioLimitExceeded, stream_speech
+from app.src.jobs import FAILED, JobFailed, job_queue
+from app.src.upload_dedup import recent_uploads
+from app.schemas.job import JobResponse
+from app.ai_services.voice import ExtractionFailed, NoExpenseFound, process_voice_input, voice_tools
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
 router = APIRouter()
 
+open_sessions = 0
+
+
+async def run_voice_upload(job: Job) -> dict:
+    """The voice_upload job: what /voice/upload used to do while the client waited."""
+    with open(job.spool_path, "rb") as audio:
+        speech = stream_speech(
+            partial(run_in_threadpool, audio.read),
+            max_bytes=settings.VOICE_UPLOAD_MAX_BYTES,
+            max_seconds=settings.VOICE_UPLOAD_MAX_SECONDS,
+        )
+        try:
+            result = await process_voice_input(speech, job.user_id)
+        except AudioLimitExceeded as exc:
+            raise JobFailed(413, str(exc))
+        except NoExpenseFound:
+            raise JobFailed(422, "No expense found in the recording")
+        except ExtractionFailed:
+            raise JobFailed(502, "Voice model unavailable, try again")
+        except ValueError:
+            raise JobFailed(400, "Could not decode the audio file")
+        finally:
+            await speech.aclose()
+    if result is None:
+        raise JobFailed(400, "No speech found in the audio")
+    return result
+
+
+job_queue.register("voice_upload", run_voice_upload)
+
 
-@router.post("/upload", response_model=VoiceTransactionResponse)
+async def recent_upload(user_id: int, key: tuple) -> Job | None:
+    """The job of an upload seen recently under key, unless it failed (then the retry runs)."""
+    job_id = recent_uploads.get((user_id, *key))
+    if job_id is None:
+        return None
+    async with JobSessionLocal() as db:
+        job = await db.get(Job, job_id)
+    if job is None or job.status == FAILED:
+        return None
+    return job
+
+
+@router.post("/upload", response_model=JobResponse, status_code=202)
 async def upload_voice(
+    response: Response,
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    idempotency_key: str | None = Header(None, max_length=255),
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """
-    Upload audio file and extract transaction data.
+    Upload audio file and extract transaction data in the background.
     
-    - Accepts audio file (WAV, MP3, etc.)
+    - Accepts audio file (WAV, MP3, etc.), up to VOICE_UPLOAD_MAX_BYTES and
+      VOICE_UPLOAD_MAX_SECONDS (413 past either)
+    - Answers 202 with a job (Location: /jobs/{id}) as soon as the file is
+      spooled; 429 when the user already has JOB_MAX_PENDING_PER_USER waiting
+    - The job decodes it to 16 kHz mono PCM and cuts the silence out block
+      by block while it's read (audio_pipeline.stream_speech), so an upload
+      never sits in memory whole, only its speech
     - Uses Gemini to transcribe and extract amount/category/description
-    - Creates transaction in database
-    - Returns the created transaction
+      (one call with the speech, llm_caller.extract_expenses)
+    - Creates the transactions in database
+    - GET /jobs/{id}/result?wait=30 returns them (VoiceTransactionResponse),
+      or the 400/413 the audio earned (422 when no expense was mentioned,
+      502 when the model call failed)
+    - Retries are answered with the first upload's job (200 once it's done,
+      header Idempotent-Replayed) when they carry the same Idempotency-Key
+      header or the same file within VOICE_DEDUP_TTL_SECONDS; the same
+      recording in another file gets the first result from the job, without
+      a model call (see app.src.upload_dedup)
     """
     if not file.content_type.startswith('audio/'):
         raise HTTPException(status_code=400, detail="File must be audio format")
     
-    # Read audio file
-    audio_data = await file.read()
-    
-    # Process voice input using your teammate's LLM service
-    result = await process_voice_input(audio_data, current_user.id, db)
-    
-    return result
+    # the body is already spooled to a temp file, its size is known up front
+    if file.size is not None and file.size > settings.VOICE_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Audio file is larger than {settings.VOICE_UPLOAD_MAX_BYTES} bytes")
+
+    if idempotency_key:
+        original = await recent_upload(current_user.id, ("key", idempotency_key))
+        if original is not None:
+            return replay_job(original, response)
+
+    job = await submit_job(
+        current_user.id, "voice_upload", file, response, {"filename": file.filename},
+        find_duplicate=lambda sha256: recent_upload(current_user.id, ("file", sha256)),
+    )
+    recent_uploads.put((current_user.id, "file", job.params["sha256"]), job.id)
+    if idempotency_key:
+        recent_uploads.put((current_user.id, "key", idempotency_key), job.id)
+    return job
 
 
 @router.post("/realtime/start")
 async def start_realtime_session(
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """
-    Start a real-time voice session with Gemini.
-    
-    Returns session ID that frontend can use for WebSocket connection.
+    Describe how to open a real-time voice session with Gemini.
+
+    The session itself runs over the /voice/realtime WebSocket.
+    """
+    return {
+        "url": "/voice/realtime?token=<access token>",
+        "input": "binary frames of 16-bit little-endian mono PCM at 16 kHz, ~100 ms each",
+        "output": "binary frames of 16-bit PCM at 24 kHz, plus JSON text frames: "
+                  "transcript, text, tool_result, turn_complete, error",
+        "end": 'send {"type": "end"} or close the socket',
+        "open_sessions": open_sessions,
+        "max_sessions": settings.VOICE_MAX_SESSIONS,
+    }
+
+
+@router.websocket("/realtime")
+async def realtime_voice(websocket: WebSocket, token: str = ""):
+    """
+    Real-time voice session: mic PCM in, Gemini's spoken replies out.
+
+    - Authenticated with ?token= (browsers can't set headers on WebSockets)
+    - Each binary frame goes straight into the AudioSession. Its mic ring is
+      small, so when the model falls behind we stop reading the socket and
+      TCP pushes back on the client instead of buffering audio here (or
+      drop audio, see VOICE_MIC_OVERFLOW)
+    - Replies, transcripts and saved transactions come back as they happen
+    - No database session is held open: auth and every tool call use their own
+    - The Gemini connection comes pre-warmed from live_pool when one is ready
     """
-    # This would need WebSocket implementation
-    # For hackathon, you might skip this and just use file upload
-    return {"message": "Real-time audio not implemented yet"}
\ No newline at end of file
+    global open_sessions
+    try:
+        async with AsyncSessionLocal() as db:
+            user = await authenticate_token(token, db)
+    except HTTPException:
+        await websocket.close(code=1008, reason="Could not validate credentials")
+        return
+    if open_sessions >= settings.VOICE_MAX_SESSIONS:
+        await websocket.close(code=1013, reason="Too many voice sessions, try again later")
+        return
+
+    # counted before accept(): handshakes in flight can't all get past the cap
+    open_sessions += 1
+    live = mic = None
+    try:
+        await websocket.accept()
+
+        async def send_event(event: dict):
+            if event["type"] == "audio":
+                await websocket.send_bytes(event["data"])
+            else:
+                await websocket.send_text(json.dumps(event, default=str))
+
+        session = AudioSession(get_live_client(), voice_tools(user.id), output=send_event, pool=live_pool)
+
+        async def pump_mic():
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes"):
+                    await session.recieve_audio(message["bytes"])
+                elif message.get("text") and json.loads(message["text"]).get("type") == "end":
+                    return
+
+        live = asyncio.create_task(session.activate())
+        mic = asyncio.create_task(pump_mic())
+        done, _ = await asyncio.wait({live, mic}, return_when=asyncio.FIRST_COMPLETED)
+        for task in (live, mic):
+            if task not in done:
+                task.cancel()
+        results = await asyncio.gather(live, mic, return_exceptions=True)
+        error = next((r for r in results if isinstance(r, Exception)
+                      and not isinstance(r, (WebSocketDisconnect, asyncio.CancelledError))), None)
+        if error is not None:
+            logger.warning("Voice session for user %s failed: %r", user.id, error)
+            await websocket.send_text(json.dumps({"type": "error", "detail": "Voice model unavailable"}))
+            await websocket.close(code=1011)
+        else:
+            await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # the client is already gone
+    finally:
+        open_sessions -= 1
+        for task in (live, mic):
+            if task is not None:
+                task.cancel()
+
@@ -14,15 +14,92 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
-    
+    PASSWORD_HASH_WORKERS: int = 0  # 0 = one per CPU
+    PASSWORD_HASH_MAX_PENDING: int = 64  # running + queued, beyond this login/register return 503
+    PASSWORD_HASH_USE_PROCESSES: bool = False
+    AUTH_CACHE_TTL_SECONDS: float = 60
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+
     # APIs
     ANTHROPIC_API_KEY: str
     OPENAI_API_KEY: str
     
+    # LLM
+    LLM_BASE_URL: str = ""  # empty = Google's endpoint; e.g. http://127.0.0.1:8090 for benchmarks/fake_gemini.py
+    LLM_MAX_CONCURRENT_CALLS: int = 8  # in-flight text calls per process
+    LLM_TIMEOUT_SECONDS: float = 60
+    LLM_LIVE_BASE_URL: str = ""  # Live API (voice) endpoint, empty = same as LLM_BASE_URL; see benchmarks/fake_live.py
+
+    # Realtime voice (/voice/realtime WebSocket)
+    VOICE_MAX_SESSIONS: int = 500  # open sessions per process, more are closed with 1013 (try again later)
+    VOICE_MIC_BUFFER_MS: int = 500  # mic audio held per session while the model catches up
+    VOICE_MIC_OVERFLOW: str = "block"  # when it's full: block (TCP backpressure), drop_oldest or drop_newest
+    VOICE_MAX_AMOUNT: float = 100_000  # a spoken amount above this is confirmed with the user, not saved
+    LIVE_POOL_SIZE: int = 0  # Gemini live sessions kept connected ahead of time, 0 = connect per session (opt in, e.g. 4 in production)
+    LIVE_POOL_MAX_IDLE_SECONDS: float = 300.0  # warm sessions older than this are replaced
+    LIVE_POOL_HEALTH_SECONDS: float = 30.0  # how often warm sessions are pinged
+
+    # Audio preprocessing (app/src/audio_pipeline.py)
+    AUDIO_VAD_FRAME_MS: int = 30  # loudness is measured per frame
+    AUDIO_VAD_MARGIN_DB: float = 12.0  # speech = this far above the clip's noise floor...
+    AUDIO_VAD_MIN_DBFS: float = -50.0  # ...and louder than this
+    AUDIO_VAD_PADDING_MS: int = 200  # kept around speech, pauses up to twice this survive
+    VOICE_UPLOAD_MAX_BYTES: int = 25_000_000  # /voice/upload body, larger is rejected with 413
+    VOICE_UPLOAD_MAX_SECONDS: int = 300  # decoded audio, the upload stops with 413 once past it
+    VOICE_DEDUP_TTL_SECONDS: float = 900  # a repeated upload this recent gets the first one's result (app/src/upload_dedup.py)
+    VOICE_DEDUP_MAX_ENTRIES: int = 10000  # per cache, least recently used go first
+
+    # Background jobs (app/src/jobs.py): /voice/upload and /transactions/import answer 202
+    JOB_DATABASE_URL: str = "sqlite:///./jobs.db"  # own file: accepting a job never waits on an import's write lock
+    JOB_WORKERS: int = 4  # jobs running at once per process
+    JOB_MAX_RUNNING_PER_USER: int = 2  # one user's jobs running at once, the rest wait their turn
+    JOB_MAX_RUNNING_IMPORTS: int = 1  # SQLite has one writer, concurrent imports only fight over it
+    JOB_MAX_PENDING_PER_USER: int = 20  # queued + running per user, beyond this 429
+    JOB_MAX_ATTEMPTS: int = 3  # starts (restarts included) before a job is failed
+    JOB_LONG_POLL_MAX_SECONDS: float = 30.0  # longest ?wait= on GET /jobs/{id}
+    JOB_SPOOL_DIR: str = "./job_spool"  # uploads waiting for their job
+
+    # AI route admission control (app/src/admission.py)
+    AI_MAX_IN_FLIGHT: int = 16  # narrative requests generating at once
+    AI_MAX_QUEUED: int = 32  # waiting for a slot, beyond this they're shed immediately
+    AI_QUEUE_TIMEOUT_SECONDS: float = 2.0  # longest wait for a slot before falling back
+    AI_DEADLINE_SECONDS: float = 20.0  # model call budget once admitted, then fall back
+    AI_BREAKER_WINDOW: int = 20  # recent calls the breaker looks at
+    AI_BREAKER_MIN_CALLS: int = 5  # don't open on fewer calls than this
+    AI_BREAKER_FAILURE_RATE: float = 0.5  # failed or slow share that opens it
+    AI_BREAKER_SLOW_SECONDS: float = 10.0  # a call at least this slow counts as failed
+    AI_BREAKER_COOLDOWN_SECONDS: float = 30.0  # open this long before a probe is let through
+
     # Opik
     OPIK_API_KEY: str
     OPIK_WORKSPACE: str
+
+    # Telemetry (app/src/telemetry.py)
+    TELEMETRY_ENABLED: bool = True  # LLM call histograms on /metrics
+    TELEMETRY_OPIK: bool = False  # also send every LLM call to Opik as a trace (needs the opik package)
     
+    # Bulk import
+    IMPORT_BATCH_SIZE: int = 5000  # rows per executemany
+    IMPORT_COMMIT_EVERY: int = 50  # batches per transaction
+    IMPORT_MAX_REPORTED_ERRORS: int = 100
+
+    # Peer groups
+    PEER_STATS_REFRESH_SECONDS: int = 3600  # 0 = don't recompute in the app, use the CLI/cron
+    PEER_SKETCH_SHARDS: int = 1  # >1 = rebuild sketches in this many processes and merge
+
+    # Narratives
+    NARRATIVE_PROMPT_TOKEN_BUDGET: int = 1200  # whole prompt, the spending summary is trimmed to fit
+    NARRATIVE_CACHE_MAX_ENTRIES: int = 1000  # in-process LRU
+    NARRATIVE_CACHE_TTL_SECONDS: float = 86400
+    NARRATIVE_CACHE_PERSIST: bool = True  # also keep narratives in the narrative_cache table
+
+    # Spending patterns
+    PATTERN_WINDOW_WEEKS: int = 26  # weekly series length, at least 8
+
+    # Anomalies
+    ANOMALY_MIN_HISTORY: int = 5  # earlier transactions in the category before scoring starts
+    ANOMALY_THRESHOLD: float = 3.0  # default anomaly_score cutoff for /insights/anomalies
+
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:3000"
     
@@ -34,6 +111,21 @@ class Settings(BaseSettings):
     def cors_origins(self) -> list[str]:
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
 
+    @property
+    def async_database_url(self) -> str:
+        return _async_url(self.DATABASE_URL)
+
+    @property
+    def async_job_database_url(self) -> str:
+        return _async_url(self.JOB_DATABASE_URL)
+
+
+def _async_url(url: str) -> str:
+    # sqlite:///./x.db -> sqlite+aiosqlite:///./x.db
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
 
 @lru_cache()
 def get_settings() -> Settings:
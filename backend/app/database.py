@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -7,6 +8,7 @@ from app.config import get_settings
 settings = get_settings()
 
 # SQLite specific configuration
+# Sync engine: table creation, CLI scripts and bulk jobs running in worker threads
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args={"check_same_thread": False},  # Needed for SQLite
@@ -15,12 +17,50 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine (aiosqlite): used by every request handler so queries
+# don't block the event loop
+async_engine = create_async_engine(
+    settings.async_database_url,
+    echo=settings.DEBUG
+)
+
+# expire_on_commit=False so returned objects can be serialized after commit
+# without an implicit (and in async, illegal) lazy reload
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+# Background job records (app.src.jobs) live in a database of their own:
+# SQLite has one writer per file, and a job must be accepted (and its
+# status updated) while an import holds the main file's write lock
+job_engine = create_async_engine(
+    settings.async_job_database_url,
+    echo=settings.DEBUG
+)
+JobSessionLocal = async_sessionmaker(job_engine, autoflush=False, expire_on_commit=False)
+JobBase = declarative_base()
+
+def upgrade_schema(conn):
+    """
+    Bring a database created by an older version up to the current models.
+
+    create_all only creates missing tables; columns and indexes added to
+    existing ones since (there are no migrations) are added here. Safe to
+    run on every startup.
+    """
+    from sqlalchemy import text
+    from sqlalchemy.schema import CreateIndex
+    from app.models.transactions import Transaction
+
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(transactions)"))}
+    if "anomaly_score" not in columns:
+        conn.execute(text("ALTER TABLE transactions ADD COLUMN anomaly_score FLOAT"))
+    # keyset pagination and the anomaly listing
+    for index in Transaction.__table__.indexes:
+        conn.execute(CreateIndex(index, if_not_exists=True))
+
+
 # Dependency for getting DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
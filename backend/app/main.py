@@ -1,10 +1,22 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 
 from app.config import get_settings
-from app.database import engine, Base
-from app.api import auth, peer_groups, ai_insights, transactions, voice
+from app.database import async_engine, Base, job_engine, JobBase, upgrade_schema
+from app.api import auth, peer_groups, ai_insights, transactions, voice, jobs
+from app.src import rollups, category_stats  # noqa: F401 - register the rollup and anomaly flush hooks
+from app.src.security import password_hasher
+from app.src.principal_cache import principal_cache
+from app.src.narrative_cache import narrative_cache
+from app.src.admission import ai_admission
+from app.src.telemetry import RouteContextMiddleware, gauges, render_metrics
+from app.src.peer_stats import refresh_spending_circles_forever
+from app.src.llm_caller import live_pool
+from app.src.jobs import job_queue
+from app.src.upload_dedup import recent_uploads, recent_speech
 
 # for later, when actually importing functions/endpoints
 # from app.api import auth, transactions, budgets, voice, insights, circles
@@ -18,11 +30,27 @@ settings = get_settings()
 async def lifespan(app: FastAPI):
     # Startup: Create database tables
     print("Starting up...")
-    Base.metadata.create_all(bind=engine)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)  # columns and indexes create_all won't add to old tables
+    async with job_engine.begin() as conn:
+        await conn.run_sync(JobBase.metadata.create_all)
     print("Database tables created")
+    peer_stats_task = None
+    if settings.PEER_STATS_REFRESH_SECONDS > 0:
+        peer_stats_task = asyncio.create_task(refresh_spending_circles_forever())
+    live_pool.start()
+    await job_queue.start()  # picks up jobs the last run left unfinished
     yield
     # Shutdown
     print("Shutting down...")
+    if peer_stats_task is not None:
+        peer_stats_task.cancel()
+    await job_queue.close()
+    await live_pool.close()
+    await async_engine.dispose()
+    await job_engine.dispose()
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -41,6 +69,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tags LLM calls with the route that made them, see app.src.telemetry
+app.add_middleware(RouteContextMiddleware)
+
 # Include routers - LATER
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(transactions.router, prefix="/transactions", tags=["Transactions"])
@@ -48,6 +79,7 @@ app.include_router(transactions.router, prefix="/transactions", tags=["Transacti
 app.include_router(voice.router, prefix="/voice", tags=["Voice Input"])
 app.include_router(ai_insights.router, prefix="/insights", tags=["AI Insights"])
 app.include_router(peer_groups.router, prefix="/circles", tags=["Spending Circles"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
 
 
 @app.get("/")
@@ -61,7 +93,31 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "auth_cache": principal_cache.stats(),
+        "narrative_cache": narrative_cache.stats(),
+        "ai_admission": ai_admission.stats(),
+        "live_pool": live_pool.stats(),
+        "jobs": job_queue.stats(),
+        "voice_dedup": {"uploads": recent_uploads.stats(), "speech": recent_speech.stats()},
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: LLM call histograms plus admission control, live pool, job queue and voice dedup state."""
+    return PlainTextResponse(
+        render_metrics(
+            gauges("ai_admission", ai_admission.stats())
+            + gauges("live_pool", live_pool.stats())
+            + gauges("jobs", job_queue.stats())
+            + gauges("voice_dedup_uploads", recent_uploads.stats())
+            + gauges("voice_dedup_speech", recent_speech.stats())
+            + job_queue.render()
+        ),
+        media_type="text/plain; version=0.0.4",
+    )
 
 
 # to run uvicorn
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from datetime import datetime
+
+from app.database import JobBase
+
+
+class Job(JobBase):
+    """
+    A background job (app.src.jobs), e.g. one /voice/upload or one
+    /transactions/import. The row outlives the process: queued and running
+    jobs are picked up again on startup. In the job database
+    (JOB_DATABASE_URL), so user_id is not a foreign key.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)  # uuid4 hex, unguessable
+    user_id = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # "voice_upload", "import"
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    params = Column(JSON, nullable=False, default=dict)  # e.g. the upload's filename
+    spool_path = Column(String)  # the uploaded file, removed once the job is over
+    attempts = Column(Integer, nullable=False, default=0)  # times a worker started it
+    result = Column(JSON)  # the response the synchronous route would have sent
+    error = Column(String)
+    error_status = Column(Integer)  # ...and its HTTP status when it failed
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        # startup looks for the unfinished ones, users list their own
+        Index("ix_jobs_status_created", "status", "created_at"),
+        Index("ix_jobs_user_created", "user_id", "created_at"),
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from datetime import datetime
+
+from app.database import Base
+
+
+class NarrativeCacheEntry(Base):
+    """
+    Persistent tier of the narrative cache (app.src.narrative_cache).
+    One row per user and time period; the row only counts as a hit while
+    its fingerprint matches the data the narrative would be built from.
+    """
+    __tablename__ = "narrative_cache"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    time_period = Column(String, primary_key=True)  # "week", "month", "year"
+    fingerprint = Column(String, nullable=False)  # sha256 of the narrative inputs
+    response = Column(JSON, nullable=False)  # NarrativeResponse as a dict
+
+    created_at = Column(DateTime, default=datetime.utcnow)
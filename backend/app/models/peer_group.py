@@ -1,16 +1,54 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, LargeBinary, UniqueConstraint
+from sqlalchemy import Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
 
-from user import IncomeRange
+from app.models.user import IncomeRange
+from app.models.transactions import TransactionCategory
 
 
 class SpendingCircle(Base):
+    """
+    Precomputed distribution of per-user spending for one income bracket
+    and category (category NULL = all categories combined).
+    Written by app.src.peer_stats, read by /circles/compare.
+    """
     __tablename__ = "peer_groups"
-    
-    income_range = Column(IncomeRange)
+
+    id = Column(Integer, primary_key=True, index=True)
+    income_range = Column(SQLEnum(IncomeRange), nullable=False)
+    category = Column(SQLEnum(TransactionCategory), nullable=True)
+    peer_count = Column(Integer, nullable=False)  # users in the bracket
     avg_spending = Column(Float)
-    percentile_data = Column(JSON)
+    median_spending = Column(Float)
+    percentile_data = Column(JSON)  # percentile_data[p] = p-th percentile of per-user totals, p = 0..100
+
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("income_range", "category", name="uq_peer_groups_range_category"),
+    )
+
+
+class PeerSketch(Base):
+    """
+    Quantile sketch of per-user spending totals for one income bracket and
+    category (category NULL = all categories combined), same populations as
+    SpendingCircle. Updated on every transaction write by app.src.peer_sketches.
+    """
+    __tablename__ = "peer_sketches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    income_range = Column(SQLEnum(IncomeRange), nullable=False)
+    category = Column(SQLEnum(TransactionCategory), nullable=True)
+    inserted = Column(LargeBinary, nullable=False)  # serialized KLLSketch of values added
+    retracted = Column(LargeBinary, nullable=False)  # serialized KLLSketch of values taken back out
+    total = Column(Float, nullable=False, default=0.0)  # exact sum of live values
+    peer_count = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
-    # other fields needed
\ No newline at end of file
+    __table_args__ = (
+        UniqueConstraint("income_range", "category", name="uq_peer_sketches_range_category"),
+    )
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Enum as SQLEnum
+
+from app.database import Base
+from app.models.transactions import TransactionCategory
+
+
+class SpendingRollup(Base):
+    """
+    Pre-aggregated spending per user, category and month.
+    Kept in sync with transactions by app.src.rollups, never written directly.
+    """
+    __tablename__ = "spending_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category = Column(SQLEnum(TransactionCategory), primary_key=True)
+    month = Column(String, primary_key=True)  # "YYYY-MM"
+
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+    min_amount = Column(Float)
+    max_amount = Column(Float)
+    sum_squares = Column(Float, nullable=False, default=0.0)  # for variance: sum_squares/count - (total/count)^2
+
+
+class CategoryStats(Base):
+    """
+    Running mean/variance (Welford) of transaction amounts per user and
+    category, used to give every new transaction an anomaly score.
+    Kept in sync by app.src.category_stats, never written directly.
+    """
+    __tablename__ = "category_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category = Column(SQLEnum(TransactionCategory), primary_key=True)
+
+    count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float, nullable=False, default=0.0)
+    m2 = Column(Float, nullable=False, default=0.0)  # sum of squared deviations from the mean
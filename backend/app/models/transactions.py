@@ -1,22 +1,22 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy import Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from enum import Enum
 from app.database import Base
 
-class TransactionCategory(Enum):
-    "Food & Dining",
-    "Transportation",
-    "Shopping",
-    "Entertainment",
-    "Bills & Utilities",
-    "Healthcare",
-    "Education",
-    "Travel",
-    "Personal Care",
-    "Groceries",
-    "Other"
+class TransactionCategory(str, Enum):
+    FOOD_DINING = "Food & Dining"
+    TRANSPORTATION = "Transportation"
+    SHOPPING = "Shopping"
+    ENTERTAINMENT = "Entertainment"
+    BILLS_UTILITIES = "Bills & Utilities"
+    HEALTHCARE = "Healthcare"
+    EDUCATION = "Education"
+    TRAVEL = "Travel"
+    PERSONAL_CARE = "Personal Care"
+    GROCERIES = "Groceries"
+    OTHER = "Other"
 
 class Transaction(Base):
     __tablename__ = "transactions"
@@ -30,8 +30,19 @@ class Transaction(Base):
     notes = Column(String)
     input_method = Column(String, default="manual")  # "manual" or "voice"
     created_at = Column(DateTime, default=datetime.utcnow)
+    # z-score of amount against the user's earlier transactions in the
+    # category when it was written, None until there is enough history
+    anomaly_score = Column(Float)
     
     # Relationship to User (optional but useful)
     user = relationship("User", back_populates="transactions")
 
+    # Every per-user query filters on user_id and walks rows by (date, id),
+    # these also back the keyset pagination in GET /transactions
+    __table_args__ = (
+        Index("ix_transactions_user_date_id", "user_id", "date", "id"),
+        Index("ix_transactions_user_category_date_id", "user_id", "category", "date", "id"),
+        # GET /insights/anomalies seeks straight to the high scores
+        Index("ix_transactions_user_anomaly_score", "user_id", "anomaly_score"),
+    )
 
@@ -12,6 +12,7 @@ class NarrativeResponse(BaseModel):
     spending_by_category: dict[str, float]
     recommendations: list[str]
     generated_at: str
+    degraded: bool = False  # True = written locally without the AI, see X-Degraded
 
 class SpendingPattern(BaseModel):
     """Identified spending patterns."""
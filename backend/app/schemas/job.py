@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+
+class JobResponse(BaseModel):
+    """A background job, see app.src.jobs."""
+    id: str
+    kind: str  # "voice_upload", "import"
+    status: str  # queued, running, succeeded, failed
+    result: dict | None = None  # once succeeded: what the route used to return directly
+    error: str | None = None  # once failed
+    error_status: int | None = None  # the HTTP status that failure maps to
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
@@ -11,6 +11,8 @@ class GroupComparison(BaseModel):
     your_spending: float
     peer_avg: float
     peer_median: float
+    peer_p25: float | None = None
+    peer_p75: float | None = None
     percentile: int  # Where you rank (0-100)
     comparison_text: str  # "You spend 30% less than peers"
 
@@ -1,10 +1,12 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
 
+from app.models.transactions import TransactionCategory
+
 
 class TransactionCreate(BaseModel):
     amount: float = Field(..., gt=0)
-    category: str
+    category: TransactionCategory
     merchant: str | None = None
     date: datetime | None = None
     notes: str | None = None
@@ -26,13 +28,32 @@ class TransactionResponse(BaseModel):
     notes: str | None
     input_method: str
     created_at: datetime
+    anomaly_score: float | None = None  # z-score within the user's category, see /insights/anomalies
     
     class Config:
         from_attributes = True
 
+class TransactionPage(BaseModel):
+    """One page of a keyset-paginated transaction listing."""
+    items: list[TransactionResponse]
+    next_cursor: str | None  # pass back as ?cursor= to get the next page, None on the last page
+
 class TransactionSummary(BaseModel):
     """Summary of spending by category."""
     category: str
     total: float
     count: int
-    avg: float
\ No newline at end of file
+    avg: float
+
+class ImportRowError(BaseModel):
+    """A row that failed validation during a bulk import."""
+    row: int  # 1-based, not counting the CSV header
+    error: str
+
+
+class ImportResult(BaseModel):
+    """Outcome of a bulk transaction import."""
+    imported: int
+    failed: int
+    skipped: int = 0  # not spending, e.g. OFX credits (salary, refunds)
+    errors: list[ImportRowError]  # capped, see IMPORT_MAX_REPORTED_ERRORS
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
 
+from app.schemas.transactions import TransactionResponse
+
 
 class VoiceTranscription(BaseModel):
     text: str
@@ -9,5 +11,19 @@ class VoiceTranscription(BaseModel):
 class VoiceTransactionResponse(BaseModel):
     """Response after processing voice input."""
     transcription: str
-    transaction: dict  # The created transaction
-    confidence: float
\ No newline at end of file
+    transaction: TransactionResponse  # The created transaction (the first, if there were several)
+    transactions: list[TransactionResponse] = []  # every transaction created from the recording
+    confidence: float
+
+class ExtractedExpense(BaseModel):
+    """One expense the model heard in an uploaded recording, checked against TransactionCreate before saving."""
+    amount: float
+    category: str
+    description: str | None = None
+
+
+class VoiceExtraction(BaseModel):
+    """What llm_caller.extract_expenses gets back from the model (its response schema)."""
+    transcription: str
+    expenses: list[ExtractedExpense]
+    confidence: float
@@ -0,0 +1,198 @@
+"""
+Admission control for the AI insight routes.
+
+A slow or failing model must not tie up the whole worker: every request
+that would call the LLM goes through an AdmissionController first.
+
+- At most max_in_flight run at once. Up to max_queued more may wait, each
+  for at most queue_timeout seconds. Anything beyond that is shed at once.
+- A CircuitBreaker watches the outcomes. Once enough of the last `window`
+  calls failed or took longer than slow_seconds, it opens and requests are
+  shed without trying. After cooldown_seconds it lets a single probe
+  through (half open): success closes it, failure opens it again.
+
+Shed requests raise Rejected. The routes answer those with the local
+degraded narrative instead of an error. A caller that stops waiting on
+the model (the SSE client left) raises ClientGone inside admit(): like a
+cancellation, that is not an outcome. stats() feeds /health.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from app.config import get_settings
+
+settings = get_settings()
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class Rejected(Exception):
+    """The request was shed; reason is "overloaded", "queue_timeout" or "circuit_open"."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class ClientGone(Exception):
+    """Raised inside admit() when the client left before the model finished."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: int,
+        min_calls: int,
+        failure_rate: float,
+        slow_seconds: float,
+        cooldown_seconds: float,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True = failed or slow
+
+    def allow(self) -> tuple[bool, bool]:
+        """(allowed, probe): probe is True for the one call let through half open."""
+        if self.state == CLOSED:
+            return True, False
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True, True
+        return False, False
+
+    def record(self, ok: bool, seconds: float, probe: bool = False):
+        bad = not ok or seconds >= self.slow_seconds
+        if self.state == HALF_OPEN:
+            if not probe:
+                return  # admitted before it opened, only the probe decides
+            self._probing = False
+            if bad:
+                self._open()
+            else:
+                self.state = CLOSED
+                self._outcomes.clear()
+            return
+        if self.state == OPEN:
+            return  # stragglers admitted before it opened
+        self._outcomes.append(bad)
+        if (
+            self.state == CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+        ):
+            self._open()
+
+    def release_probe(self):
+        # the probe never reached the model (queued out, shed or cancelled): let another through
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self._outcomes.clear()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "times_opened": self.times_opened,
+            "recent_failures": sum(self._outcomes),
+            "recent_calls": len(self._outcomes),
+        }
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int, max_queued: int, queue_timeout: float, breaker: CircuitBreaker):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = {"overloaded": 0, "queue_timeout": 0, "circuit_open": 0}
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    def _reject(self, reason: str):
+        self.shed[reason] += 1
+        return Rejected(reason)
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Hold a slot for the body of the with block. Raises Rejected instead
+        of entering when the request is shed; exceptions and time spent in
+        the block are reported to the breaker.
+        """
+        allowed, probe = self.breaker.allow()
+        if not allowed:
+            raise self._reject("circuit_open")
+        try:
+            if self._slots.locked() and self.queued >= self.max_queued:
+                raise self._reject("overloaded")
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("queue_timeout")
+            finally:
+                self.queued -= 1
+        except BaseException:
+            # shed, or cancelled while queued (e.g. the SSE client left)
+            if probe:
+                self.breaker.release_probe()
+            raise
+
+        self.in_flight += 1
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        except (asyncio.CancelledError, GeneratorExit, ClientGone):
+            # client went away, says nothing about the model
+            if probe:
+                self.breaker.release_probe()
+            raise
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started, probe)
+            raise
+        else:
+            self.breaker.record(True, time.monotonic() - started, probe)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "breaker": self.breaker.stats(),
+        }
+
+
+ai_admission = AdmissionController(
+    max_in_flight=settings.AI_MAX_IN_FLIGHT,
+    max_queued=settings.AI_MAX_QUEUED,
+    queue_timeout=settings.AI_QUEUE_TIMEOUT_SECONDS,
+    breaker=CircuitBreaker(
+        window=settings.AI_BREAKER_WINDOW,
+        min_calls=settings.AI_BREAKER_MIN_CALLS,
+        failure_rate=settings.AI_BREAKER_FAILURE_RATE,
+        slow_seconds=settings.AI_BREAKER_SLOW_SECONDS,
+        cooldown_seconds=settings.AI_BREAKER_COOLDOWN_SECONDS,
+    ),
+)
@@ -0,0 +1,462 @@
+"""
+Audio preprocessing for voice input.
+
+Whatever the client uploads becomes what AudioSession.recieve_audio and
+the Live API expect: 16 kHz mono 16-bit PCM, with the silence cut out.
+
+1. decode: WAV is parsed as it arrives (WavDecoder), anything else goes
+   through ffmpeg, which also does step 2 for it
+2. downmix and resample with NumPy (Resampler)
+3. energy VAD (SpeechGate): RMS per AUDIO_VAD_FRAME_MS frame. A frame is
+   speech when it is AUDIO_VAD_MARGIN_DB above the noise floor (the 10th
+   percentile frame of the last VAD_HISTORY_SECONDS) and louder than
+   AUDIO_VAD_MIN_DBFS. When even that floor is more than the margin above
+   AUDIO_VAD_MIN_DBFS there is no silence to measure against, and every
+   frame louder than AUDIO_VAD_MIN_DBFS is kept. Speech is padded by
+   AUDIO_VAD_PADDING_MS so word edges and short pauses survive, every
+   other frame is dropped
+
+Each stage keeps just enough state to carry on where the previous block
+stopped, so stream_speech() gets through an upload of any length in
+constant memory. preprocess_audio() runs the same stages over one buffer.
+Already 16 kHz mono 16-bit input skips step 2 entirely.
+"""
+import asyncio
+import io
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.utils import get_encoder_name
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+
+settings = get_settings()
+
+SAMPLE_RATE = 16000  # what the Live API takes in
+ANTI_ALIAS_TAPS = 31
+VAD_HISTORY_SECONDS = 10  # noise floor window when streaming
+READ_SIZE = 256 * 1024  # bytes of upload handled per step
+
+SAMPLE_TYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+FULL_SCALE = {1: 128.0, 2: 32768.0, 4: 2147483648.0}
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+WAV_MAX_HEADER = 1024 * 1024  # fmt, LIST/INFO, ... before the data chunk
+
+
+class AudioLimitExceeded(ValueError):
+    """The upload is over VOICE_UPLOAD_MAX_BYTES or VOICE_UPLOAD_MAX_SECONDS."""
+
+
+@dataclass
+class ProcessedAudio:
+    pcm: np.ndarray  # int16, 16 kHz mono, silent frames removed
+    input_seconds: float
+    timings: dict = field(default_factory=dict)  # stage -> seconds
+
+    @property
+    def seconds(self) -> float:
+        return len(self.pcm) / SAMPLE_RATE
+
+    @property
+    def nbytes(self) -> int:
+        return self.pcm.nbytes
+
+    @property
+    def has_speech(self) -> bool:
+        return len(self.pcm) > 0
+
+
+def is_wav(data: bytes) -> bool:
+    return data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+
+def _guess_format(data: bytes, filename: str | None) -> str | None:
+    if is_wav(data):
+        return "wav"
+    if filename and "." in filename:
+        return filename.rsplit(".", 1)[1].lower()
+    return None  # let ffmpeg probe it
+
+
+def decode_audio(data: bytes, filename: str | None = None) -> AudioSegment:
+    """Raises ValueError when the bytes aren't audio pydub/ffmpeg can read."""
+    try:
+        return AudioSegment.from_file(io.BytesIO(data), format=_guess_format(data, filename))
+    except Exception as exc:  # pydub raises CouldntDecodeError, but also whatever ffmpeg/wave throw
+        raise ValueError(f"Could not decode audio: {exc}") from exc
+
+
+def downmix(samples: np.ndarray, channels: int, width: int) -> np.ndarray:
+    """Interleaved integer samples -> mono float32 in [-1, 1)."""
+    mono = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    if width == 1:
+        return mono / FULL_SCALE[1] - 1.0  # 8-bit WAV is unsigned
+    return mono / FULL_SCALE[width]
+
+
+def to_int16(mono: np.ndarray) -> np.ndarray:
+    return (np.clip(mono, -1.0, 32767 / 32768) * 32768).astype(np.int16)
+
+
+def to_mono_16k(segment: AudioSegment) -> np.ndarray:
+    """int16 samples at SAMPLE_RATE, mono. A view of segment's buffer if it already is."""
+    width = segment.sample_width
+    if width not in SAMPLE_TYPES:
+        segment = segment.set_sample_width(2)
+        width = 2
+    samples = np.frombuffer(segment.raw_data, dtype=SAMPLE_TYPES[width])
+    if width == 2 and segment.channels == 1 and segment.frame_rate == SAMPLE_RATE:
+        return samples
+    mono = downmix(samples, segment.channels, width)
+    return to_int16(Resampler(segment.frame_rate).feed(mono))
+
+
+class Resampler:
+    """
+    Linear interpolation, after a windowed-sinc low-pass when going down
+    (so 44.1 kHz hiss doesn't alias into the speech band). feed() takes
+    blocks of any size; the filter history and the interpolation position
+    carry over, so the blocks join up without clicks.
+    """
+
+    def __init__(self, rate: int, target: int = SAMPLE_RATE):
+        self.step = rate / target
+        self.taps = None
+        if rate > target:
+            cutoff = 0.5 * target / rate
+            n = np.arange(ANTI_ALIAS_TAPS) - (ANTI_ALIAS_TAPS - 1) / 2
+            taps = np.sinc(2 * cutoff * n) * np.hamming(ANTI_ALIAS_TAPS)
+            self.taps = (taps / taps.sum()).astype(np.float32)
+        self._history = np.zeros(ANTI_ALIAS_TAPS - 1, dtype=np.float32)  # filter input tail
+        self._last = np.zeros(0, dtype=np.float32)  # previous block's last sample
+        self._position = 0.0  # next output, in input samples from _last
+
+    def feed(self, samples: np.ndarray) -> np.ndarray:
+        if self.step == 1.0 or len(samples) == 0:
+            return samples
+        if self.taps is not None:
+            extended = np.concatenate((self._history, samples))
+            self._history = extended[-(ANTI_ALIAS_TAPS - 1):]
+            samples = np.convolve(extended, self.taps, mode="valid")
+        buffer = np.concatenate((self._last, samples))
+        count = max(0, int(np.ceil((len(buffer) - 1 - self._position) / self.step)))
+        positions = self._position + np.arange(count, dtype=np.float64) * self.step
+        left = positions.astype(np.int64)
+        frac = (positions - left).astype(np.float32)
+        self._position += count * self.step - (len(buffer) - 1)
+        self._last = buffer[-1:]
+        return buffer[left] * (1 - frac) + buffer[left + 1] * frac
+
+
+class SpeechGate:
+    """
+    Energy VAD over int16 16 kHz blocks. feed() returns the speech (and its
+    padding) it can already decide on; the last padding's worth of frames
+    waits for the next block in case speech starts there. final=True (or
+    flush()) decides everything.
+    """
+
+    def __init__(
+        self,
+        frame_ms: int = settings.AUDIO_VAD_FRAME_MS,
+        margin_db: float = settings.AUDIO_VAD_MARGIN_DB,
+        min_dbfs: float = settings.AUDIO_VAD_MIN_DBFS,
+        padding_ms: int = settings.AUDIO_VAD_PADDING_MS,
+        history_seconds: float = VAD_HISTORY_SECONDS,
+    ):
+        self.frame = SAMPLE_RATE * frame_ms // 1000
+        self.margin_db = margin_db
+        self.min_dbfs = min_dbfs
+        self.pad = -(-padding_ms // frame_ms)  # ceil
+        self.history = int(history_seconds * 1000 / frame_ms)
+        self._levels = np.zeros(0, dtype=np.float32)  # recent frame levels, for the noise floor
+        self._partial = np.zeros(0, dtype=np.int16)  # samples short of a whole frame
+        self._pending = np.zeros((0, self.frame), dtype=np.int16)  # frames not decided yet
+        self._pending_speech = np.zeros(0, dtype=bool)
+        self._before = np.zeros(0, dtype=bool)  # speech flags of the frames before _pending
+
+    def _speech(self, frames: np.ndarray) -> np.ndarray:
+        floats = frames.astype(np.float32)
+        power = np.einsum("ij,ij->i", floats, floats) / (self.frame * 32768.0 ** 2)
+        level = 10 * np.log10(power + 1e-12)  # dBFS per frame
+        self._levels = np.concatenate((self._levels, level))[-self.history:]
+        noise_floor = np.percentile(self._levels, 10)
+        if noise_floor > self.min_dbfs + self.margin_db:
+            # no real silence in the window (continuous speech, a clip the
+            # client already trimmed): the floor is speech, not noise
+            return level > self.min_dbfs
+        return level > max(noise_floor + self.margin_db, self.min_dbfs)
+
+    def feed(self, pcm: np.ndarray, final: bool = False) -> np.ndarray:
+        if len(self._partial):
+            pcm = np.concatenate((self._partial, pcm))
+        n_frames = len(pcm) // self.frame
+        self._partial = pcm[n_frames * self.frame:].copy()
+        frames = pcm[:n_frames * self.frame].reshape(n_frames, self.frame)
+        speech = self._speech(frames) if n_frames else np.zeros(0, dtype=bool)
+
+        frames = np.concatenate((self._pending, frames))
+        speech = np.concatenate((self._pending_speech, speech))
+        keep = speech
+        if self.pad and (speech.any() or self._before.any()):
+            window = np.concatenate((self._before, speech))
+            kernel = np.ones(2 * self.pad + 1, dtype=np.int8)
+            keep = (np.convolve(window, kernel, mode="same") > 0)[len(self._before):]
+        decided = len(frames) if final else max(0, len(frames) - self.pad)
+        self._before = np.concatenate((self._before, speech[:decided]))[-self.pad:] if self.pad else self._before
+        self._pending = frames[decided:].copy()
+        self._pending_speech = speech[decided:]
+        return frames[:decided][keep[:decided]].reshape(-1)
+
+    def flush(self) -> np.ndarray:
+        return self.feed(np.zeros(0, dtype=np.int16), final=True)
+
+
+class WavDecoder:
+    """
+    Incremental WAV parser: feed() file bytes as they arrive, get samples
+    back once the data chunk has started. Integer PCM (8/16/24/32-bit) and
+    32-bit float; anything else is a ValueError.
+    """
+
+    def __init__(self):
+        self._header = bytearray()
+        self._leftover = b""  # less than one sample frame
+        self._remaining = None  # data chunk bytes still to come, None = until EOF
+        self.started = False
+        self.channels = self.rate = self.width = None
+        self.float = False
+
+    def feed(self, data: bytes) -> np.ndarray | None:
+        if not self.started:
+            self._header += data
+            data = self._parse_header()
+            if data is None:
+                if len(self._header) > WAV_MAX_HEADER:
+                    raise ValueError("Could not decode audio: no data chunk in the WAV file")
+                return None
+        if self._remaining is not None:
+            data = data[:self._remaining]  # chunks after the data (LIST, id3) aren't audio
+            self._remaining -= len(data)
+        if self._leftover:
+            data = self._leftover + data
+        block = self.channels * self.width
+        usable = len(data) - len(data) % block
+        self._leftover = bytes(data[usable:])
+        return self._samples(data[:usable])
+
+    def _parse_header(self) -> bytes | None:
+        header = self._header
+        if len(header) < 12:
+            return None
+        if not is_wav(header):
+            raise ValueError("Could not decode audio: not a WAV file")
+        offset = 12
+        while len(header) >= offset + 8:
+            chunk_id, size = struct.unpack_from("<4sI", header, offset)
+            body = offset + 8
+            if chunk_id == b"data":
+                if not self.channels:
+                    raise ValueError("Could not decode audio: WAV data before its format")
+                self.started = True
+                # 0 and 0xFFFFFFFF are what recorders write when they don't know the length yet
+                self._remaining = size if 0 < size < 0xFFFFFFFF else None
+                rest = bytes(header[body:])
+                self._header = bytearray()
+                return rest
+            if len(header) < body + size:
+                return None
+            if chunk_id == b"fmt ":
+                self._parse_format(bytes(header[body:body + size]))
+            offset = body + size + (size & 1)  # chunks are word aligned
+        return None
+
+    def _parse_format(self, fmt: bytes):
+        tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", fmt)
+        if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            tag = struct.unpack_from("<H", fmt, 24)[0]  # the sub format GUID starts with the tag
+        width = -(-bits // 8)  # e.g. 12-bit samples are stored (left-justified) in 2 bytes
+        if tag == WAVE_FORMAT_FLOAT and width == 4:
+            self.float = True
+        elif tag != WAVE_FORMAT_PCM or width not in (1, 2, 3, 4):
+            raise ValueError(f"Could not decode audio: unsupported WAV format {tag}, {bits}-bit")
+        if not channels or not rate:
+            raise ValueError("Could not decode audio: bad WAV format chunk")
+        self.channels, self.rate, self.width = channels, rate, width
+
+    def _samples(self, data: bytes) -> np.ndarray:
+        if self.float:
+            return np.frombuffer(data, dtype="<f4")
+        if self.width == 3:
+            # 24-bit: widen to int32 with a zero low byte
+            raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+            wide = np.zeros((len(raw), 4), dtype=np.uint8)
+            wide[:, 1:] = raw
+            return wide.view("<i4").reshape(-1)
+        return np.frombuffer(data, dtype=SAMPLE_TYPES[self.width])
+
+    @property
+    def is_model_format(self) -> bool:
+        return not self.float and self.width == 2 and self.channels == 1 and self.rate == SAMPLE_RATE
+
+    def to_mono(self, samples: np.ndarray) -> np.ndarray:
+        """float32 mono of what feed() returned."""
+        if self.float:
+            return samples.reshape(-1, self.channels).mean(axis=1, dtype=np.float32)
+        return downmix(samples, self.channels, 4 if self.width == 3 else self.width)
+
+
+class WavSpeechStream:
+    """WavDecoder -> Resampler -> SpeechGate, one block of file bytes at a time."""
+
+    def __init__(self, max_seconds: float | None = None):
+        self.decoder = WavDecoder()
+        self.resampler = None
+        self.gate = SpeechGate()
+        self.max_seconds = max_seconds
+        self.input_seconds = 0.0
+
+    def feed(self, data: bytes) -> np.ndarray:
+        decoder = self.decoder
+        samples = decoder.feed(data)
+        if samples is None or len(samples) == 0:
+            return np.zeros(0, dtype=np.int16)
+        self.input_seconds += len(samples) / decoder.channels / decoder.rate
+        if self.max_seconds is not None and self.input_seconds > self.max_seconds:
+            raise AudioLimitExceeded(f"Audio is longer than {self.max_seconds:g} seconds")
+        if decoder.is_model_format:
+            return self.gate.feed(samples)
+        if self.resampler is None:
+            self.resampler = Resampler(decoder.rate)
+        return self.gate.feed(to_int16(self.resampler.feed(decoder.to_mono(samples))))
+
+    def flush(self) -> np.ndarray:
+        if not self.decoder.started:
+            raise ValueError("Could not decode audio: the WAV file has no data")
+        return self.gate.flush()
+
+
+async def _ffmpeg_speech(
+    first: bytes, read: Callable[[int], Awaitable[bytes]], max_seconds: float | None
+) -> AsyncIterator[np.ndarray]:
+    # ffmpeg decodes, downmixes and resamples; only the VAD runs here
+    try:
+        process = await asyncio.create_subprocess_exec(
+            get_encoder_name(), "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+            "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise ValueError("Could not decode audio: only WAV can be read without ffmpeg")
+
+    async def write_input():
+        try:
+            block = first
+            while block:
+                process.stdin.write(block)
+                await process.stdin.drain()  # ffmpeg's pipe is full = stop reading the upload
+                block = await read(READ_SIZE)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg gave up, its exit code says why
+        finally:
+            process.stdin.close()
+
+    writer = asyncio.create_task(write_input())
+    gate = SpeechGate()
+    decoded = 0
+    leftover = b""
+    try:
+        while block := await process.stdout.read(READ_SIZE):
+            block = leftover + block
+            usable = len(block) - len(block) % 2
+            leftover = block[usable:]
+            decoded += usable // 2
+            if max_seconds is not None and decoded / SAMPLE_RATE > max_seconds:
+                raise AudioLimitExceeded(f"Audio is longer than {max_seconds:g} seconds")
+            speech = gate.feed(np.frombuffer(block, dtype=np.int16, count=usable // 2))
+            if len(speech):
+                yield speech
+        await writer
+        if await process.wait() != 0:
+            error = (await process.stderr.read()).decode(errors="replace").strip()
+            raise ValueError(f"Could not decode audio: {error[-200:]}")
+        speech = gate.flush()
+        if len(speech):
+            yield speech
+    finally:
+        writer.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+
+async def stream_speech(
+    read: Callable[[int], Awaitable[bytes]],
+    max_bytes: int | None = None,
+    max_seconds: float | None = None,
+) -> AsyncIterator[np.ndarray]:
+    """
+    Speech-only 16 kHz mono int16 blocks from an async read(n), e.g.
+    UploadFile.read, READ_SIZE bytes at a time.
+
+    - Memory stays at a couple of blocks however long the input is
+    - Raises AudioLimitExceeded as soon as max_bytes were read or
+      max_seconds decoded, without reading the rest
+    - Raises ValueError for undecodable input
+    """
+    total = 0
+
+    async def read_limited(size: int) -> bytes:
+        nonlocal total
+        block = await read(size)
+        total += len(block)
+        if max_bytes is not None and total > max_bytes:
+            raise AudioLimitExceeded(f"Upload is larger than {max_bytes} bytes")
+        return block
+
+    first = await read_limited(READ_SIZE)
+    if not is_wav(first):
+        async for speech in _ffmpeg_speech(first, read_limited, max_seconds):
+            yield speech
+        return
+
+    stream = WavSpeechStream(max_seconds)
+    block = first
+    while block:
+        # a block is a few ms of NumPy, but that's a few ms per upload per block off the event loop
+        speech = await run_in_threadpool(stream.feed, block)
+        if len(speech):
+            yield speech
+        block = await read_limited(READ_SIZE)
+    speech = stream.flush()
+    if len(speech):
+        yield speech
+
+
+def preprocess_audio(data: bytes, filename: str | None = None) -> ProcessedAudio:
+    """
+    Whole clip bytes -> speech-only 16 kHz mono PCM. CPU bound, call it
+    from a worker thread. Raises ValueError for undecodable input. Uploads
+    go through stream_speech instead.
+    """
+    started = time.perf_counter()
+    segment = decode_audio(data, filename)
+    decoded = time.perf_counter()
+    pcm = to_mono_16k(segment)
+    converted = time.perf_counter()
+    # the whole clip sets the noise floor
+    speech = SpeechGate(history_seconds=len(segment) / 1000 + 1).feed(pcm, final=True)
+    done = time.perf_counter()
+    return ProcessedAudio(
+        pcm=speech,
+        input_seconds=len(segment) / 1000,
+        timings={"decode": decoded - started, "resample": converted - decoded, "vad": done - converted},
+    )
@@ -0,0 +1,223 @@
+"""
+Keeps the category_stats table in step with transactions and scores new
+transactions against it.
+
+Each (user, category) row holds a Welford running count/mean/M2 of the
+amounts. A new transaction's anomaly_score is its z-score against the row
+as it was just before the write, then the amount is folded in: one primary
+key read and one upsert per (user, category) touched, whatever the history
+size. Deletes and edits take the old amount back out (Welford runs
+backwards just as well), so nothing on the write path ever rescans
+transactions. Deleting a user deletes their rows.
+
+The ORM hook at the bottom covers session writes, the importer calls
+track_amounts itself. Rounding drift from many removals, or writes made
+behind the ORM's back, are fixed by a rebuild, which streams each user's
+transactions in (date, id) order through the same accumulator:
+
+    cd backend
+    python -m app.src.category_stats [--user USER_ID] [--rescore]
+"""
+import math
+from dataclasses import dataclass
+from typing import Iterable
+
+from sqlalchemy import bindparam, delete, event, func, inspect, select, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.rollup import CategoryStats
+from app.models.transactions import Transaction, TransactionCategory
+from app.models.user import User
+
+settings = get_settings()
+
+category_stats = CategoryStats.__table__
+transactions = Transaction.__table__
+
+# (user_id, category)
+StatsKey = tuple[int, TransactionCategory]
+
+# (user_id, category, amount, +1 added / -1 removed)
+AmountChange = tuple[int, object, float, int]
+
+TRACKED_FIELDS = ("user_id", "category", "amount")
+
+# spread never counts as less than this fraction of the mean, so a user who
+# always pays exactly 10 still gets a (large) finite score for paying 500
+MIN_RELATIVE_SPREAD = 0.05
+
+
+@dataclass
+class RunningStats:
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def add(self, amount: float):
+        self.count += 1
+        delta = amount - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (amount - self.mean)
+
+    def remove(self, amount: float):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = amount - self.mean
+        self.count -= 1
+        self.mean -= delta / self.count
+        self.m2 = max(self.m2 - delta * (amount - self.mean), 0.0)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def score(self, amount: float) -> float | None:
+        """z-score of amount, None with fewer than ANOMALY_MIN_HISTORY values."""
+        if self.count < max(settings.ANOMALY_MIN_HISTORY, 2):
+            return None
+        spread = max(self.std, MIN_RELATIVE_SPREAD * abs(self.mean), 1e-9)
+        return round((amount - self.mean) / spread, 3)
+
+
+def load_stats(connection: Connection, keys: Iterable[StatsKey]) -> dict[StatsKey, RunningStats]:
+    keys = list(keys)
+    stats = {key: RunningStats() for key in keys}
+    if not keys:
+        return stats
+    result = connection.execute(select(
+        category_stats.c.user_id, category_stats.c.category,
+        category_stats.c.count, category_stats.c.mean, category_stats.c.m2,
+    ).where(tuple_(category_stats.c.user_id, category_stats.c.category).in_(keys)))
+    for user_id, category, count, mean, m2 in result:
+        stats[(user_id, TransactionCategory(category))] = RunningStats(count, mean, m2)
+    return stats
+
+
+def save_stats(connection: Connection, stats: dict[StatsKey, RunningStats]):
+    if not stats:
+        return
+    stmt = sqlite_insert(category_stats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[category_stats.c.user_id, category_stats.c.category],
+        set_={"count": stmt.excluded.count, "mean": stmt.excluded.mean, "m2": stmt.excluded.m2},
+    )
+    connection.execute(stmt, [
+        {"user_id": user_id, "category": category, "count": s.count, "mean": s.mean, "m2": s.m2}
+        for (user_id, category), s in stats.items()
+    ])
+
+
+def track_amounts(connection: Connection, changes: list[AmountChange]) -> list[float | None]:
+    """
+    Apply changes in order and return one score per change: the added
+    amount's z-score before it was folded in, None for removals.
+    """
+    stats = load_stats(connection, {(user_id, TransactionCategory(category)) for user_id, category, _, _ in changes})
+    scores = []
+    for user_id, category, amount, sign in changes:
+        running = stats[(user_id, TransactionCategory(category))]
+        if sign > 0:
+            scores.append(running.score(amount))
+            running.add(amount)
+        else:
+            scores.append(None)
+            running.remove(amount)
+    save_stats(connection, stats)
+    return scores
+
+
+def rebuild_category_stats(connection: Connection, user_id: int | None = None, rescore: bool = False):
+    """
+    Recompute the stats (optionally for one user) from the transactions.
+    rescore=True also rewrites every anomaly_score as if the transactions
+    had arrived in date order.
+    """
+    query = select(
+        transactions.c.id, transactions.c.user_id, transactions.c.category, transactions.c.amount
+    ).order_by(transactions.c.user_id, transactions.c.date, transactions.c.id)
+    wipe = delete(category_stats)
+    if user_id is not None:
+        query = query.where(transactions.c.user_id == user_id)
+        wipe = wipe.where(category_stats.c.user_id == user_id)
+
+    stats: dict[StatsKey, RunningStats] = {}
+    scores = []
+    score_stmt = update(transactions).where(transactions.c.id == bindparam("row_id"))
+    for row_id, row_user_id, category, amount in connection.execute(query).yield_per(10000):
+        running = stats.setdefault((row_user_id, TransactionCategory(category)), RunningStats())
+        if rescore:
+            scores.append({"row_id": row_id, "anomaly_score": running.score(amount)})
+            if len(scores) >= 10000:
+                connection.execute(score_stmt, scores)
+                scores = []
+        running.add(amount)
+    if scores:
+        connection.execute(score_stmt, scores)
+
+    connection.execute(wipe)
+    save_stats(connection, stats)
+
+
+def _old_value(state, field):
+    history = state.attrs[field].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), field)
+
+
+@event.listens_for(Session, "before_flush")
+def _score_transactions(session, flush_context, instances):
+    # before_flush so the scores go out with the INSERTs themselves
+    changes = []
+    scored = []
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            changes.append((obj.user_id, obj.category, obj.amount, -1))
+
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS):
+            continue
+        changes.append((
+            _old_value(state, "user_id"), _old_value(state, "category"), _old_value(state, "amount"), -1
+        ))
+        changes.append((obj.user_id, obj.category, obj.amount, 1))
+        scored.append((obj, len(changes) - 1))
+
+    for obj in session.new:
+        if isinstance(obj, Transaction) and obj.amount is not None:
+            changes.append((obj.user_id, obj.category, obj.amount, 1))
+            scored.append((obj, len(changes) - 1))
+
+    if changes:
+        scores = track_amounts(session.connection(), changes)
+        for obj, index in scored:
+            obj.anomaly_score = scores[index]
+
+    gone = [obj.id for obj in session.deleted if isinstance(obj, User)]
+    if gone:
+        session.connection().execute(delete(category_stats).where(category_stats.c.user_id.in_(gone)))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database import Base, engine
+    from app.models import budget, user  # noqa: F401 - register mappers
+
+    parser = argparse.ArgumentParser(description="Rebuild the category_stats table")
+    parser.add_argument("--user", type=int, default=None, help="only rebuild this user")
+    parser.add_argument("--rescore", action="store_true", help="also recompute every anomaly_score")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        rebuild_category_stats(conn, args.user, args.rescore)
+        count = conn.execute(select(func.count()).select_from(category_stats)).scalar()
+    print(f"Rebuilt category stats, {count} rows")
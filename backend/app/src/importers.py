@@ -0,0 +1,200 @@
+import csv
+import io
+import re
+from datetime import datetime
+from typing import IO, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.transactions import Transaction
+from app.src.rollups import add_to_rollups
+from app.src.peer_sketches import track_peer_totals
+from app.src.category_stats import track_amounts
+from app.schemas.transactions import TransactionCreate, ImportResult, ImportRowError
+
+settings = get_settings()
+
+CSV_FIELDS = ("amount", "category", "merchant", "date", "notes")
+
+# OFX 1.x is SGML, so leaf tags are usually not closed: <TRNAMT>-12.50
+OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+OFX_READ_SIZE = 64 * 1024
+
+
+def parse_csv(stream: IO[str]) -> Iterator[tuple[int, dict]]:
+    """
+    Yield (row_number, row) for each CSV data row.
+    Expects a header with some of: amount, category, merchant, date, notes.
+    Unknown columns are ignored, empty cells become None.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [
+        (index, name.strip().lower())
+        for index, name in enumerate(header)
+        if name.strip().lower() in CSV_FIELDS
+    ]
+
+    for row_number, values in enumerate(reader, start=1):
+        if not values:
+            continue
+        row = {}
+        for index, name in columns:
+            value = values[index].strip() if index < len(values) else ""
+            row[name] = value or None
+        yield row_number, row
+
+
+def _parse_ofx_date(value: str) -> str:
+    # 20240131120000.000[-5:EST] -> 2024-01-31T12:00:00
+    digits = value.split(".")[0].split("[")[0].strip()
+    parsed = datetime.strptime(digits[:14].ljust(14, "0"), "%Y%m%d%H%M%S")
+    return parsed.isoformat()
+
+
+def parse_ofx(stream: IO[str]) -> Iterator[tuple[int, dict | None]]:
+    """
+    Yield (row_number, row) for each <STMTTRN> in an OFX/QFX statement.
+    Reads the file in fixed-size chunks so only one chunk plus the
+    current unfinished transaction is ever held in memory.
+    OFX has no categories, so every row is filed under "Other".
+    Debits are negative in OFX and become positive spending amounts.
+    Credits (salary, refunds) aren't spending: they're yielded as
+    (row_number, None) and counted as skipped, not failed.
+    """
+    buffer = ""
+    row_number = 0
+    while True:
+        chunk = stream.read(OFX_READ_SIZE)
+        buffer += chunk
+        end = 0
+        for match in OFX_TRANSACTION.finditer(buffer):
+            end = match.end()
+            row_number += 1
+            fields = {tag.upper(): value.strip() for tag, value in OFX_FIELD.findall(match.group(1))}
+            # unparseable values are passed through for TransactionCreate to reject
+            amount = fields.get("TRNAMT")
+            try:
+                amount = -float(amount)
+            except (TypeError, ValueError):
+                pass
+            else:
+                if amount < 0:
+                    yield row_number, None
+                    continue
+            date = fields.get("DTPOSTED") or None
+            try:
+                date = _parse_ofx_date(date) if date else None
+            except ValueError:
+                pass
+            yield row_number, {
+                "amount": amount,
+                "category": "Other",
+                "merchant": fields.get("NAME") or fields.get("PAYEE") or None,
+                "date": date,
+                "notes": fields.get("MEMO") or None,
+            }
+        buffer = buffer[end:]
+        if not chunk:
+            return
+
+
+def parse_upload(file: IO[bytes], filename: str | None) -> Iterator[tuple[int, dict | None]]:
+    """Pick a parser from the file extension (CSV unless .ofx/.qfx)."""
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    name = (filename or "").lower()
+    if name.endswith((".ofx", ".qfx")):
+        return parse_ofx(stream)
+    return parse_csv(stream)
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in exc.errors()
+    )
+
+
+def _insert_batch(db: Session, insert_stmt, batch: list[dict]):
+    # Core inserts skip the ORM flush hooks, so score the rows and update the
+    # category stats, rollups and peer sketches here
+    connection = db.connection()
+    scores = track_amounts(connection, [(row["user_id"], row["category"], row["amount"], 1) for row in batch])
+    for row, score in zip(batch, scores):
+        row["anomaly_score"] = score
+    db.execute(insert_stmt, batch)
+    with track_peer_totals(connection, {row["user_id"] for row in batch}):
+        add_to_rollups(connection, (
+            (row["user_id"], row["category"], row["date"], row["amount"]) for row in batch
+        ))
+
+
+def import_transactions(
+    db: Session,
+    user_id: int,
+    rows: Iterator[tuple[int, dict | None]],
+    input_method: str = "import",
+) -> ImportResult:
+    """
+    Validate rows against TransactionCreate and bulk insert the good ones.
+
+    Rows are written with one executemany per IMPORT_BATCH_SIZE rows and
+    committed every IMPORT_COMMIT_EVERY batches, so a 1M row file is a
+    handful of transactions instead of a million. Bad rows are counted and
+    reported (up to IMPORT_MAX_REPORTED_ERRORS) but never abort the import.
+    Rows the parser passes as None (OFX credits) are counted as skipped.
+    """
+    insert_stmt = Transaction.__table__.insert()
+    batch_size = settings.IMPORT_BATCH_SIZE
+    commit_every = settings.IMPORT_COMMIT_EVERY
+    now = datetime.utcnow()
+
+    batch = []
+    batches_since_commit = 0
+    imported = 0
+    failed = 0
+    skipped = 0
+    errors = []
+
+    for row_number, row in rows:
+        if row is None:
+            skipped += 1
+            continue
+        try:
+            data = TransactionCreate.model_validate(row)
+        except ValidationError as exc:
+            failed += 1
+            if len(errors) < settings.IMPORT_MAX_REPORTED_ERRORS:
+                errors.append(ImportRowError(row=row_number, error=_format_validation_error(exc)))
+            continue
+
+        batch.append({
+            "user_id": user_id,
+            "amount": data.amount,
+            "category": data.category,
+            "merchant": data.merchant,
+            "date": data.date or now,
+            "notes": data.notes,
+            "input_method": input_method,
+            "created_at": now,
+        })
+        if len(batch) >= batch_size:
+            _insert_batch(db, insert_stmt, batch)
+            imported += len(batch)
+            batch = []
+            batches_since_commit += 1
+            if batches_since_commit >= commit_every:
+                db.commit()
+                batches_since_commit = 0
+
+    if batch:
+        _insert_batch(db, insert_stmt, batch)
+        imported += len(batch)
+    db.commit()
+
+    return ImportResult(imported=imported, failed=failed, skipped=skipped, errors=errors)
@@ -0,0 +1,294 @@
+"""
+Background jobs for uploads that take a while: /voice/upload (decode,
+model extraction, commit) and /transactions/import.
+
+The route spools the upload to JOB_SPOOL_DIR, writes a Job row and
+answers 202 with the job id; a worker runs the job and stores the
+response the route would have sent on the row. GET /jobs/{id}?wait=
+long-polls it. Spooling and queueing are two steps (spooled(), then
+submit()) so the route can look at the upload's sha256 in between, e.g.
+to answer a retried upload with the job it already has.
+
+- JOB_WORKERS jobs run at once. A user's jobs run at most
+  JOB_MAX_RUNNING_PER_USER at a time and a kind's at most its
+  max_running (the others wait, in order, without holding a worker), so
+  one user's imports can't hold up everyone's voice notes. A user with
+  JOB_MAX_PENDING_PER_USER jobs unfinished is refused (JobLimitExceeded, 429)
+- Job rows are in their own database (JOB_DATABASE_URL, see
+  app.database): on startup every queued or running job is queued again (running ones were cut off by the restart). One that
+  has already been started JOB_MAX_ATTEMPTS times is failed instead, so
+  an upload that kills the process doesn't do it forever. Meant for one
+  app process, like the peer stats refresh
+- Handlers are registered per kind (register("import", handler,
+  max_running=1)) by the routes that submit them. handler(job) returns the JSON result or raises
+  JobFailed(status, detail) for what the route would have answered with
+  an HTTPException
+- stats() (queue depth, running, outcomes) feeds /health; render() adds
+  the queue wait and run time histograms to /metrics
+"""
+import asyncio
+import logging
+import hashlib
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import IO, Awaitable, Callable
+
+from sqlalchemy import select, update
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+from app.database import JobSessionLocal
+from app.models.job import Job
+from app.src.telemetry import LATENCY_BUCKETS, Histogram
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# jobs can be a lot slower than LLM calls, e.g. a large import
+JOB_BUCKETS = LATENCY_BUCKETS + (300, 900, 3600)
+
+
+class JobFailed(Exception):
+    """The job's expected failure, answered like the route's HTTPException would have been."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class JobLimitExceeded(Exception):
+    """The user already has JOB_MAX_PENDING_PER_USER jobs unfinished."""
+
+
+def _remove(path: str | None):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _spool(upload: IO[bytes], path: str) -> str:
+    # hashed on the way to disk, the file is read once
+    digest = hashlib.sha256()
+    with open(path, "wb") as spooled:
+        while chunk := upload.read(1024 * 1024):
+            digest.update(chunk)
+            spooled.write(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class SpooledUpload:
+    job_id: str  # the job it becomes if it's submitted
+    path: str
+    sha256: str
+    submitted: bool = False
+
+
+class JobQueue:
+    def __init__(self, workers: int, max_running_per_user: int, max_pending_per_user: int, max_attempts: int):
+        self.workers = workers
+        self.max_running_per_user = max_running_per_user
+        self.max_pending_per_user = max_pending_per_user
+        self.max_attempts = max_attempts
+        self.handlers: dict[str, Callable[[Job], Awaitable[dict]]] = {}
+        self.max_running: dict[str, int] = {}  # kind -> cap, none = JOB_WORKERS
+        self.counts = {"submitted": 0, "resumed": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+        self.wait_seconds = Histogram("job_wait_seconds", "Time from submit (or restart) until a worker starts the job", JOB_BUCKETS)
+        self.run_seconds = Histogram("job_run_seconds", "Job run time", JOB_BUCKETS)
+        self._queue: deque[tuple[str, int, str]] = deque()  # (job id, user id, kind) in arrival order
+        self._queued_at: dict[str, float] = {}
+        self._pending: dict[int, int] = {}  # user id -> queued + running
+        self._running: dict[int, int] = {}  # user id -> running
+        self._running_kind: dict[str, int] = {}  # kind -> running
+        self._done: dict[str, asyncio.Event] = {}  # unfinished job id -> set when it finishes
+        self._ready = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def register(self, kind: str, handler: Callable[[Job], Awaitable[dict]], max_running: int | None = None):
+        self.handlers[kind] = handler
+        if max_running is not None:
+            self.max_running[kind] = max_running
+
+    def _enqueue(self, job_id: str, user_id: int, kind: str):
+        self._queue.append((job_id, user_id, kind))
+        self._queued_at[job_id] = time.perf_counter()
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        self._done[job_id] = asyncio.Event()
+        self._ready.set()
+
+    @asynccontextmanager
+    async def spooled(self, user_id: int, upload: IO[bytes]):
+        """
+        Copy upload to JOB_SPOOL_DIR for the body of the with block, which
+        may submit() it; otherwise the copy is removed. Raises
+        JobLimitExceeded before reading anything.
+        """
+        if self._pending.get(user_id, 0) >= self.max_pending_per_user:
+            self.counts["rejected"] += 1
+            raise JobLimitExceeded()
+        job_id = uuid.uuid4().hex
+        spooled = SpooledUpload(job_id, os.path.join(settings.JOB_SPOOL_DIR, job_id), "")
+        # counted right away: spooling awaits, the cap must hold meanwhile
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        try:
+            spooled.sha256 = await run_in_threadpool(_spool, upload, spooled.path)
+            yield spooled
+        finally:
+            self._pending[user_id] -= 1
+            if not spooled.submitted:
+                _remove(spooled.path)
+
+    async def submit(self, user_id: int, kind: str, spooled: SpooledUpload, params: dict | None = None) -> Job:
+        """Write the Job row for a spooled upload and queue it."""
+        job = Job(id=spooled.job_id, user_id=user_id, kind=kind, status=QUEUED, spool_path=spooled.path,
+                  params={**(params or {}), "sha256": spooled.sha256}, attempts=0, created_at=datetime.utcnow())
+        async with JobSessionLocal() as db:
+            db.add(job)
+            await db.commit()
+        spooled.submitted = True
+        self._enqueue(job.id, user_id, kind)
+        self.counts["submitted"] += 1
+        return job
+
+    def _next(self) -> tuple[str, int, str] | None:
+        # the oldest job whose user and kind are under their running caps
+        for entry in self._queue:
+            job_id, user_id, kind = entry
+            if (self._running.get(user_id, 0) < self.max_running_per_user
+                    and self._running_kind.get(kind, 0) < self.max_running.get(kind, self.workers)):
+                self._queue.remove(entry)
+                self._running[user_id] = self._running.get(user_id, 0) + 1
+                self._running_kind[kind] = self._running_kind.get(kind, 0) + 1
+                return entry
+        return None
+
+    async def _set(self, job_id: str, **values):
+        async with JobSessionLocal() as db:
+            await db.execute(update(Job).where(Job.id == job_id).values(**values))
+            await db.commit()
+
+    async def _run(self, job_id: str, user_id: int, kind: str):
+        self.wait_seconds.observe((kind,), time.perf_counter() - self._queued_at.pop(job_id))
+        started = time.perf_counter()
+        outcome = {"status": FAILED, "error": "Job failed", "error_status": 500}
+        job = None
+        try:
+            async with JobSessionLocal() as db:
+                await db.execute(update(Job).where(Job.id == job_id).values(
+                    status=RUNNING, started_at=datetime.utcnow(), attempts=Job.attempts + 1,
+                ))
+                job = await db.get(Job, job_id)
+                await db.commit()
+            handler = self.handlers.get(kind)
+            if handler is None:
+                raise RuntimeError(f"No handler registered for {kind!r} jobs")
+            outcome = {"status": SUCCEEDED, "result": await handler(job), "error": None, "error_status": None}
+        except JobFailed as exc:
+            outcome = {"status": FAILED, "error": exc.detail, "error_status": exc.status}
+        except asyncio.CancelledError:
+            # shutting down: the row stays running and the job is resumed on startup
+            outcome = None
+            raise
+        except Exception:
+            logger.exception("%s job %s failed", kind, job_id)
+        finally:
+            self._running[user_id] -= 1
+            self._running_kind[kind] -= 1
+            self._pending[user_id] -= 1
+            if outcome is not None:
+                self.run_seconds.observe((kind, outcome["status"]), time.perf_counter() - started)
+                self.counts[outcome["status"]] += 1
+                try:
+                    await self._set(job_id, finished_at=datetime.utcnow(), **outcome)
+                    _remove(job.spool_path if job is not None else None)
+                except Exception:
+                    logger.exception("Could not record the outcome of %s job %s", kind, job_id)
+            self._done.pop(job_id).set()
+            self._ready.set()  # a job waiting on the user's or kind's cap may run now
+
+    async def _work(self):
+        while True:
+            entry = self._next()
+            if entry is None:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            await self._run(*entry)
+
+    async def wait(self, job_id: str, timeout: float):
+        """Return once the job finished or after timeout seconds, whichever is first."""
+        done = self._done.get(job_id)
+        if done is None:
+            return  # finished already (or never queued here)
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def resume(self):
+        """Queue again the jobs a previous process left unfinished."""
+        async with JobSessionLocal() as db:
+            rows = (await db.execute(
+                select(Job.id, Job.user_id, Job.kind, Job.attempts, Job.spool_path)
+                .where(Job.status.in_((QUEUED, RUNNING)))
+                .order_by(Job.created_at)
+            )).all()
+            for job_id, user_id, kind, attempts, spool_path in rows:
+                if job_id in self._done:
+                    continue
+                if attempts >= self.max_attempts:
+                    await db.execute(update(Job).where(Job.id == job_id).values(
+                        status=FAILED, error="The job was interrupted too many times",
+                        error_status=500, finished_at=datetime.utcnow(),
+                    ))
+                    _remove(spool_path)
+                    self.counts["failed"] += 1
+                    continue
+                self._enqueue(job_id, user_id, kind)
+                self.counts["resumed"] += 1
+            await db.commit()
+        if rows:
+            logger.info("Resumed %d unfinished jobs", self.counts["resumed"])
+
+    async def start(self):
+        os.makedirs(settings.JOB_SPOOL_DIR, exist_ok=True)
+        self._ready = asyncio.Event()
+        await self.resume()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": len(self._queue),
+            "running": sum(self._running.values()),
+            **self.counts,
+        }
+
+    def render(self) -> list[str]:
+        return self.wait_seconds.render(("kind",)) + self.run_seconds.render(("kind", "outcome"))
+
+
+job_queue = JobQueue(
+    workers=settings.JOB_WORKERS,
+    max_running_per_user=settings.JOB_MAX_RUNNING_PER_USER,
+    max_pending_per_user=settings.JOB_MAX_PENDING_PER_USER,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+)
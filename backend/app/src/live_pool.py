@@ -0,0 +1,195 @@
+"""
+Pool of pre-connected Gemini Live API sessions.
+
+Opening a live session costs a TCP + TLS + WebSocket handshake and the
+setup round trip before the model hears anything. The pool keeps `size`
+sessions connected and set up, so a voice interaction starts streaming
+at once.
+
+- session(): hands out a warm session, or connects one on the spot when
+  none is ready (a miss). Asking for one wakes the maintainer to refill
+- A live session is a conversation: the model remembers what it heard.
+  A session that carried audio is never handed to anyone else, it is
+  closed and replaced. Only untouched ones go back into the pool
+- The maintainer task pings idle sessions every health_seconds and drops
+  the ones that don't answer, closes the ones idle for max_idle_seconds
+  (the server ends sessions on its own after a while, better before a
+  user gets one) and keeps the pool topped up. Failed connects back off
+  up to a minute
+
+stats() feeds /health.
+"""
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+PING_TIMEOUT_SECONDS = 5.0
+MAX_BACKOFF_SECONDS = 60.0
+
+
+@dataclass
+class WarmSession:
+    session: object  # google.genai.live.AsyncSession
+    exit_stack: AsyncExitStack
+    opened_at: float = field(default_factory=time.monotonic)
+    used: bool = False  # set by whoever sent audio on it
+
+    @property
+    def websocket(self):
+        # the SDK has no public handle on the connection; None if a new
+        # version renamed it, and the session then counts as unhealthy
+        return getattr(self.session, "_ws", None)
+
+    @property
+    def is_open(self) -> bool:
+        state = getattr(self.websocket, "state", None)
+        return getattr(state, "name", None) == "OPEN"
+
+    async def close(self):
+        try:
+            await self.exit_stack.aclose()
+        except Exception as exc:
+            logger.debug("Closing live session failed: %r", exc)
+
+
+class LiveSessionPool:
+    def __init__(self, connect, size: int, max_idle_seconds: float, health_seconds: float):
+        """connect() returns the SDK's live.connect(...) async context manager."""
+        self.connect = connect
+        self.size = size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_seconds = health_seconds
+        self.counts = {"hits": 0, "misses": 0, "opened": 0, "recycled": 0,
+                       "expired": 0, "unhealthy": 0, "connect_errors": 0}
+        self._idle: list[WarmSession] = []
+        self._opening = 0
+        self._wake = asyncio.Event()
+        self._maintainer = None
+        self._closing: set[asyncio.Task] = set()
+        self._tasks: set[asyncio.Task] = set()  # sessions being opened
+        self._backoff = 0.0
+        self._retry_at = 0.0
+
+    async def _open(self) -> WarmSession:
+        exit_stack = AsyncExitStack()
+        try:
+            session = await exit_stack.enter_async_context(self.connect())
+        except BaseException:
+            await exit_stack.aclose()
+            raise
+        self.counts["opened"] += 1
+        return WarmSession(session, exit_stack)
+
+    def _close_later(self, warm: WarmSession):
+        # a clean close waits for the server's close frame, nobody should wait on that
+        task = asyncio.create_task(warm.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _take(self) -> WarmSession | None:
+        while self._idle:
+            warm = self._idle.pop()  # newest first: furthest from max_idle_seconds
+            if warm.is_open:
+                return warm
+            self.counts["unhealthy"] += 1
+            self._close_later(warm)
+        return None
+
+    @asynccontextmanager
+    async def session(self):
+        """A connected, set up live session for the body of the with block."""
+        warm = self._take()
+        if warm is None:
+            self.counts["misses"] += 1
+            warm = await self._open()
+        else:
+            self.counts["hits"] += 1
+        self._wake.set()
+        try:
+            yield warm
+        finally:
+            if not warm.used and warm.is_open and self._maintainer is not None:
+                self.counts["recycled"] += 1
+                self._idle.append(warm)
+            else:
+                self._close_later(warm)
+
+    async def _open_idle(self):
+        try:
+            warm = await self._open()
+        except Exception as exc:
+            self.counts["connect_errors"] += 1
+            if time.monotonic() >= self._retry_at:  # one step per round, not per failed session
+                self._backoff = min(max(self._backoff * 2, 1.0), MAX_BACKOFF_SECONDS)
+                self._retry_at = time.monotonic() + self._backoff
+                logger.warning("Could not warm live sessions, retrying in %.0fs: %r", self._backoff, exc)
+        else:
+            self._backoff = 0.0
+            self._idle.append(warm)
+        finally:
+            self._opening -= 1
+            self._wake.set()
+
+    def _fill(self):
+        # every missing session connects on its own: one taken while others
+        # are still connecting is replaced right away, not after the batch
+        if time.monotonic() < self._retry_at:
+            return
+        for _ in range(self.size - len(self._idle) - self._opening):
+            self._opening += 1
+            task = asyncio.create_task(self._open_idle())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _check(self):
+        now = time.monotonic()
+        for warm in list(self._idle):
+            if now - warm.opened_at >= self.max_idle_seconds:
+                self.counts["expired"] += 1
+            else:
+                try:
+                    pong = await warm.websocket.ping()
+                    await asyncio.wait_for(pong, PING_TIMEOUT_SECONDS)
+                    continue
+                except Exception:
+                    self.counts["unhealthy"] += 1
+            if warm in self._idle:  # may have been handed out during the ping
+                self._idle.remove(warm)
+                self._close_later(warm)
+
+    async def maintain(self):
+        """Background task started from the app lifespan."""
+        last_check = time.monotonic()
+        while True:
+            self._wake.clear()  # before the work: sessions taken meanwhile wake the next round
+            if time.monotonic() - last_check >= self.health_seconds:
+                last_check = time.monotonic()
+                await self._check()
+            self._fill()
+            timeout = self.health_seconds
+            if self._retry_at > time.monotonic():
+                timeout = min(timeout, self._retry_at - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self.size > 0 and self._maintainer is None:
+            self._maintainer = asyncio.create_task(self.maintain())
+
+    async def close(self):
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            self._maintainer = None
+        for task in self._tasks:
+            task.cancel()
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(warm.close() for warm in idle), *self._tasks, *self._closing, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "idle": len(self._idle), "opening": self._opening, **self.counts}
@@ -1,14 +1,28 @@
-import google.generativeai as genai
-# from google.genai import types
+from google import genai
+from google.genai import types
 from dotenv import load_dotenv
+from contextlib import aclosing, asynccontextmanager
+from functools import lru_cache
 import asyncio
-import simpleaudio as sa
-import numpy as np
+import inspect
+import io
+import logging
 import os
 import time
+import wave
+
+from app.config import get_settings
+from app.models.transactions import TransactionCategory
+from app.schemas.voice import VoiceExtraction
+from app.src.live_pool import LiveSessionPool
+from app.src.pcm_ring import PcmRing
+from app.src.telemetry import CallTimer, LLMEvent, record
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
+settings = get_settings()
 
 TEXT_MODEL = "gemini-3-flash-preview"
 AUDIO_MODEL = "gemini-2.5-flash-native-audio-preview-12-2025"
@@ -34,6 +48,19 @@ TOOLS = [{
     ]
 }]
 
+EXTRACTION_PROMPT = f"""The recording is a user telling their budget app what they spent.
+Transcribe it, then list every expense they mention: the amount as a positive number, one of these
+categories: {", ".join(category.value for category in TransactionCategory)}, and a short description
+(the merchant or what it was for). Income, plans and questions are not expenses. confidence is how
+sure you are of the amounts, from 0 to 1.
+"""
+
+MIC_RATE = 16000  # what the Live API takes in, 16-bit mono
+SPEAKER_RATE = 24000  # what it answers with
+FRAME_MS = 100
+MIC_MIME_TYPE = f"audio/pcm;rate={MIC_RATE}"
+SPEAKER_BUFFER_FRAMES = 50  # local playback: 5 s of reply audio ahead of the speakers
+
 AUDIO_CONFIG = {
     "tools": TOOLS,
     "response_modalities": ["AUDIO"],
@@ -42,27 +69,188 @@ AUDIO_CONFIG = {
 }
 
 
+@lru_cache()
+def get_client() -> genai.Client:
+    """
+    One client per process: it owns the HTTP connection pools, building one
+    per call throws away keep-alive connections and TLS sessions.
+    LLM_BASE_URL points it at another server (e.g. benchmarks/fake_gemini.py).
+    """
+    http_options = types.HttpOptions(
+        base_url=settings.LLM_BASE_URL or None,
+        timeout=int(settings.LLM_TIMEOUT_SECONDS * 1000),  # milliseconds
+    )
+    return genai.Client(api_key=API_KEY, http_options=http_options)
+
+
+@lru_cache()
+def get_live_client() -> genai.Client:
+    """
+    Client for Live API (audio) sessions, on LLM_LIVE_BASE_URL if set
+    (e.g. benchmarks/fake_live.py), else the same endpoint as get_client().
+    Its WebSockets skip permessage-deflate: base64 PCM barely compresses
+    and zlib on every 100 ms chunk is CPU the voice sessions need.
+    """
+    http_options = types.HttpOptions(
+        base_url=settings.LLM_LIVE_BASE_URL or settings.LLM_BASE_URL or None,
+        timeout=int(settings.LLM_TIMEOUT_SECONDS * 1000),
+        async_client_args={"compression": None},  # passed through to websockets' connect()
+    )
+    return genai.Client(api_key=API_KEY, http_options=http_options)
+
+
+# Every AudioSession uses the same model and config, so warm sessions are
+# interchangeable. Started from the app lifespan; scripts that never start
+# it still work, every session is then connected on demand.
+live_pool = LiveSessionPool(
+    connect=lambda: get_live_client().aio.live.connect(model=AUDIO_MODEL, config=AUDIO_CONFIG),
+    size=settings.LIVE_POOL_SIZE,
+    max_idle_seconds=settings.LIVE_POOL_MAX_IDLE_SECONDS,
+    health_seconds=settings.LIVE_POOL_HEALTH_SECONDS,
+)
+
+
+# Bounds upstream calls from this process, extra callers wait their turn
+_text_call_slots = asyncio.Semaphore(settings.LLM_MAX_CONCURRENT_CALLS)
+
+
+class _InflightCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+# (model, prompt) -> the upstream call every identical request waits on
+_inflight: dict[tuple[str, str], _InflightCall] = {}
+
+
+def _forget(key: tuple[str, str], call: _InflightCall):
+    if _inflight.get(key) is call:
+        del _inflight[key]
+
+
+async def _generate_upstream(model: str, text: str):
+    async with _text_call_slots:
+        timer = CallTimer("text", model)
+        try:
+            response = await get_client().aio.models.generate_content(model=model, contents=text)
+        except BaseException as exc:
+            timer.finish(error=exc)
+            raise
+        timer.finish(usage=response.usage_metadata)
+        return response
+
+
+async def generate_text(text: str, model: str = TEXT_MODEL):
+    """
+    Async text call. Concurrent calls with the same model and prompt share one
+    upstream request. The upstream call is only cancelled once every caller
+    waiting on it has gone away.
+    """
+    key = (model, text)
+    call = _inflight.get(key)
+    if call is None:
+        call = _InflightCall(asyncio.ensure_future(_generate_upstream(model, text)))
+        _inflight[key] = call
+        call.task.add_done_callback(lambda _: _forget(key, call))
+    call.waiters += 1
+    try:
+        return await asyncio.shield(call.task)
+    except asyncio.CancelledError:
+        if call.waiters == 1 and not call.task.done():
+            call.task.cancel()
+        raise
+    finally:
+        call.waiters -= 1
+
+
+async def stream_text(text: str, model: str = TEXT_MODEL):
+    """
+    Async generator of text chunks as the model produces them. Not coalesced.
+    Closing it (e.g. the HTTP client went away) closes the upstream stream,
+    which stops the generation.
+    """
+    async with _text_call_slots:
+        timer = CallTimer("stream", model)
+        usage = None
+        try:
+            stream = await get_client().aio.models.generate_content_stream(model=model, contents=text)
+            async with aclosing(stream):
+                async for chunk in stream:
+                    usage = chunk.usage_metadata or usage
+                    if chunk.text:
+                        timer.first_token()
+                        yield chunk.text
+        except BaseException as exc:
+            timer.finish(usage=usage, error=exc)
+            raise
+        timer.finish(usage=usage)
+
+
+async def extract_expenses(pcm: bytes, model: str = TEXT_MODEL) -> VoiceExtraction:
+    """
+    One call for an uploaded recording: pcm (16 kHz mono 16-bit, the
+    silence already cut out) goes inline as a WAV, the answer comes back
+    as JSON in the VoiceExtraction schema. Shares the text calls' slots.
+    """
+    wav = io.BytesIO()
+    with wave.open(wav, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(MIC_RATE)
+        out.writeframes(pcm)
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=VoiceExtraction,
+    )
+    async with _text_call_slots:
+        timer = CallTimer("extract", model)
+        try:
+            response = await get_client().aio.models.generate_content(
+                model=model,
+                contents=[EXTRACTION_PROMPT, types.Part.from_bytes(data=wav.getvalue(), mime_type="audio/wav")],
+                config=config,
+            )
+            extraction = VoiceExtraction.model_validate_json(response.text)
+        except BaseException as exc:
+            timer.finish(error=exc)
+            raise
+        timer.finish(usage=response.usage_metadata)
+        return extraction
+
+
 class LLMCaller:
-    def __init__(self, api_key, model):
+    def __init__(self, api_key=None, model=None):
         self.api_key = api_key
-        self.model = TEXT_MODEL
-        self.client = genai.Client(api_key=API_KEY)
+        self.model = model or TEXT_MODEL
+        self.client = get_client()
         self.tools = {"add_to_database": self.add_to_database}
-        self.audio_session = AudioSession(self.client, self.tools)
+        self.audio_session = None
 
     def call_text(self, text):
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=text
-        )
-
+        """Blocking, for scripts. Use call_text_async from request handlers."""
+        timer = CallTimer("text", self.model)
+        try:
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=text
+            )
+        except BaseException as exc:
+            timer.finish(error=exc)
+            raise
+        timer.finish(usage=response.usage_metadata)
         return response
 
+    async def call_text_async(self, text):
+        return await generate_text(text, self.model)
+
     async def call_audio(self):
+        # a session per conversation, the connection itself comes from live_pool
+        self.audio_session = AudioSession(get_live_client(), self.tools, pool=live_pool)
         try:
             await self.audio_session.activate()
         except InterruptedError:
-            print("Interrupted")
+            logger.info("Audio session interrupted")
 
     def add_to_database(self, amount, category, description=None):
         # Implement adding to database, and also other functions wherever needed
@@ -71,31 +259,65 @@ class LLMCaller:
 
 
 class AudioSession:
-    def __init__(self, client, tools):
+    """
+    One Live API conversation: mic audio in, tool calls, transcripts and
+    spoken replies out.
+
+    Without `output` the replies are played on this machine's speakers
+    (scripts, demos). With it, every outgoing event is awaited on
+    output(event) instead, e.g. sent down the /voice/realtime WebSocket:
+    {"type": "audio", "data": bytes}, {"type": "transcript" | "text", "text": ...},
+    {"type": "tool_result", "name": ..., "result": ...}, {"type": "turn_complete"}.
+    A slow consumer holds up the receive loop, a slow model fills the mic
+    ring and recieve_audio then waits (or drops audio, VOICE_MIC_OVERFLOW):
+    both directions are bounded. Audio moves through preallocated PcmRings
+    (a frame that fits is copied in synchronously, PcmRing.write_nowait),
+    and nothing is logged per frame.
+
+    Tools may be plain functions or coroutine functions.
+
+    With a `pool` (live_pool) the connection is a pre-warmed one when
+    available; otherwise every activate() connects with `client`.
+    """
+
+    def __init__(self, client, tools, output=None, pool=None):
         self.config = AUDIO_CONFIG
         self.audio_model = AUDIO_MODEL
         self.client = client
         self.closed = False
-        self.audio_mic_queue = asyncio.Queue(maxsize=5)
-        self.audio_output_queue = asyncio.Queue()
+        self.mic = PcmRing(
+            capacity_frames=max(1, settings.VOICE_MIC_BUFFER_MS // FRAME_MS),
+            frame_bytes=MIC_RATE * 2 * FRAME_MS // 1000,
+            overflow=settings.VOICE_MIC_OVERFLOW,
+        )
+        self.speaker = None  # only for local playback, see send_response
         self.tools = tools
+        self.output = output
+        self.pool = pool
+        self.warm = None
         self.live_session = None
         self.chunks = None
         self.stop_event = asyncio.Event()
+        self.tool_calls = 0
 
     async def recieve_audio(self, audio):
-        # audio should be in 16-bit PCM format
-        await self.audio_mic_queue.put({
-            "data": audio,
-            "mime_type": "audio/pcm;rate=16000"}
-        )
+        # audio should be in 16-bit PCM format, 16 kHz mono
+        if not self.mic.write_nowait(audio):
+            await self.mic.write(audio)  # full: wait or drop, VOICE_MIC_OVERFLOW
 
     async def send_realtime(self, session):
         while True:
-            msg = await self.audio_mic_queue.get()
-            if len(msg['data']) > 100:
-                print(f"Sending audio chunk of {len(msg['data'])} bytes")
-            await session.send_realtime_input(audio=msg)
+            # Whatever piled up while the last send was in flight goes out as
+            # one message: each send costs the SDK ~1 ms of validation and
+            # framing regardless of size, so a busy process sends fewer,
+            # bigger chunks instead of falling further behind. The SDK only
+            # takes bytes, so this is the one copy out of the ring.
+            data = await self.mic.read()
+            if not data:
+                return  # closed
+            if self.warm is not None:
+                self.warm.used = True  # the model has heard this user, don't hand it to anyone else
+            await session.send_realtime_input(audio=types.Blob(data=data, mime_type=MIC_MIME_TYPE))
 
     async def feed_audio(self):
         """Feed pre-recorded audio chunks in real-time fashion, then loop."""
@@ -106,26 +328,37 @@ class AudioSession:
             silence = b'\x00\x00' * 10000  # Silence chunk to indicate end
             await self.recieve_audio(silence)
 
+    async def emit(self, event: dict):
+        if self.output is not None:
+            await self.output(event)
+        elif event["type"] == "audio" and not self.speaker.write_nowait(event["data"]):
+            await self.speaker.write(event["data"])
+
     async def recieve_llm_response(self, session):
         while True:
             turn = session.receive()
             async for response in turn:
+                self.timer.first_token()
                 if response.tool_call is not None:
-                    print("Recieved tool call")
+                    logger.debug("Received tool call")
                     await self.handle_tool_call(session, response.tool_call.function_calls) # noqa E501
-                if (response.server_content and response.server_content.model_turn): # noqa E501
-                    for part in response.server_content.model_turn.parts:
+                content = response.server_content
+                if content and content.model_turn:
+                    for part in content.model_turn.parts:
                         if part.text:
-                            print(f"Received text: {part.text}")
+                            logger.debug("Received text: %s", part.text)
+                            await self.emit({"type": "text", "text": part.text})
                         if part.inline_data and isinstance(part.inline_data.data, bytes): # noqa E501
-                            print(f"Received audio chunk of {len(part.inline_data.data)} bytes")
-                            self.audio_output_queue.put_nowait(part.inline_data.data) # noqa E501
-                if (response.server_content and response.server_content.output_transcription):
-                    print("Transcript:", response.server_content.output_transcription.text)
+                            await self.emit({"type": "audio", "data": part.inline_data.data})
+                if content and content.output_transcription:
+                    logger.info("Transcript: %s", content.output_transcription.text)
+                    await self.emit({"type": "transcript", "text": content.output_transcription.text})
+                if content and content.turn_complete:
+                    await self.emit({"type": "turn_complete"})
 
-            # Empty the queue on interruption to stop playback
-            # while not self.audio_output_queue.empty():
-            #     self.audio_output_queue.get_nowait()
+            # Empty the speaker ring on interruption to stop playback
+            # if self.speaker is not None:
+            #     self.speaker.consume(len(self.speaker) - self.speaker.peeked)
 
     async def send_response(self):
         """
@@ -133,53 +366,95 @@ class AudioSession:
         Currently it just plays audio responses from Gemini.
         AI wrote this function. 
         """
-        while not self.stop_event.is_set():
-            try:
-                audio_data = await asyncio.wait_for(self.audio_output_queue.get(), timeout=0.5)
-                if audio_data:
-                    # Assuming 16-bit PCM, mono, 24kHz (as per docs)
-                    sample_rate = 24000
-                    audio_array = np.frombuffer(audio_data, dtype=np.int16)
-                    def play_audio():
-                        play_obj = sa.play_buffer(audio_array, 1, 2, sample_rate)
-                        play_obj.wait_done()
-                    await asyncio.get_event_loop().run_in_executor(None, play_audio)
-            except asyncio.TimeoutError:
+        # only needed for local playback, servers don't have it installed
+        import simpleaudio as sa
+
+        while not self.stop_event.is_set() and not self.speaker.closed:
+            if not await self.speaker.wait_readable(timeout=0.5):
                 continue
+            # everything buffered so far (16-bit PCM, mono, 24kHz as per docs)
+            # is played straight out of the ring, one executor call per batch;
+            # it's only freed for new audio once the speakers are done with it
+            audio_array = self.speaker.peek_samples()
 
-    async def handle_tool_call(self, session, function_calls):
-        for call in function_calls:
-            print(f"Gemini requested: {call.name} with args: {call.args}")
-            try:
-                result = self.tools[call.name](**call.args)
-            except KeyError:
-                print("Function does not exist")
-                result = "Function does not exist"
-
-            # 3. Send the result back to the model
-            # The 'id' must match the 'id' from the tool_call
-            await session.send_tool_response(function_responses=[{
-                "name": call.name,
-                "response": result,
-                "id": call.id
-            }])
-            print("Response sent back to Gemini.")
+            def play_audio():
+                play_obj = sa.play_buffer(audio_array, 1, 2, SPEAKER_RATE)
+                play_obj.wait_done()
+            await asyncio.get_running_loop().run_in_executor(None, play_audio)
+            self.speaker.consume(audio_array.nbytes)
 
-    async def activate(self):
+    async def run_tool(self, call) -> dict:
+        logger.info("Gemini requested: %s with args: %s", call.name, call.args)
+        started = time.perf_counter()
+        error = None
         try:
+            result = self.tools[call.name](**call.args)
+            if inspect.isawaitable(result):
+                result = await result
+        except KeyError:
+            logger.warning("Function %s does not exist", call.name)
+            result = {"error": "Function does not exist"}
+            error = "KeyError"
+        except Exception as exc:
+            # tell the model instead of ending the whole conversation
+            logger.warning("Tool %s failed: %r", call.name, exc)
+            result = {"error": "The tool failed, ask the user to try again"}
+            error = type(exc).__name__
+        record(LLMEvent(kind="tool", model=call.name, seconds=time.perf_counter() - started, error=error))
+        # The 'id' must match the 'id' from the tool_call
+        return {"name": call.name, "response": result, "id": call.id}
+
+    async def handle_tool_call(self, session, function_calls):
+        # Every call of a turn ("coffee 4.50 and a bus ticket 2.80") runs at
+        # once: their add_to_database writes land in the same group commit
+        # (save_voice_transaction) and the model gets all the results in one
+        # message, so a turn costs one commit and one round trip however
+        # many items it has.
+        self.tool_calls += len(function_calls)
+        responses = await asyncio.gather(*(self.run_tool(call) for call in function_calls))
+        await session.send_tool_response(function_responses=responses)
+        logger.debug("%d responses sent back to Gemini", len(responses))
+        for response in responses:
+            await self.emit({"type": "tool_result", "name": response["name"], "result": response["response"]})
+
+    @asynccontextmanager
+    async def connect(self):
+        if self.pool is None:
             async with self.client.aio.live.connect(
                 model=AUDIO_MODEL, config=self.config
             ) as live_session:
+                yield live_session
+            return
+        async with self.pool.session() as warm:
+            self.warm = warm
+            yield warm.session
+
+    async def activate(self):
+        self.timer = CallTimer("audio", self.audio_model)
+        self.tool_calls = 0
+        error = None
+        try:
+            async with self.connect() as live_session:
                 self.live_session = live_session
-                print("Connected")
+                logger.info("Connected")
                 async with asyncio.TaskGroup() as tg:
                     tg.create_task(self.send_realtime(live_session))
                     tg.create_task(self.recieve_llm_response(live_session))
-                    tg.create_task(self.send_response())
+                    if self.output is None:
+                        self.speaker = PcmRing(SPEAKER_BUFFER_FRAMES, SPEAKER_RATE * 2 * FRAME_MS // 1000)
+                        tg.create_task(self.send_response())
                     if self.chunks:
                         tg.create_task(self.feed_audio())
         except asyncio.CancelledError:
             pass
+        except BaseException as exc:
+            error = exc
+            raise
         finally:
+            self.closed = True
             self.stop_event.set()
-            print("\nConnection closed.")
+            self.mic.close()
+            if self.speaker is not None:
+                self.speaker.close()
+            self.timer.finish(tool_calls=self.tool_calls, error=error)
+            logger.info("Connection closed")
@@ -0,0 +1,174 @@
+"""
+Cache for /insights/narrative.
+
+A narrative only depends on the user's transactions in the period, their
+budgets and their goals, so entries are keyed by (user_id, time_period,
+fingerprint), the fingerprint being a sha256 over cheap aggregates of
+exactly those inputs. Any write that changes them gives a new fingerprint
+and therefore a miss, whichever worker, script or bulk import made it.
+
+Two tiers:
+- NarrativeCache, an in-process TTL + LRU dict (NARRATIVE_CACHE_MAX_ENTRIES)
+- the narrative_cache table (NARRATIVE_CACHE_PERSIST), shared between
+  workers and restarts, one row per (user, period)
+
+The flush hook at the bottom also drops a user's entries from both tiers
+as soon as one of their transactions, budgets or their profile is written,
+so stale narratives don't sit around until they're evicted.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.budget import Budget
+from app.models.narrative import NarrativeCacheEntry
+from app.models.transactions import Transaction
+from app.models.user import User
+from app.src.ttl_cache import TTLCache
+
+settings = get_settings()
+
+# (user_id, time_period, fingerprint)
+NarrativeKey = tuple[int, str, str]
+
+PERIOD_DAYS = {"week": 7, "month": 30, "year": 365}
+
+
+def period_window(time_period: str) -> tuple[str, datetime]:
+    """Normalized period name (anything unknown is a year) and its start."""
+    if time_period not in PERIOD_DAYS:
+        time_period = "year"
+    return time_period, datetime.utcnow() - timedelta(days=PERIOD_DAYS[time_period])
+
+
+class NarrativeCache(TTLCache):
+    """Bounded TTL + LRU cache of NarrativeKey -> NarrativeResponse dict."""
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                self._remove(key)
+
+
+narrative_cache = NarrativeCache(
+    max_entries=settings.NARRATIVE_CACHE_MAX_ENTRIES,
+    ttl=settings.NARRATIVE_CACHE_TTL_SECONDS,
+)
+
+
+async def narrative_fingerprint(
+    db: AsyncSession,
+    user_id: int,
+    goals: dict | None,
+    time_period: str,
+    start_date: datetime,
+) -> str:
+    """
+    sha256 over what generate_financial_narrative is fed: per-category
+    count/sum/max id of the window (one index range scan), the budget rows
+    and the goals.
+    """
+    result = await db.execute(select(
+        Transaction.category,
+        func.count(),
+        func.sum(Transaction.amount),
+        func.max(Transaction.id),
+    ).where(
+        Transaction.user_id == user_id,
+        Transaction.date >= start_date
+    ).group_by(Transaction.category).order_by(Transaction.category))
+    categories = [[category.value, count, round(total, 2), max_id] for category, count, total, max_id in result]
+
+    result = await db.execute(select(
+        Budget.id, Budget.category, Budget.amount, Budget.period, Budget.start_date, Budget.end_date
+    ).where(Budget.user_id == user_id).order_by(Budget.id))
+    budgets = [list(row) for row in result]
+
+    payload = json.dumps(
+        {"period": time_period, "categories": categories, "budgets": budgets, "goals": goals},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def load_persisted(db: AsyncSession, key: NarrativeKey, max_age: float | None = None) -> dict | None:
+    user_id, time_period, fingerprint = key
+    if max_age is None:
+        max_age = settings.NARRATIVE_CACHE_TTL_SECONDS
+    result = await db.execute(select(NarrativeCacheEntry).where(
+        NarrativeCacheEntry.user_id == user_id,
+        NarrativeCacheEntry.time_period == time_period,
+        NarrativeCacheEntry.fingerprint == fingerprint,
+        NarrativeCacheEntry.created_at >= datetime.utcnow() - timedelta(seconds=max_age),
+    ))
+    entry = result.scalar_one_or_none()
+    return entry.response if entry is not None else None
+
+
+async def lookup(db: AsyncSession, key: NarrativeKey) -> tuple[dict | None, str | None]:
+    """Check both tiers. Returns (narrative, "memory" | "db") or (None, None)."""
+    cached = narrative_cache.get(key)
+    if cached is not None:
+        return cached, "memory"
+    if settings.NARRATIVE_CACHE_PERSIST:
+        cached = await load_persisted(db, key)
+        if cached is not None:
+            narrative_cache.put(key, cached)
+            return cached, "db"
+    return None, None
+
+
+async def store(db: AsyncSession, key: NarrativeKey, response: dict):
+    """Put a fresh narrative in both tiers."""
+    narrative_cache.put(key, response)
+    if settings.NARRATIVE_CACHE_PERSIST:
+        await persist(db, key, response)
+
+
+async def persist(db: AsyncSession, key: NarrativeKey, response: dict):
+    """Write (or replace) the user's row for this period and commit."""
+    user_id, time_period, fingerprint = key
+    stmt = sqlite_insert(NarrativeCacheEntry).values(
+        user_id=user_id,
+        time_period=time_period,
+        fingerprint=fingerprint,
+        response=response,
+        created_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "time_period"],
+        set_={
+            "fingerprint": stmt.excluded.fingerprint,
+            "response": stmt.excluded.response,
+            "created_at": stmt.excluded.created_at,
+        },
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_narratives(session, flush_context):
+    user_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Transaction, Budget)):
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, User) and obj.id is not None:
+            user_ids.add(obj.id)
+    user_ids.discard(None)
+    if not user_ids:
+        return
+    for user_id in user_ids:
+        narrative_cache.invalidate_user(user_id)
+    if settings.NARRATIVE_CACHE_PERSIST:
+        # same DB transaction as the write, so it rolls back with it
+        session.connection().execute(
+            delete(NarrativeCacheEntry.__table__).where(NarrativeCacheEntry.user_id.in_(user_ids))
+        )
@@ -0,0 +1,175 @@
+"""
+Preallocated ring buffer for PCM audio between two asyncio tasks.
+
+AudioSession uses one per direction: mic audio waiting to go to the Live
+API and, for local playback, model audio waiting for the speakers. One
+buffer of capacity_frames * frame_bytes is allocated up front; writes
+copy into it and readers get memoryview/NumPy views of it, so no buffer
+is allocated per frame. write_nowait() is the synchronous fast path for
+data that fits: no coroutine either, the frame costs a copy and nothing
+else. Only a write that has to wait or drop goes through write().
+
+When the buffer is full, `overflow` decides:
+
+- "block": write() waits for the reader (backpressure, e.g. onto the
+  WebSocket's TCP window)
+- "drop_oldest": the oldest unread whole frames are overwritten, the
+  freshest audio wins (live mic audio that's seconds old is useless)
+- "drop_newest": what doesn't fit is discarded
+
+Reading is peek() (the readable bytes up to the end of the buffer,
+without copying) then consume(n) once they're used. Frames being read
+are never overwritten: while a reader holds them, drop_oldest drops the
+newest audio instead. One writer and one reader per ring, on one event
+loop, so no locks.
+"""
+import asyncio
+
+import numpy as np
+
+BLOCK, DROP_OLDEST, DROP_NEWEST = "block", "drop_oldest", "drop_newest"
+
+
+class PcmRing:
+    def __init__(self, capacity_frames: int, frame_bytes: int, overflow: str = BLOCK):
+        if overflow not in (BLOCK, DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown overflow policy {overflow!r}")
+        self.frame_bytes = frame_bytes
+        self.capacity = capacity_frames * frame_bytes
+        self.overflow = overflow
+        self.buffer = bytearray(self.capacity)
+        self.view = memoryview(self.buffer)
+        self.samples = np.frombuffer(self.buffer, dtype=np.int16)  # same memory, for playback
+        # total bytes ever written / consumed; positions in the buffer are these mod capacity
+        self.written = 0
+        self.consumed = 0
+        self.peeked = 0  # bytes handed out by peek() and not consumed yet
+        self.dropped = 0
+        self.closed = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+    def __len__(self) -> int:
+        return self.written - self.consumed
+
+    @property
+    def free(self) -> int:
+        return self.capacity - len(self)
+
+    def _copy_in(self, data, count: int):
+        start = self.written % self.capacity
+        end = start + count
+        if end <= self.capacity:
+            self.view[start:end] = data if count == len(data) else memoryview(data)[:count]
+        else:
+            first = self.capacity - start
+            data = memoryview(data)
+            self.view[start:] = data[:first]
+            self.view[:count - first] = data[first:count]
+        self.written += count
+        self._readable.set()
+        if self.written - self.consumed == self.capacity:
+            self._writable.clear()
+
+    def _drop_oldest(self, count: int):
+        if self.peeked:
+            return  # a reader holds the oldest frames; what doesn't fit is dropped instead
+        need = min(-(-(count - self.free) // self.frame_bytes) * self.frame_bytes, len(self))
+        self.consumed += need
+        self.dropped += need
+
+    def write_nowait(self, data: bytes) -> bool:
+        """Copy data in if it fits whole and the ring is open; False = nothing written, use write()."""
+        count = len(data)
+        if count > self.capacity - self.written + self.consumed or self.closed:
+            return False
+        self._copy_in(data, count)
+        return True
+
+    async def write(self, data: bytes):
+        """Copy data in. With "block" this waits while the ring is full; closed rings drop it."""
+        if self.write_nowait(data):
+            return  # fits, whatever the policy
+        count = len(data)
+        if self.overflow == BLOCK:
+            done = 0
+            while done < count and not self.closed:
+                if not self.free:
+                    await self._writable.wait()
+                    continue
+                piece = min(self.free, count - done)
+                self._copy_in(memoryview(data)[done:done + piece], piece)
+                done += piece
+            return
+        if self.closed:
+            return
+        if count > self.free and self.overflow == DROP_OLDEST:
+            self._drop_oldest(count)
+        if count > self.free:
+            # drop_newest, or drop_oldest with the rest held by a reader
+            self.dropped += count - self.free
+            count = self.free
+        if count:
+            self._copy_in(data, count)
+
+    async def wait_readable(self, timeout: float | None = None) -> bool:
+        """True once there is unread audio, False on timeout or when closed and drained."""
+        while not len(self) - self.peeked:
+            if self.closed:
+                return False
+            self._readable.clear()
+            try:
+                await asyncio.wait_for(self._readable.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def peek(self, max_bytes: int | None = None) -> memoryview:
+        """Unread bytes from the read position to the end of the buffer, whole samples."""
+        start = (self.consumed + self.peeked) % self.capacity
+        count = min(len(self) - self.peeked, self.capacity - start)
+        if max_bytes is not None:
+            count = min(count, max_bytes)
+        count -= count % 2
+        self.peeked += count
+        return self.view[start:start + count]
+
+    def peek_samples(self, max_bytes: int | None = None) -> np.ndarray:
+        """peek() as int16 samples, a view of the same memory."""
+        start = (self.consumed + self.peeked) % self.capacity
+        count = min(self.written - self.consumed - self.peeked, self.capacity - start)
+        if max_bytes is not None:
+            count = min(count, max_bytes)
+        count -= count % 2
+        self.peeked += count
+        return self.samples[start // 2:(start + count) // 2]
+
+    def consume(self, count: int):
+        """Hand back count peeked bytes; their space can be written again."""
+        self.peeked -= count
+        self.consumed += count
+        self._writable.set()
+
+    async def read(self) -> bytes:
+        """Everything unread as one bytes object (one copy), b"" once closed and drained."""
+        if self.written - self.consumed - self.peeked == 0 and not await self.wait_readable():
+            return b""
+        start = (self.consumed + self.peeked) % self.capacity
+        end = start + self.written - self.consumed - self.peeked
+        if end <= self.capacity:
+            data = self.view[start:end].tobytes()
+        else:
+            data = b"".join((self.view[start:], self.view[:end - self.capacity]))  # wrapped around the end
+        self.consumed += len(data)
+        self._writable.set()
+        return data
+
+    def close(self):
+        """Wake everyone up: writers stop writing, readers drain what's left."""
+        self.closed = True
+        self._readable.set()
+        self._writable.set()
+
+    def stats(self) -> dict:
+        return {"buffered": len(self), "written": self.written, "dropped": self.dropped}
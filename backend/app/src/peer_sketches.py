@@ -0,0 +1,259 @@
+"""
+Streaming peer distributions behind /circles/compare.
+
+SpendingCircle (app.src.peer_stats) is exact but only as fresh as the last
+recompute. PeerSketch keeps a SignedQuantileSketch of per-user all-time
+spending per (income_range, category), plus one per income_range over all
+categories, and moves it on every write: the rollups flush hook and the
+importer wrap their rollup writes in track_peer_totals(), and when a user's
+total for a category goes from a to b the bracket's sketch retracts a and
+inserts b. This happens in the same DB transaction as the rollup change, and
+SQLite serializes writers, so concurrent workers never lose each other's
+updates.
+
+Error bound: with k=200, median/p25/p75 and a user's percentile are within
+~0.7 * (inserted + retracted) / peer_count percentile points of the exact
+answer. Right after a rebuild that is under one point; it grows with the
+number of writes since. recompute_spending_circles() rebuilds every sketch
+from exact totals, split over PEER_SKETCH_SHARDS worker processes whose
+sketches are merged, which resets the churn.
+"""
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterable
+
+import numpy as np
+from sqlalchemy import delete, func, inspect, select
+from sqlalchemy.engine import Connection
+
+from app.config import get_settings
+from app.models.peer_group import PeerSketch
+from app.models.rollup import SpendingRollup
+from app.models.transactions import TransactionCategory
+from app.models.user import IncomeRange, User
+from app.src.quantile_sketch import SignedQuantileSketch
+
+settings = get_settings()
+
+sketches = PeerSketch.__table__
+rollups = SpendingRollup.__table__
+users = User.__table__
+
+# every category, then None for the all-categories total
+KEYS = list(TransactionCategory) + [None]
+
+
+def _where_key(income_range: IncomeRange, category: TransactionCategory | None):
+    if category is None:
+        return sketches.c.income_range == income_range, sketches.c.category.is_(None)
+    return sketches.c.income_range == income_range, sketches.c.category == category
+
+
+def user_totals(connection: Connection, user_ids: Iterable[int]) -> dict[int, dict]:
+    """All-time spending per category (and None = overall) from the rollups."""
+    totals = {user_id: dict.fromkeys(KEYS, 0.0) for user_id in user_ids}
+    if not totals:
+        return totals
+    rows = connection.execute(
+        select(rollups.c.user_id, rollups.c.category, func.sum(rollups.c.total))
+        .where(rollups.c.user_id.in_(totals))
+        .group_by(rollups.c.user_id, rollups.c.category)
+    )
+    for user_id, category, total in rows:
+        totals[user_id][TransactionCategory(category)] = total
+        totals[user_id][None] += total
+    return totals
+
+
+def user_brackets(connection: Connection, user_ids: Iterable[int]) -> dict[int, IncomeRange | None]:
+    rows = connection.execute(
+        select(users.c.id, users.c.income_range).where(users.c.id.in_(list(user_ids)))
+    )
+    return {user_id: income_range for user_id, income_range in rows}
+
+
+def users_in_flush(session) -> tuple[set[int], dict[int, IncomeRange | None]]:
+    """
+    Users created, deleted or moved to another bracket in this flush, and
+    the bracket each was in before it (None for new users).
+    """
+    user_ids = set()
+    old_brackets = {}
+    for obj in session.new:
+        if isinstance(obj, User):
+            user_ids.add(obj.id)
+            old_brackets[obj.id] = None
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        history = inspect(obj).attrs.income_range.history
+        if history.has_changes():
+            user_ids.add(obj.id)
+            old_brackets[obj.id] = history.deleted[0] if history.deleted else None
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            history = inspect(obj).attrs.income_range.history
+            user_ids.add(obj.id)
+            old_brackets[obj.id] = history.deleted[0] if history.deleted else obj.income_range
+    return user_ids, old_brackets
+
+
+def load_sketch(connection: Connection, income_range: IncomeRange, category) -> tuple[int, SignedQuantileSketch] | None:
+    row = connection.execute(
+        select(sketches.c.id, sketches.c.inserted, sketches.c.retracted, sketches.c.total)
+        .where(*_where_key(income_range, category))
+    ).first()
+    if row is None:
+        return None
+    return row.id, SignedQuantileSketch.from_bytes(row.inserted, row.retracted, row.total)
+
+
+def _sketch_values(sketch: SignedQuantileSketch, now: datetime) -> dict:
+    inserted, retracted = sketch.to_bytes()
+    return {
+        "inserted": inserted,
+        "retracted": retracted,
+        "total": sketch.total,
+        "peer_count": sketch.count,
+        "updated_at": now,
+    }
+
+
+def apply_changes(connection: Connection, changes: dict[tuple, list[tuple[float | None, float | None]]]):
+    """Apply (old, new) moves per (income_range, category); None = not in the bracket."""
+    now = datetime.utcnow()
+    for (income_range, category), moves in changes.items():
+        loaded = load_sketch(connection, income_range, category)
+        if loaded is None:
+            continue  # never built, the next rebuild creates it from exact totals
+        sketch_id, sketch = loaded
+        for old, new in moves:
+            if old is not None:
+                sketch.retract(old)
+            if new is not None:
+                sketch.insert(new)
+        connection.execute(
+            sketches.update().where(sketches.c.id == sketch_id).values(**_sketch_values(sketch, now))
+        )
+
+
+@contextmanager
+def track_peer_totals(
+    connection: Connection,
+    user_ids: Iterable[int],
+    old_brackets: dict[int, IncomeRange | None] | None = None,
+):
+    """
+    Wrap writes to the rollups of user_ids. Reads their totals before and
+    after and moves every total that changed in the bracket sketches.
+    old_brackets overrides the bracket a user was in before (see
+    users_in_flush); users no longer in the table leave their bracket.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        yield
+        return
+    before = user_totals(connection, user_ids)
+    yield
+    after = user_totals(connection, user_ids)
+    new_brackets = user_brackets(connection, user_ids)
+    old_brackets = {**new_brackets, **(old_brackets or {})}
+
+    changes = defaultdict(list)
+    for user_id in user_ids:
+        old_bracket = old_brackets.get(user_id)
+        new_bracket = new_brackets.get(user_id)
+        for key in KEYS:
+            old, new = before[user_id][key], after[user_id][key]
+            if old_bracket == new_bracket:
+                if old_bracket is not None and old != new:
+                    changes[(old_bracket, key)].append((old, new))
+                continue
+            if old_bracket is not None:
+                changes[(old_bracket, key)].append((old, None))
+            if new_bracket is not None:
+                changes[(new_bracket, key)].append((None, new))
+    if changes:
+        apply_changes(connection, changes)
+
+
+def _build_shard(income_ranges: np.ndarray, columns: np.ndarray) -> dict[tuple[str, int], SignedQuantileSketch]:
+    """Sketch one slice of users; runs in a worker process."""
+    shard = {}
+    for income_range in IncomeRange:
+        bracket = columns[income_ranges == income_range.value]
+        for i in range(columns.shape[1]):
+            sketch = SignedQuantileSketch()
+            for value in bracket[:, i].tolist():
+                sketch.insert(value)
+            shard[(income_range.value, i)] = sketch
+    return shard
+
+
+def build_sketches(income_ranges: np.ndarray, totals: np.ndarray, shards: int = 1) -> dict[tuple[str, int], SignedQuantileSketch]:
+    """
+    Sketches for every (income_range, KEYS index) from the spending matrix.
+    With shards > 1 the users are split across that many processes and the
+    partial sketches merged, which gives the same error bound as one pass.
+    """
+    columns = np.column_stack([totals, totals.sum(axis=1)])
+    if shards <= 1 or len(columns) < shards:
+        return _build_shard(income_ranges, columns)
+
+    parts = np.array_split(np.arange(len(columns)), shards)
+    with ProcessPoolExecutor(max_workers=shards) as pool:
+        results = list(pool.map(
+            _build_shard,
+            [income_ranges[part] for part in parts],
+            [columns[part] for part in parts],
+        ))
+    merged = results[0]
+    for shard in results[1:]:
+        for key, sketch in shard.items():
+            merged[key].merge(sketch)
+    return merged
+
+
+def rebuild_peer_sketches(connection: Connection, income_ranges: np.ndarray, totals: np.ndarray) -> int:
+    """Replace every PeerSketch row, including empty ones for unused brackets."""
+    built = build_sketches(income_ranges, totals, settings.PEER_SKETCH_SHARDS)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "income_range": income_range,
+            "category": key,
+            **_sketch_values(built[(income_range.value, i)], now),
+        }
+        for income_range in IncomeRange
+        for i, key in enumerate(KEYS)
+    ]
+    connection.execute(delete(sketches))
+    connection.execute(sketches.insert(), rows)
+    return len(rows)
+
+
+@dataclass
+class PeerDistribution:
+    """What /circles/compare needs from one bracket and category."""
+    peer_count: int
+    mean: float
+    median: float
+    p25: float
+    p75: float
+    percentile_of: Callable[[float], int]
+
+    @classmethod
+    def from_sketch(cls, row: PeerSketch) -> "PeerDistribution":
+        sketch = SignedQuantileSketch.from_bytes(row.inserted, row.retracted, row.total)
+        p25, median, p75 = (value or 0.0 for value in sketch.quantiles([0.25, 0.5, 0.75]))
+        return cls(
+            peer_count=sketch.count,
+            mean=sketch.mean() or 0.0,
+            median=median,
+            p25=p25,
+            p75=p75,
+            percentile_of=sketch.percentile_of,
+        )
@@ -0,0 +1,156 @@
+"""
+Recomputes the SpendingCircle tables behind /circles/compare.
+
+For every income bracket, builds the distribution of per-user spending
+totals per category (plus all categories combined) with NumPy and stores
+mean, median and the 0..100 percentiles. Users with no spending in a
+category count as 0, they are part of the peer group too. The same matrix
+rebuilds the streaming peer sketches (app.src.peer_sketches) from exact
+totals.
+
+Runs periodically from the app lifespan (PEER_STATS_REFRESH_SECONDS) or by hand:
+
+    cd backend
+    python -m app.src.peer_stats
+"""
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.peer_group import SpendingCircle
+from app.models.rollup import SpendingRollup
+from app.models.transactions import TransactionCategory
+from app.models.user import IncomeRange, User
+from app.src.peer_sketches import PeerDistribution, rebuild_peer_sketches
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+PERCENTILES = np.linspace(0.0, 1.0, 101)
+CATEGORIES = list(TransactionCategory)
+
+
+def spending_matrix(db: Session) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-user category totals for everyone with an income range.
+    Returns (user_ids, income_ranges, totals[user, category]).
+    """
+    users = db.execute(
+        select(User.id, User.income_range)
+        .where(User.income_range.isnot(None))
+        .order_by(User.id)
+    ).all()
+    user_ids = np.array([row[0] for row in users], dtype=np.int64)
+    income_ranges = np.array([row[1].value for row in users], dtype=object)
+    totals = np.zeros((len(users), len(CATEGORIES)), dtype=np.float64)
+    if not len(users):
+        return user_ids, income_ranges, totals
+
+    rows = db.execute(
+        select(SpendingRollup.user_id, SpendingRollup.category, func.sum(SpendingRollup.total))
+        .group_by(SpendingRollup.user_id, SpendingRollup.category)
+    ).all()
+    if rows:
+        row_users = np.array([row[0] for row in rows], dtype=np.int64)
+        category_index = {category: i for i, category in enumerate(CATEGORIES)}
+        row_categories = np.array([category_index[row[1]] for row in rows], dtype=np.int64)
+        row_totals = np.array([row[2] for row in rows], dtype=np.float64)
+
+        # map user ids to matrix rows, dropping users without an income range
+        positions = np.searchsorted(user_ids, row_users)
+        positions = np.minimum(positions, len(user_ids) - 1)
+        known = user_ids[positions] == row_users
+        np.add.at(totals, (positions[known], row_categories[known]), row_totals[known])
+
+    return user_ids, income_ranges, totals
+
+
+def build_circles(income_ranges: np.ndarray, totals: np.ndarray) -> list[dict]:
+    """One row per (income_range, category) and one per income_range with category None."""
+    now = datetime.utcnow()
+    circles = []
+    for income_range in IncomeRange:
+        bracket = totals[income_ranges == income_range.value]
+        if not len(bracket):
+            continue
+        # columns: every category, then the all-categories total
+        columns = np.column_stack([bracket, bracket.sum(axis=1)])
+        quantiles = np.quantile(columns, PERCENTILES, axis=0)
+        means = columns.mean(axis=0)
+        for i, category in enumerate(CATEGORIES + [None]):
+            circles.append({
+                "income_range": income_range,
+                "category": category,
+                "peer_count": len(bracket),
+                "avg_spending": float(means[i]),
+                "median_spending": float(quantiles[50, i]),
+                "percentile_data": [round(float(value), 2) for value in quantiles[:, i]],
+                "updated_at": now,
+            })
+    return circles
+
+
+def recompute_spending_circles(db: Session) -> int:
+    """Rebuild every SpendingCircle and PeerSketch row in one transaction. Returns the circle count."""
+    _, income_ranges, totals = spending_matrix(db)
+    circles = build_circles(income_ranges, totals)
+    db.execute(delete(SpendingCircle))
+    if circles:
+        db.execute(SpendingCircle.__table__.insert(), circles)
+    rebuild_peer_sketches(db.connection(), income_ranges, totals)
+    db.commit()
+    return len(circles)
+
+
+def percentile_of(value: float, percentile_data: list[float]) -> int:
+    """Binary search a user's value in a 0..100 percentile table (mid-rank for ties)."""
+    low = bisect_left(percentile_data, value)
+    high = bisect_right(percentile_data, value)
+    return min(100, (low + high) // 2)
+
+
+def circle_distribution(circle: SpendingCircle) -> PeerDistribution:
+    data = circle.percentile_data
+    return PeerDistribution(
+        peer_count=circle.peer_count,
+        mean=circle.avg_spending,
+        median=circle.median_spending,
+        p25=data[25],
+        p75=data[75],
+        percentile_of=lambda value: percentile_of(value, data),
+    )
+
+
+def _recompute_with_own_session() -> int:
+    db = SessionLocal()
+    try:
+        return recompute_spending_circles(db)
+    finally:
+        db.close()
+
+
+async def refresh_spending_circles_forever():
+    """Background task started from the app lifespan."""
+    while True:
+        try:
+            count = await run_in_threadpool(_recompute_with_own_session)
+            logger.info("Recomputed %d peer group rows", count)
+        except Exception:  # keep the loop alive, try again next round
+            logger.exception("Peer group recompute failed")
+        await asyncio.sleep(settings.PEER_STATS_REFRESH_SECONDS)
+
+
+if __name__ == "__main__":
+    from app.database import Base, engine
+    from app.models import budget  # noqa: F401 - register mappers
+
+    Base.metadata.create_all(bind=engine)
+    print(f"Recomputed {_recompute_with_own_session()} peer group rows")
@@ -0,0 +1,77 @@
+import copy
+import time
+from dataclasses import dataclass
+
+from app.config import get_settings
+from app.models.user import IncomeRange
+from app.src.ttl_cache import TTLCache
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """
+    Lightweight, detached copy of the logged-in User.
+    Shared between requests through the cache, so treat it as read-only;
+    load the ORM row when you need to change something.
+    """
+    id: int
+    firstname: str
+    lastname: str
+    email: str
+    income_range: IncomeRange | None
+    goals: dict | None
+
+    @classmethod
+    def from_user(cls, user) -> "AuthenticatedUser":
+        return cls(
+            id=user.id,
+            firstname=user.firstname,
+            lastname=user.lastname,
+            email=user.email,
+            income_range=user.income_range,
+            goals=copy.deepcopy(user.goals),
+        )
+
+
+class PrincipalCache(TTLCache):
+    """
+    Bounded TTL + LRU cache of bearer token -> AuthenticatedUser.
+
+    A hit skips both JWT signature verification and the users lookup.
+    Entries never outlive the token's own exp. Each worker process has its
+    own cache, so a change made through another worker is picked up after
+    at most ttl seconds; changes made through this one are invalidated
+    immediately via invalidate_user().
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        super().__init__(max_entries, ttl)
+        self._tokens_by_user: dict[int, set[str]] = {}
+
+    def put(self, token: str, user: AuthenticatedUser, token_exp: float | None = None):
+        # exp is wall-clock, the remaining lifetime is what counts
+        super().put(token, user, None if token_exp is None else token_exp - time.time())
+
+    def invalidate_user(self, user_id: int):
+        """Drop every cached token of a user (profile change, delete, new password)."""
+        with self._lock:
+            for token in self._tokens_by_user.pop(user_id, set()):
+                self._entries.pop(token, None)
+
+    def _added(self, token: str, user: AuthenticatedUser):
+        self._tokens_by_user.setdefault(user.id, set()).add(token)
+
+    def _removed(self, token: str, user: AuthenticatedUser):
+        tokens = self._tokens_by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user.id]
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+)
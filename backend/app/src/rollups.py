@@ -0,0 +1,226 @@
+"""
+Keeps the spending_rollups table in step with transactions.
+
+Every flush that adds, changes or deletes a Transaction updates the
+matching (user, category, month) rollup rows in the same DB transaction,
+so the rollups commit or roll back together with the rows they describe.
+Deleting a user deletes their rollups, whether or not their transactions
+were loaded into the session.
+The same hook moves the changed per-user totals in the peer sketches (see
+app.src.peer_sketches). Core bulk inserts (the importer) bypass the ORM and
+call add_to_rollups inside track_peer_totals themselves; anything else that writes transactions behind the ORM's back
+(e.g. query.delete()) needs a rebuild:
+
+    cd backend
+    python -m app.src.rollups [--user USER_ID]
+"""
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import event, func, inspect, select, delete, insert, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.rollup import SpendingRollup
+from app.models.transactions import Transaction, TransactionCategory
+from app.models.user import User
+from app.src.peer_sketches import track_peer_totals, users_in_flush
+
+rollups = SpendingRollup.__table__
+transactions = Transaction.__table__
+
+# (user_id, category, "YYYY-MM")
+Bucket = tuple[int, TransactionCategory, str]
+
+TRACKED_FIELDS = ("user_id", "category", "date", "amount")
+
+
+def _bucket(user_id: int, category, date: datetime) -> Bucket:
+    return user_id, TransactionCategory(category), date.strftime("%Y-%m")
+
+
+def _month_bounds(month: str) -> tuple[datetime, datetime]:
+    start = datetime.strptime(month, "%Y-%m")
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def add_to_rollups(connection: Connection, rows: Iterable[tuple[int, object, datetime, float]]):
+    """Fold new (user_id, category, date, amount) rows into their buckets."""
+    # key on raw values and only build the Bucket once per group, this
+    # runs for every imported row
+    groups = {}
+    for user_id, category, date, amount in rows:
+        key = (user_id, category, date.year, date.month)
+        agg = groups.get(key)
+        if agg is None:
+            groups[key] = [amount, 1, amount, amount, amount * amount]
+        else:
+            agg[0] += amount
+            agg[1] += 1
+            if amount < agg[2]:
+                agg[2] = amount
+            if amount > agg[3]:
+                agg[3] = amount
+            agg[4] += amount * amount
+    if not groups:
+        return
+
+    buckets = {}
+    for (user_id, category, year, month), agg in groups.items():
+        key = (user_id, TransactionCategory(category), f"{year:04d}-{month:02d}")
+        merged = buckets.get(key)
+        if merged is None:
+            buckets[key] = agg
+        else:
+            merged[0] += agg[0]
+            merged[1] += agg[1]
+            merged[2] = min(merged[2], agg[2])
+            merged[3] = max(merged[3], agg[3])
+            merged[4] += agg[4]
+
+    stmt = sqlite_insert(rollups)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[rollups.c.user_id, rollups.c.category, rollups.c.month],
+        set_={
+            "total": rollups.c.total + stmt.excluded.total,
+            "count": rollups.c.count + stmt.excluded.count,
+            # two-argument min()/max() are scalar functions in SQLite
+            "min_amount": func.min(rollups.c.min_amount, stmt.excluded.min_amount),
+            "max_amount": func.max(rollups.c.max_amount, stmt.excluded.max_amount),
+            "sum_squares": rollups.c.sum_squares + stmt.excluded.sum_squares,
+        },
+    )
+    connection.execute(stmt, [
+        {
+            "user_id": user_id, "category": category, "month": month,
+            "total": total, "count": count, "min_amount": low, "max_amount": high,
+            "sum_squares": sum_squares,
+        }
+        for (user_id, category, month), (total, count, low, high, sum_squares) in buckets.items()
+    ])
+
+
+def _aggregate_select(month):
+    return select(
+        transactions.c.user_id,
+        transactions.c.category,
+        month,
+        func.sum(transactions.c.amount),
+        func.count(),
+        func.min(transactions.c.amount),
+        func.max(transactions.c.amount),
+        func.sum(transactions.c.amount * transactions.c.amount),
+    )
+
+
+def _insert_from(query):
+    return insert(rollups).from_select(
+        ["user_id", "category", "month", "total", "count", "min_amount", "max_amount", "sum_squares"],
+        query,
+    )
+
+
+def recompute_rollups(connection: Connection, buckets: Iterable[Bucket]):
+    """
+    Rebuild individual buckets from their transactions.
+    Used when rows leave a bucket, since min/max can't be decremented.
+    Each bucket is one index range scan on (user_id, category, date).
+    """
+    for user_id, category, month in buckets:
+        start, end = _month_bounds(month)
+        connection.execute(delete(rollups).where(
+            rollups.c.user_id == user_id,
+            rollups.c.category == category,
+            rollups.c.month == month,
+        ))
+        connection.execute(_insert_from(
+            _aggregate_select(literal(month)).where(
+                transactions.c.user_id == user_id,
+                transactions.c.category == category,
+                transactions.c.date >= start,
+                transactions.c.date < end,
+            ).group_by(transactions.c.user_id, transactions.c.category)
+        ))
+
+
+def rebuild_rollups(connection: Connection, user_id: int | None = None):
+    """Recompute every bucket (optionally for one user) from scratch."""
+    month = func.strftime("%Y-%m", transactions.c.date)
+    query = _aggregate_select(month).where(transactions.c.date.isnot(None))
+    wipe = delete(rollups)
+    if user_id is not None:
+        query = query.where(transactions.c.user_id == user_id)
+        wipe = wipe.where(rollups.c.user_id == user_id)
+    connection.execute(wipe)
+    connection.execute(_insert_from(
+        query.group_by(transactions.c.user_id, transactions.c.category, month)
+    ))
+
+
+def _old_value(state, field):
+    history = state.attrs[field].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), field)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_rollups(session, flush_context):
+    added = []
+    stale = set()
+
+    for obj in session.new:
+        if isinstance(obj, Transaction) and obj.date is not None:
+            added.append((obj.user_id, obj.category, obj.date, obj.amount))
+
+    for obj in session.deleted:
+        if isinstance(obj, Transaction) and obj.date is not None:
+            stale.add(_bucket(obj.user_id, obj.category, obj.date))
+
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS):
+            continue
+        old_date = _old_value(state, "date")
+        if old_date is not None:
+            stale.add(_bucket(_old_value(state, "user_id"), _old_value(state, "category"), old_date))
+        if obj.date is not None:
+            stale.add(_bucket(obj.user_id, obj.category, obj.date))
+
+    user_ids, old_brackets = users_in_flush(session)
+    if not added and not stale and not user_ids:
+        return
+    user_ids.update(row[0] for row in added)
+    user_ids.update(bucket[0] for bucket in stale)
+
+    connection = session.connection()
+    added = [row for row in added if _bucket(row[0], row[1], row[2]) not in stale]
+    gone = [obj.id for obj in session.deleted if isinstance(obj, User)]
+    # inside track_peer_totals: the deleted users' totals leave their bracket's sketches
+    with track_peer_totals(connection, user_ids, old_brackets):
+        add_to_rollups(connection, added)
+        recompute_rollups(connection, stale)
+        if gone:
+            connection.execute(delete(rollups).where(rollups.c.user_id.in_(gone)))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database import Base, engine
+    from app.models import budget, user  # noqa: F401 - register mappers
+
+    parser = argparse.ArgumentParser(description="Rebuild the spending_rollups table")
+    parser.add_argument("--user", type=int, default=None, help="only rebuild this user")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        rebuild_rollups(conn, args.user)
+        count = conn.execute(select(func.count()).select_from(rollups)).scalar()
+    print(f"Rebuilt rollups, {count} rows")
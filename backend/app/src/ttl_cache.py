@@ -0,0 +1,77 @@
+"""
+The bounded TTL + LRU dict behind the in-process caches (principal_cache,
+narrative_cache, upload_dedup).
+
+Each worker process has its own. Entries leave when they expire, when the
+cache is over max_entries (least recently used first), or when a subclass
+drops them (e.g. invalidate_user). Subclasses that index entries some
+other way keep that index in step through _added() and _removed(), both
+called with the lock held.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """Bounded TTL + LRU dict, safe to share between threads. Hits don't extend an entry's TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any, ttl: float | None = None):
+        """ttl, if given, shortens this entry's lifetime (it never extends past the cache's ttl)."""
+        now = time.monotonic()
+        expires_at = now + (self.ttl if ttl is None else min(ttl, self.ttl))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value)
+            self._added(key, value)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            # expired entries at the old end go too, not only once looked up
+            while self._entries:
+                oldest, (oldest_expires_at, _) = next(iter(self._entries.items()))
+                if oldest_expires_at > now:
+                    break
+                self._remove(oldest)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key: Hashable):
+        # caller holds the lock
+        _, value = self._entries.pop(key)
+        self._removed(key, value)
+
+    def _added(self, key: Hashable, value: Any):
+        pass
+
+    def _removed(self, key: Hashable, value: Any):
+        pass
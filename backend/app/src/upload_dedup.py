@@ -0,0 +1,30 @@
+"""
+Dedup for retried /voice/upload requests.
+
+Mobile clients retry uploads on flaky connections, often after the first
+attempt went through. Each retry used to run the whole pipeline again and
+create the transactions twice. Recent uploads are remembered per user,
+cheapest check first:
+
+- recent_uploads, (user_id, "key", Idempotency-Key header) and
+  (user_id, "file", sha256 of the file) -> the job that handled it. The
+  key is looked at before the body is spooled, the file hash once it is
+  (it's computed while spooling). A hit answers with that job, nothing
+  is queued
+- recent_speech, (user_id, sha256 of the speech PCM) -> the response the
+  upload got. process_voice_input checks it once the audio is decoded,
+  resampled and cut to speech, before the model hears anything: it
+  catches retries whose file differs but not the recording (a WAV
+  header or metadata chunk written per attempt, another container)
+
+Both are TTLCaches that forget entries after VOICE_DEDUP_TTL_SECONDS, a
+retry comes within minutes and the same words said again later are a new
+expense. In process, like the narrative cache's first tier.
+"""
+from app.config import get_settings
+from app.src.ttl_cache import TTLCache
+
+settings = get_settings()
+
+recent_uploads = TTLCache(max_entries=settings.VOICE_DEDUP_MAX_ENTRIES, ttl=settings.VOICE_DEDUP_TTL_SECONDS)
+recent_speech = TTLCache(max_entries=settings.VOICE_DEDUP_MAX_ENTRIES, ttl=settings.VOICE_DEDUP_TTL_SECONDS)
@@ -0,0 +1,94 @@
+"""
+Audio preprocessing benchmark: decode, resample and VAD per input format.
+
+Synthesizes a clip of speech-like bursts (harmonics of a 140 Hz voice,
+syllable-rate envelope) separated by pauses, with leading and trailing
+silence and a -60 dBFS noise floor. Encodes it in a few upload formats and
+runs app.src.audio_pipeline.preprocess_audio on each. MP3 is only included
+when ffmpeg is installed.
+
+    cd backend
+    python -m benchmarks.bench_audio --seconds 30 --repeat 5
+
+Per format it reports the upload size, the bytes that would go to the
+model with and without the VAD, how much of the planted speech was kept,
+and processing time per second of audio by stage.
+"""
+import argparse
+import io
+import shutil
+
+import numpy as np
+from pydub import AudioSegment
+
+from app.src.audio_pipeline import SAMPLE_RATE, preprocess_audio
+
+FORMATS = [
+    # name, export format, frame rate, channels
+    ("wav 16k mono", "wav", 16000, 1),
+    ("wav 44.1k stereo", "wav", 44100, 2),
+    ("wav 48k mono", "wav", 48000, 1),
+    ("mp3 44.1k stereo", "mp3", 44100, 2),
+]
+
+
+def synthetic_speech(seconds: float, rate: int, rng) -> tuple[np.ndarray, float]:
+    """float32 samples and the number of seconds that are speech."""
+    t = np.arange(int(seconds * rate)) / rate
+    signal = rng.normal(0, 10 ** (-60 / 20), len(t)).astype(np.float32)
+    speech = np.zeros(len(t), dtype=bool)
+    # 1.5 s of silence, then 2 s utterances with 1 s pauses, 2 s of silence at the end
+    start = 1.5
+    while start + 2 < seconds - 2:
+        speech |= (t >= start) & (t < start + 2)
+        start += 3
+    envelope = (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)) * speech
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 12))
+    signal += (0.2 * envelope * voice).astype(np.float32)
+    return signal, speech.sum() / rate
+
+
+def encode(signal: np.ndarray, rate: int, channels: int, fmt: str) -> bytes:
+    pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    if channels > 1:
+        pcm = np.repeat(pcm[:, None], channels, axis=1)
+    segment = AudioSegment(pcm.tobytes(), frame_rate=rate, sample_width=2, channels=channels)
+    out = io.BytesIO()
+    segment.export(out, format=fmt)
+    return out.getvalue()
+
+
+def run(args):
+    rng = np.random.default_rng(0)
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    print(f"{args.seconds:.0f} s clip; bytes per second of input audio, ms of CPU per second of audio")
+    print(f"{'format':<18} {'upload':>8} {'no vad':>8} {'sent':>8} {'speech kept':>11}  "
+          f"{'decode':>7} {'resample':>8} {'vad':>6} {'total':>6}")
+    for name, fmt, rate, channels in FORMATS:
+        if fmt != "wav" and not has_ffmpeg:
+            print(f"{name:<18} skipped, no ffmpeg")
+            continue
+        signal, speech_seconds = synthetic_speech(args.seconds, rate, rng)
+        data = encode(signal, rate, channels, fmt)
+        timings = {"decode": 0.0, "resample": 0.0, "vad": 0.0}
+        for _ in range(args.repeat):
+            audio = preprocess_audio(data, f"clip.{fmt}")
+            for stage, seconds in audio.timings.items():
+                timings[stage] += seconds / args.repeat
+        total = sum(timings.values())
+        per_second = 1000 / args.seconds
+        print(
+            f"{name:<18} {len(data) / args.seconds:>8.0f} {SAMPLE_RATE * 2:>8} "
+            f"{audio.nbytes / args.seconds:>8.0f} {min(audio.seconds / speech_seconds, 1):>10.0%}  "
+            f"{timings['decode'] * per_second:>6.2f}  {timings['resample'] * per_second:>7.2f} "
+            f"{timings['vad'] * per_second:>6.2f} {total * per_second:>6.2f}"
+        )
+    print(f"speech is {speech_seconds / args.seconds:.0%} of the clip")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audio preprocessing cost per second of audio")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args)
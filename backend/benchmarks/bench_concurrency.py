@@ -0,0 +1,82 @@
+"""
+Concurrency benchmark: many clients hammering an authenticated endpoint.
+
+Start the API first (no --reload, one worker), then:
+
+    cd backend
+    uvicorn app.main:app --port 8000 &
+    python -m benchmarks.bench_concurrency --clients 200 --requests 10000
+
+Run it once against a checkout before a change and once after to compare
+requests/sec and tail latency.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def get_token(client, email, password):
+    await client.post("/auth/register", json={
+        "firstname": "Bench", "lastname": "User", "email": email, "password": password,
+    })
+    response = await client.post("/auth/login", data={"username": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        token = await get_token(client, args.email, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        remaining = args.requests
+        latencies = []
+        errors = 0
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(args.path, headers=headers)
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.clients)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{args.requests} x GET {args.path} with {args.clients} concurrent clients")
+    print(f"throughput: {len(latencies) / elapsed:,.0f} req/s ({errors} errors)")
+    print(f"latency:    p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms, "
+          f"mean {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/auth/me")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--email", default="bench@example.com")
+    parser.add_argument("--password", default="bench-password")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark for the bulk transaction importer.
+
+Writes a synthetic CSV, imports it into a throwaway SQLite database and
+reports rows/sec and peak memory.
+
+    cd backend
+    python -m benchmarks.bench_import --rows 1000000
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def write_csv(path, rows):
+    categories = ["Food & Dining", "Groceries", "Transportation", "Shopping", "Bills & Utilities"]
+    start = datetime(2020, 1, 1)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "amount", "category", "merchant", "notes"])
+        for i in range(rows):
+            writer.writerow([
+                (start + timedelta(minutes=7 * i)).isoformat(),
+                f"{random.uniform(1, 250):.2f}",
+                random.choice(categories),
+                f"Merchant {i % 500}",
+                "",
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    for key in ("SECRET_KEY", "ANTHROPIC_API_KEY", "OPENAI_API_KEY", "OPIK_API_KEY", "OPIK_WORKSPACE"):
+        os.environ.setdefault(key, "bench")
+
+    from app.database import Base, SessionLocal, engine
+    from app.models.budget import Budget  # noqa: F401 - registers the User.budgets mapper
+    from app.models.user import User
+    from app.src.importers import parse_upload, import_transactions
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(firstname="Bench", lastname="User", email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    csv_path = os.path.join(workdir, "import.csv")
+    write_csv(csv_path, args.rows)
+    size_mb = os.path.getsize(csv_path) / 1e6
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    with open(csv_path, "rb") as f:
+        result = import_transactions(db, user.id, parse_upload(f, "import.csv"))
+    elapsed = time.perf_counter() - started
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"file:       {args.rows} rows, {size_mb:.1f} MB")
+    print(f"imported:   {result.imported} (failed {result.failed})")
+    print(f"elapsed:    {elapsed:.2f} s")
+    print(f"throughput: {result.imported / elapsed:,.0f} rows/s")
+    print(f"peak RSS:   {rss_after * scale / 1e6:.1f} MB (+{(rss_after - rss_before) * scale / 1e6:.1f} MB during import)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
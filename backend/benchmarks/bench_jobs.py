@@ -0,0 +1,120 @@
+"""
+Load benchmark for the background job routes (/voice/upload, /transactions/import).
+
+One heavy user starts --imports bank exports of --import-rows rows at once,
+then --users light users each send --uploads voice notes (--size-mb WAVs)
+at once, while a prober hits /auth/me every 50 ms:
+
+    cd backend
+    python -m benchmarks.fake_gemini --port 8090 --latency 1.5 &
+    API_KEY=fake LLM_BASE_URL=http://127.0.0.1:8090 uvicorn app.main:app --port 8000 &
+    python -m benchmarks.bench_jobs --users 8 --uploads 3 --imports 4
+
+Reports, per kind, how long the POST held its connection and how long
+until the result was there (the same thing when the server answers the
+POST synchronously), the result statuses, the prober's latency and the
+deepest job queue seen on /health. A job server holds connections for
+the spooling only, and the per-user cap keeps the heavy user's imports
+from delaying the voice notes.
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+
+from benchmarks.bench_concurrency import get_token, percentile
+from benchmarks.bench_upload_memory import write_wav
+
+
+def write_csv(path: str, rows: int):
+    if os.path.exists(path) and sum(1 for _ in open(path)) > rows:
+        return
+    start = datetime(2025, 1, 1)
+    with open(path, "w") as out:
+        out.write("amount,category,merchant,date\n")
+        for i in range(rows):
+            out.write(f"{5 + i % 200}.25,Groceries,Shop {i % 50},{(start + timedelta(minutes=i)).isoformat()}\n")
+
+
+async def submit(client, token: str, route: str, path: str, content_type: str, held: list, done: list, statuses: Counter):
+    headers = {"Authorization": f"Bearer {token}"}
+    started = time.perf_counter()
+    with open(path, "rb") as upload:
+        response = await client.post(route, files={"file": (os.path.basename(path), upload, content_type)}, headers=headers)
+    held.append(time.perf_counter() - started)
+    while response.status_code == 202:
+        response = await client.get(f"/jobs/{response.json()['id']}/result", params={"wait": 30}, headers=headers)
+    done.append(time.perf_counter() - started)
+    statuses[response.status_code] += 1
+
+
+async def probe(client, token: str, stop: asyncio.Event, latencies: list, depth: list):
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/auth/me", headers=headers)
+        latencies.append(time.perf_counter() - started)
+        jobs = (await client.get("/health")).json().get("jobs")
+        if jobs:
+            depth[0] = max(depth[0], jobs["queued"])
+        await asyncio.sleep(0.05)
+
+
+def line(name: str, held: list, done: list, statuses: Counter) -> str:
+    held, done = sorted(held), sorted(done)
+    return (f"{name:<7} held p50 {percentile(held, 50):>6.2f}s p95 {percentile(held, 95):>6.2f}s   "
+            f"result p50 {percentile(done, 50):>6.2f}s p95 {percentile(done, 95):>6.2f}s   {dict(statuses)}")
+
+
+async def run(args):
+    os.makedirs(args.dir, exist_ok=True)
+    wav = os.path.join(args.dir, f"upload_{args.size_mb}mb.wav")
+    write_wav(wav, args.size_mb)
+    csv = os.path.join(args.dir, f"import_{args.import_rows}.csv")
+    write_csv(csv, args.import_rows)
+
+    limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=600) as client:
+        heavy = await get_token(client, "jobs-heavy@example.com", "bench-password")
+        light = [await get_token(client, f"jobs-{i}@example.com", "bench-password") for i in range(args.users)]
+        stop = asyncio.Event()
+        probe_latencies, depth = [], [0]
+        prober = asyncio.create_task(probe(client, light[0], stop, probe_latencies, depth))
+        imports = ([], [], Counter())
+        voice = ([], [], Counter())
+        started = time.perf_counter()
+        heavy_tasks = [asyncio.create_task(submit(client, heavy, "/transactions/import", csv, "text/csv", *imports))
+                       for _ in range(args.imports)]
+        await asyncio.sleep(0.2)  # the imports get in first
+        await asyncio.gather(*(submit(client, token, "/voice/upload", wav, "audio/wav", *voice)
+                               for token in light for _ in range(args.uploads)))
+        voice_seconds = time.perf_counter() - started
+        await asyncio.gather(*heavy_tasks)
+        stop.set()
+        await prober
+
+    probe_latencies.sort()
+    print(f"{args.imports} imports of {args.import_rows} rows by one user, then "
+          f"{args.users} users x {args.uploads} voice notes of {args.size_mb} MB")
+    print(line("voice", *voice))
+    if args.imports:
+        print(line("import", *imports))
+    print(f"all voice notes done after {voice_seconds:.1f}s; /auth/me p50 {percentile(probe_latencies, 50) * 1000:.0f}ms "
+          f"p95 {percentile(probe_latencies, 95) * 1000:.0f}ms; deepest job queue {depth[0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Voice uploads and imports under load, synchronous or as jobs")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=8, help="light users sending voice notes")
+    parser.add_argument("--uploads", type=int, default=3, help="voice notes per light user")
+    parser.add_argument("--size-mb", type=int, default=2)
+    parser.add_argument("--imports", type=int, default=4, help="imports the heavy user starts")
+    parser.add_argument("--import-rows", type=int, default=100000)
+    parser.add_argument("--dir", default="/tmp/bench_jobs", help="where the test files are written")
+    args = parser.parse_args()
+    asyncio.run(run(args))
@@ -0,0 +1,96 @@
+"""
+Time to first response of a voice interaction, with and without live_pool.
+
+Runs AudioSessions in this process against benchmarks/fake_live.py. Give
+the fake a setup latency like the real service's, the pool exists to hide it:
+
+    cd backend
+    python -m benchmarks.fake_live --port 8091 --setup-latency 0.3 --latency 0 --turn-seconds 0.5 &
+    SSL_CERT_FILE=/tmp/fake_live/cert.pem LLM_LIVE_BASE_URL=https://127.0.0.1:8091 API_KEY=fake \\
+        python -m benchmarks.bench_live_pool --interactions 40 --concurrency 4 --pool-size 4
+
+Each interaction opens a session, sends one --turn-seconds turn of audio at
+once and waits for the first reply audio; --concurrency users do that back
+to back with --gap seconds in between. Reports time to first reply p50/p95/max
+per mode, and the pool's hits and misses.
+"""
+import argparse
+import asyncio
+import time
+
+from app.src.live_pool import LiveSessionPool
+from app.src.llm_caller import AUDIO_CONFIG, AUDIO_MODEL, AudioSession, get_live_client
+from benchmarks.bench_concurrency import percentile
+
+
+async def add_to_database(amount: float, category: str = "Other", description: str | None = None):
+    return {"status": "saved"}
+
+
+async def interaction(pool: LiveSessionPool | None, turn: bytes) -> float:
+    replied = asyncio.Event()
+
+    async def output(event: dict):
+        if event["type"] == "audio":
+            replied.set()
+
+    started = time.perf_counter()
+    session = AudioSession(get_live_client(), {"add_to_database": add_to_database}, output=output, pool=pool)
+    live = asyncio.create_task(session.activate())
+    await session.recieve_audio(turn)
+    waiting = asyncio.create_task(replied.wait())
+    await asyncio.wait({live, waiting}, return_when=asyncio.FIRST_COMPLETED)
+    elapsed = time.perf_counter() - started
+    for task in (live, waiting):
+        task.cancel()
+    await asyncio.gather(live, waiting, return_exceptions=True)
+    if not replied.is_set():
+        raise RuntimeError(f"session ended without a reply: {live.exception() if live.done() and not live.cancelled() else ''}")
+    return elapsed
+
+
+async def user(pool, turn: bytes, count: int, gap: float, latencies: list):
+    for _ in range(count):
+        latencies.append(await interaction(pool, turn))
+        await asyncio.sleep(gap)
+
+
+async def run_mode(name: str, pool: LiveSessionPool | None, args):
+    turn = bytes(int(16000 * 2 * args.turn_seconds))
+    if pool is not None:
+        pool.start()
+        while pool.stats()["idle"] < pool.size:
+            await asyncio.sleep(0.05)
+    latencies = []
+    per_user = args.interactions // args.concurrency
+    await asyncio.gather(*(user(pool, turn, per_user, args.gap, latencies) for _ in range(args.concurrency)))
+    latencies.sort()
+    line = (f"{name:<12} p50 {percentile(latencies, 50) * 1000:>5.0f}ms  p95 {percentile(latencies, 95) * 1000:>5.0f}ms  "
+            f"max {latencies[-1] * 1000:>5.0f}ms  ({len(latencies)} interactions)")
+    if pool is not None:
+        stats = pool.stats()
+        line += f"  hits {stats['hits']} misses {stats['misses']}"
+        await pool.close()
+    print(line)
+
+
+async def run(args):
+    def connect():
+        return get_live_client().aio.live.connect(model=AUDIO_MODEL, config=AUDIO_CONFIG)
+
+    print(f"{args.concurrency} users, {args.gap}s between interactions, time to first reply audio")
+    await run_mode("no pool", None, args)
+    await run_mode(f"pool of {args.pool_size}", LiveSessionPool(
+        connect, size=args.pool_size, max_idle_seconds=300, health_seconds=30,
+    ), args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Voice time to first response with and without live_pool")
+    parser.add_argument("--interactions", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--gap", type=float, default=0.5, help="seconds a user waits between interactions")
+    parser.add_argument("--turn-seconds", type=float, default=0.5, help="must match fake_live --turn-seconds")
+    args = parser.parse_args()
+    asyncio.run(run(args))
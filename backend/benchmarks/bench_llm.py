@@ -0,0 +1,61 @@
+"""
+LLM call path benchmark against benchmarks/fake_gemini.py.
+
+    cd backend
+    python -m benchmarks.fake_gemini --port 8090 --latency 1.0 &
+    API_KEY=fake LLM_BASE_URL=http://127.0.0.1:8090 python -m benchmarks.bench_llm --calls 64 --distinct 8
+
+Fires --calls concurrent generate_text() calls spread over --distinct
+prompts and reports wall time, how many requests actually reached the
+server (coalescing) and the peak number in flight (LLM_MAX_CONCURRENT_CALLS).
+A heartbeat task measures how late the event loop runs meanwhile, which is
+what a blocking call would show up as.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def heartbeat(stop: asyncio.Event, lags: list[float]):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+async def run(args):
+    from app.config import get_settings
+    from app.src.llm_caller import generate_text
+
+    base_url = get_settings().LLM_BASE_URL
+    if not base_url:
+        raise SystemExit("set LLM_BASE_URL to the fake server, e.g. http://127.0.0.1:8090")
+    async with httpx.AsyncClient(base_url=base_url) as fake:
+        await fake.post("/stats/reset")
+
+        stop = asyncio.Event()
+        lags = []
+        beat = asyncio.create_task(heartbeat(stop, lags))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            generate_text(f"bench prompt {i % args.distinct}") for i in range(args.calls)
+        ))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await beat
+
+        stats = (await fake.get("/stats")).json()
+
+    print(f"{len(results)} calls over {args.distinct} prompts in {elapsed:.2f}s")
+    print(f"upstream requests: {stats['requests']}  peak in flight: {stats['max_in_flight']}")
+    print(f"event loop lag: max {max(lags) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the async LLM text path")
+    parser.add_argument("--calls", type=int, default=64)
+    parser.add_argument("--distinct", type=int, default=8, help="number of different prompts")
+    args = parser.parse_args()
+    asyncio.run(run(args))
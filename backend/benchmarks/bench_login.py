@@ -0,0 +1,82 @@
+"""
+Login throughput benchmark for the bcrypt worker pool.
+
+In-process (hash pool only, scaled over 1..N workers):
+
+    cd backend
+    python -m benchmarks.bench_login --verifies 64
+
+Against a running server (full /auth/login path):
+
+    python -m benchmarks.bench_login --url http://127.0.0.1:8000 --clients 50 --verifies 500
+"""
+import argparse
+import asyncio
+import os
+import time
+
+
+async def bench_pool(workers, verifies, use_processes):
+    from app.src.security import PasswordHasher, hash_password
+
+    hasher = PasswordHasher(workers=workers, max_pending=verifies, use_processes=use_processes)
+    hashed = hash_password("bench-password")
+    # warm up the pool (process start-up, passlib backend load)
+    await asyncio.gather(*(hasher.verify("bench-password", hashed) for _ in range(workers)))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(hasher.verify("bench-password", hashed) for _ in range(verifies)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+    assert all(results)
+    return verifies / elapsed
+
+
+async def bench_http(url, clients, logins):
+    import httpx
+
+    email, password = "bench-login@example.com", "bench-password"
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        await client.post("/auth/register", json={
+            "firstname": "Bench", "lastname": "User", "email": email, "password": password,
+        })
+        remaining = logins
+        statuses = {}
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.post("/auth/login", data={"username": email, "password": password})
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+    print(f"{logins} logins, {clients} clients: {logins / elapsed:.1f} logins/s, status codes {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verifies", type=int, default=64)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--processes", action="store_true", help="use a process pool instead of threads")
+    parser.add_argument("--url", default=None, help="benchmark a running server instead")
+    parser.add_argument("--clients", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench_http(args.url, args.clients, args.verifies))
+        return
+
+    for key in ("SECRET_KEY", "ANTHROPIC_API_KEY", "OPENAI_API_KEY", "OPIK_API_KEY", "OPIK_WORKSPACE"):
+        os.environ.setdefault(key, "bench")
+    workers = 1
+    while workers <= args.max_workers:
+        rate = asyncio.run(bench_pool(workers, args.verifies, args.processes))
+        print(f"{workers:>3} workers: {rate:8.1f} verifies/s")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
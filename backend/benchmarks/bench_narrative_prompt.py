@@ -0,0 +1,123 @@
+"""
+Narrative prompt size and time-to-response versus transaction count.
+
+For each --rows size, imports that many transactions (all inside the year
+window) for a fresh user in a throwaway SQLite database, then compares:
+
+- raw: load every Transaction ORM row and list them all in the prompt
+  (what passing the whole list to the model amounts to)
+- compacted: stream the rows into a SpendingSummary and render it within
+  NARRATIVE_PROMPT_TOKEN_BUDGET
+
+    cd backend
+    python -m benchmarks.bench_narrative_prompt --rows 100 1000 10000 100000
+
+With the fake model running (its --ms-per-1k-tokens stands in for prompt
+processing time), also times the full model round trip:
+
+    python -m benchmarks.fake_gemini --port 8090 --latency 0.5 --ms-per-1k-tokens 50 &
+    API_KEY=fake LLM_BASE_URL=http://127.0.0.1:8090 python -m benchmarks.bench_narrative_prompt
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def synthetic_rows(count):
+    categories = ["Food & Dining", "Groceries", "Transportation", "Shopping", "Bills & Utilities", "Travel"]
+    now = datetime.utcnow()
+    for i in range(count):
+        amount = random.uniform(1, 120) if random.random() > 0.01 else random.uniform(500, 2000)
+        yield i + 1, {
+            "amount": round(amount, 2),
+            "category": random.choice(categories),
+            "merchant": f"Merchant {random.randint(1, 300)}",
+            "date": (now - timedelta(minutes=random.randint(0, 364 * 24 * 60))).isoformat(),
+        }
+
+
+async def measure(user_id, start_date, with_llm):
+    from sqlalchemy import select
+
+    from app.ai_services.spending_analysis import NARRATIVE_PROMPT, build_prompt, estimate_tokens, summarize_transactions
+    from app.database import AsyncSessionLocal
+    from app.models.transactions import Transaction
+    from app.src.llm_caller import generate_text
+
+    results = {}
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        rows = (await db.execute(select(Transaction).where(
+            Transaction.user_id == user_id, Transaction.date >= start_date
+        ))).scalars().all()
+        listing = "\n".join(
+            f"- {row.date.date()} {row.category.value} {row.amount:.2f} {row.merchant}" for row in rows
+        )
+        raw_prompt = NARRATIVE_PROMPT.format(time_period="year", summary=listing, budgets="{}", goals="{}")
+        results["raw"] = [estimate_tokens(raw_prompt), time.perf_counter() - started]
+        db.expunge_all()
+
+        started = time.perf_counter()
+        summary = await summarize_transactions(db, user_id, start_date)
+        prompt = build_prompt(summary, [], None, "year")
+        results["compacted"] = [estimate_tokens(prompt), time.perf_counter() - started]
+
+    if with_llm:
+        for name, text in (("raw", raw_prompt), ("compacted", prompt)):
+            started = time.perf_counter()
+            await generate_text(text)
+            results[name].append(time.perf_counter() - started)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    for key in ("SECRET_KEY", "ANTHROPIC_API_KEY", "OPENAI_API_KEY", "OPIK_API_KEY", "OPIK_WORKSPACE"):
+        os.environ.setdefault(key, "bench")
+
+    from app.config import get_settings
+    from app.database import Base, SessionLocal, engine
+    from app.models.budget import Budget  # noqa: F401 - registers the User.budgets mapper
+    from app.models.user import User
+    from app.src.importers import import_transactions
+
+    Base.metadata.create_all(bind=engine)
+    with_llm = bool(get_settings().LLM_BASE_URL)
+    start_date = datetime.utcnow() - timedelta(days=365)
+
+    users = []
+    for count in args.rows:
+        db = SessionLocal()
+        user = User(firstname="Bench", lastname="User", email=f"bench{count}@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        import_transactions(db, user.id, synthetic_rows(count))
+        users.append((count, user.id))
+        db.close()
+
+    async def run_all():
+        return [(count, await measure(user_id, start_date, with_llm)) for count, user_id in users]
+
+    header = f"{'rows':>8} {'raw tokens':>11} {'raw build':>10} {'tokens':>7} {'build':>8}"
+    if with_llm:
+        header += f" {'raw TTR':>8} {'TTR':>7}"
+    print(header)
+    for count, results in asyncio.run(run_all()):
+        raw, compacted = results["raw"], results["compacted"]
+        line = f"{count:>8} {raw[0]:>11} {raw[1]:>9.3f}s {compacted[0]:>7} {compacted[1]:>7.3f}s"
+        if with_llm:
+            line += f" {raw[2]:>7.2f}s {compacted[2]:>6.2f}s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Overload harness for the AI routes: admission control, circuit breaker
+and degraded mode against benchmarks/fake_gemini.py.
+
+Start the fake model and the API pointed at it (short cooldown so the
+recovery phase doesn't take long), then run the harness:
+
+    cd backend
+    python -m benchmarks.fake_gemini --port 8090 &
+    API_KEY=fake LLM_BASE_URL=http://127.0.0.1:8090 AI_BREAKER_COOLDOWN_SECONDS=5 \\
+        uvicorn app.main:app --port 8000 &
+    python -m benchmarks.bench_overload --clients 40 --requests 200
+
+It walks the fake model through phases (healthy, failing, recovered, slow;
+see PHASES). In each phase --clients concurrent clients, one user each,
+make --requests /insights/narrative calls between them while a side client
+polls /auth/me. Each user gets a new transaction before every phase so no
+narrative is served from the cache.
+Per phase it reports AI answers vs degraded ones (by X-Degraded reason),
+narrative and /auth/me latencies, and the breaker state from /health.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime
+
+import httpx
+
+from benchmarks.bench_concurrency import get_token, percentile
+
+# name, fake latency seconds, fake error rate
+PHASES = [
+    ("healthy", 0.5, 0.0),
+    ("failing", 0.2, 1.0),
+    ("recovered", 0.5, 0.0),
+    ("slow", 30.0, 0.0),
+]
+
+
+async def touch_users(client, tokens):
+    # a new transaction changes the narrative fingerprint -> cache miss
+    row = f"amount,category,merchant,date\n12.5,Groceries,Bench,{datetime.utcnow().isoformat()}\n"
+    for token in tokens:
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await client.post(
+            "/transactions/import",
+            files={"file": ("touch.csv", row, "text/csv")},
+            headers=headers,
+        )
+        while response.status_code == 202:  # the import runs as a job
+            response = await client.get(f"/jobs/{response.json()['id']}/result", params={"wait": 30}, headers=headers)
+
+
+async def probe(client, token, stop: asyncio.Event, latencies: list[float]):
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/auth/me", headers=headers)
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+
+
+async def run_phase(client, tokens, requests: int):
+    outcomes = Counter()
+    latencies = []
+    probe_latencies = []
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(client, tokens[0], stop, probe_latencies))
+
+    remaining = requests
+
+    async def worker(token):
+        nonlocal remaining
+        headers = {"Authorization": f"Bearer {token}"}
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await client.post("/insights/narrative", json={"time_period": "month"}, headers=headers)
+            except httpx.TransportError:
+                outcomes["transport error"] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                outcomes[f"http {response.status_code}"] += 1
+            else:
+                outcomes[response.headers.get("X-Degraded", "ai")] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(token) for token in tokens))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await prober
+    return outcomes, sorted(latencies), sorted(probe_latencies), elapsed
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.clients + 10)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=120) as client, \
+            httpx.AsyncClient(base_url=args.fake_url) as fake:
+        tokens = [
+            await get_token(client, f"overload{i}@example.com", "bench-password")
+            for i in range(args.clients)
+        ]
+        print(f"{'phase':<10} {'time':>6}  {'outcomes':<46} {'p50':>6} {'p95':>6} {'me p99':>7}  breaker")
+        for name, latency, error_rate in PHASES:
+            if name == "recovered":
+                await asyncio.sleep(args.cooldown)
+            await fake.post("/control", json={"latency": latency, "error_rate": error_rate})
+            await touch_users(client, tokens)
+            outcomes, latencies, probes, elapsed = await run_phase(client, tokens, args.requests)
+            health = (await client.get("/health")).json()["ai_admission"]
+            summary = ", ".join(f"{kind} {count}" for kind, count in outcomes.most_common())
+            print(
+                f"{name:<10} {elapsed:>5.1f}s  {summary:<46} "
+                f"{percentile(latencies, 50):>5.2f}s {percentile(latencies, 95):>5.2f}s "
+                f"{percentile(probes, 99) * 1000:>5.0f}ms  {health['breaker']['state']}"
+            )
+        print(f"shed totals: {health['shed']}, breaker opened {health['breaker']['times_opened']}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the AI routes through a slow and failing model")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--fake-url", default="http://127.0.0.1:8090")
+    parser.add_argument("--clients", type=int, default=40, help="concurrent clients, one user each")
+    parser.add_argument("--requests", type=int, default=200, help="narrative calls per phase")
+    parser.add_argument("--cooldown", type=float, default=6, help="wait before the recovered phase, > breaker cooldown")
+    args = parser.parse_args()
+    asyncio.run(run(args))
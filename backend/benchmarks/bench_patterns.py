@@ -0,0 +1,87 @@
+"""
+Pattern engine benchmark: many users x two years of transactions.
+
+Generates synthetic transactions in memory (each user gets a rising, a
+falling, a steady and a bursty category) and times detect_patterns over
+chunks of users, the way patterns_for_users batches them. Reports rows/s,
+per-user cost, single-user latency and how well the planted patterns are
+recovered.
+
+    cd backend
+    python -m benchmarks.bench_patterns --users 10000 --days 730
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+# (category index, kind) planted for every user
+PLANTED = [(0, "increasing"), (1, "decreasing"), (2, "stable"), (3, "irregular")]
+
+
+def synthetic_chunk(rng, first_user, users, days, per_day, end):
+    """About per_day transactions per user per day spread over the planted categories."""
+    n = users * days * per_day
+    user_ids = first_user + rng.integers(0, users, n)
+    day = rng.integers(0, days, n)
+    slot = rng.integers(0, len(PLANTED), n)
+    category = np.array([c for c, _ in PLANTED])[slot]
+    base = rng.gamma(4.0, 5.0, n)
+    progress = 1 - day / days  # 0 = oldest, 1 = today
+    amount = np.where(slot == 0, base * (0.5 + 1.5 * progress), base)
+    amount = np.where(slot == 1, base * (2.0 - 1.5 * progress), amount)
+    # bursty: most rows dropped, the rest large
+    keep = (slot != 3) | (rng.random(n) < 0.05)
+    amount = np.where(slot == 3, base * 20, amount)
+    dates = np.datetime64(end, "D") - day.astype("timedelta64[D]")
+    return user_ids[keep], category[keep], dates[keep], amount[keep]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--per-day", type=int, default=1, help="transactions per user per day")
+    parser.add_argument("--chunk", type=int, default=2000, help="users per detect_patterns call")
+    args = parser.parse_args()
+
+    for key in ("SECRET_KEY", "ANTHROPIC_API_KEY", "OPENAI_API_KEY", "OPIK_API_KEY", "OPIK_WORKSPACE"):
+        os.environ.setdefault(key, "bench")
+    from app.ai_services.pattern_engine import CATEGORIES, detect_patterns
+
+    rng = np.random.default_rng(7)
+    end = datetime.utcnow()
+    weeks = args.days // 7
+    total_rows = 0
+    elapsed = 0.0
+    hits = {kind: 0 for _, kind in PLANTED}
+    for first in range(0, args.users, args.chunk):
+        users = min(args.chunk, args.users - first)
+        chunk = synthetic_chunk(rng, first, users, args.days, args.per_day, end)
+        started = time.perf_counter()
+        patterns = detect_patterns(*chunk, end, weeks)
+        elapsed += time.perf_counter() - started
+        total_rows += len(chunk[0])
+        for found in patterns.values():
+            by_category = {p.category: p.pattern_type for p in found}
+            for category, kind in PLANTED:
+                hits[kind] += by_category.get(CATEGORIES[category].value) == kind
+
+    single = synthetic_chunk(rng, 0, 1, args.days, args.per_day, end)
+    started = time.perf_counter()
+    for _ in range(100):
+        detect_patterns(*single, end, weeks)
+    single_ms = (time.perf_counter() - started) / 100 * 1000
+
+    print(f"{args.users} users x {args.days} days, {total_rows:,} rows, {weeks} weekly buckets")
+    print(f"engine time: {elapsed:.2f}s ({total_rows / elapsed:,.0f} rows/s, {elapsed / args.users * 1e6:.0f} us/user)")
+    print(f"single user: {single_ms:.2f} ms")
+    print("planted pattern recovered: " + ", ".join(
+        f"{kind} {hits[kind] / args.users:.1%}" for kind in hits
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Microbenchmark: PcmRing against the asyncio.Queue plumbing AudioSession
+used before, for both directions.
+
+- mic: recieve_audio() of 100 ms 16 kHz frames, send_realtime() taking
+  out everything buffered every --batch frames as one bytes object (what
+  the SDK needs). The queue version put a dict per frame and joined them
+- speaker: emit() of 100 ms 24 kHz reply frames, send_response() taking
+  int16 samples for playback every --batch frames. The queue version
+  did np.frombuffer per frame
+
+    cd backend
+    python -m benchmarks.bench_pcm_ring --frames 200000 --batch 5
+
+Frames per second is measured on its own. Allocation is measured in a
+second pass under tracemalloc, as the peak heap growth (bytes allocated
+and alive at the same time) while writing, per frame, and while reading,
+per read. For the mic, a read includes the one bytes object the SDK
+needs; the queue version skipped it when only one frame was waiting.
+The ring's write side is PcmRing.write_nowait, which allocates nothing;
+what it still shows is the put() coroutine itself, as AudioSession's
+recieve_audio/emit are.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.src.pcm_ring import PcmRing
+
+MIC_FRAME = bytes(3200)  # 100 ms, 16 kHz 16-bit
+SPEAKER_FRAME = bytes(4800)  # 100 ms, 24 kHz 16-bit
+
+
+class QueueMic:
+    def __init__(self, batch):
+        self.queue = asyncio.Queue(maxsize=batch)
+
+    async def put(self, frame):
+        await self.queue.put({"data": frame, "mime_type": "audio/pcm;rate=16000"})
+
+    async def take(self):
+        msg = await self.queue.get()
+        if not self.queue.empty():
+            pieces = [msg["data"]]
+            while not self.queue.empty():
+                pieces.append(self.queue.get_nowait()["data"])
+            msg = {"data": b"".join(pieces), "mime_type": msg["mime_type"]}
+        return msg["data"]
+
+
+class RingMic:
+    def __init__(self, batch):
+        self.ring = PcmRing(batch, len(MIC_FRAME))
+
+    async def put(self, frame):
+        if not self.ring.write_nowait(frame):
+            await self.ring.write(frame)
+
+    async def take(self):
+        return await self.ring.read()
+
+
+class QueueSpeaker:
+    def __init__(self, batch):
+        self.queue = asyncio.Queue()
+
+    async def put(self, frame):
+        self.queue.put_nowait(frame)
+
+    async def take(self):
+        total = 0
+        while not self.queue.empty():
+            total += len(np.frombuffer(self.queue.get_nowait(), dtype=np.int16))
+        return total
+
+
+class RingSpeaker:
+    def __init__(self, batch):
+        self.ring = PcmRing(batch, len(SPEAKER_FRAME))
+
+    async def put(self, frame):
+        if not self.ring.write_nowait(frame):
+            await self.ring.write(frame)
+
+    async def take(self):
+        total = 0
+        while len(self.ring):
+            samples = self.ring.peek_samples()
+            total += len(samples)
+            self.ring.consume(samples.nbytes)
+        return total
+
+
+async def run_once(kind, frame: bytes, frames: int, batch: int, trace: bool) -> tuple[float, float, float]:
+    """
+    (seconds, writer bytes per frame, reader bytes per read); the writer
+    fills a batch, the reader drains it.
+    """
+    channel = kind(batch)
+    put_growth = take_growth = 0
+    started = time.perf_counter()
+    for _ in range(frames // batch):
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        for _ in range(batch):
+            await channel.put(frame)
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            put_growth += peak - before
+            tracemalloc.reset_peak()
+            before = current
+        await channel.take()
+        if trace:
+            take_growth += tracemalloc.get_traced_memory()[1] - before
+    return time.perf_counter() - started, put_growth / frames, take_growth / (frames // batch)
+
+
+async def run(args):
+    print(f"{args.frames} frames, read every {args.batch}; heap growth peaks in bytes")
+    print(f"{'':<16} {'frames/s':>11} {'write/frame':>12} {'read/read':>10}")
+    for name, kind, frame in (
+        ("mic queue", QueueMic, MIC_FRAME),
+        ("mic ring", RingMic, MIC_FRAME),
+        ("speaker queue", QueueSpeaker, SPEAKER_FRAME),
+        ("speaker ring", RingSpeaker, SPEAKER_FRAME),
+    ):
+        seconds, _, _ = await run_once(kind, frame, args.frames, args.batch, trace=False)
+        tracemalloc.start()
+        _, per_write, per_read = await run_once(kind, frame, args.frames // 10, args.batch, trace=True)
+        tracemalloc.stop()
+        print(f"{name:<16} {args.frames / seconds:>11,.0f} {per_write:>12.0f} {per_read:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PcmRing vs asyncio.Queue for session audio")
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=5, help="frames written between two reads")
+    args = parser.parse_args()
+    asyncio.run(run(args))
@@ -0,0 +1,125 @@
+"""
+Memory benchmark for /voice/upload: large files, uploaded concurrently.
+
+Writes WAV files of each --sizes MB to --dir (44.1 kHz stereo, a 30 s
+synthetic speech clip repeated; written in pieces, never held whole), then
+for each size uploads --concurrency of them at once while sampling the
+server's resident memory from /proc. The server needs limits above the
+file sizes:
+
+    cd backend
+    python -m benchmarks.fake_gemini --port 8090 --latency 0.5 &
+    API_KEY=fake LLM_BASE_URL=http://127.0.0.1:8090 \\
+    VOICE_UPLOAD_MAX_BYTES=200000000 VOICE_UPLOAD_MAX_SECONDS=1200 \\
+        uvicorn app.main:app --port 8000 &
+    python -m benchmarks.bench_upload_memory --pid $! --sizes 10,100 --concurrency 4
+
+Per size it reports the server's RSS before and at peak, the growth per
+concurrent upload and how long the uploads took. If the upload path is
+streaming, the growth is the speech sent to the model (32 KB per second
+of it, at most VOICE_UPLOAD_MAX_SECONDS), not the file.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_audio import encode, synthetic_speech
+from benchmarks.bench_concurrency import get_token
+
+RATE = 44100
+CHANNELS = 2
+CLIP_SECONDS = 30
+
+
+def write_wav(path: str, size_mb: int):
+    """A size_mb WAV of the synthetic clip over and over."""
+    if os.path.exists(path) and os.path.getsize(path) >= size_mb * 1_000_000:
+        return
+    signal, _ = synthetic_speech(CLIP_SECONDS, RATE, np.random.default_rng(0))
+    clip = encode(signal, RATE, CHANNELS, "wav")
+    header, pcm = clip[:44], clip[44:]
+    repeats = max(1, size_mb * 1_000_000 // len(pcm))
+    data_size = len(pcm) * repeats
+    # patch the RIFF and data chunk sizes for the repeated body
+    header = bytearray(header)
+    header[4:8] = (36 + data_size).to_bytes(4, "little")
+    header[40:44] = data_size.to_bytes(4, "little")
+    with open(path, "wb") as out:
+        out.write(header)
+        for _ in range(repeats):
+            out.write(pcm)
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def sample_rss(pid: int, peak: list, stop: asyncio.Event):
+    while not stop.is_set():
+        peak[0] = max(peak[0], rss_kb(pid))
+        await asyncio.sleep(0.02)
+
+
+async def upload(client: httpx.AsyncClient, token: str, path: str) -> tuple[int, float]:
+    """Upload and wait for the job: (the status its result came back with, seconds)."""
+    started = time.perf_counter()
+    headers = {"Authorization": f"Bearer {token}"}
+    with open(path, "rb") as audio:
+        # httpx streams file objects in the multipart body
+        response = await client.post(
+            "/voice/upload",
+            files={"file": (os.path.basename(path), audio, "audio/wav")},
+            headers=headers,
+        )
+    while response.status_code == 202:
+        response = await client.get(f"/jobs/{response.json()['id']}/result", params={"wait": 30}, headers=headers)
+    return response.status_code, time.perf_counter() - started
+
+
+async def run(args):
+    os.makedirs(args.dir, exist_ok=True)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    async with httpx.AsyncClient(base_url=args.url, timeout=600) as client:
+        token = await get_token(client, "upload@example.com", "bench-password")
+        await upload(client, token, _file(args, sizes[0]))  # warm up imports, threadpool, db
+        print(f"{args.concurrency} concurrent uploads per size, server pid {args.pid}")
+        print(f"{'file':>8} {'rss before':>11} {'rss peak':>9} {'per upload':>11} {'status':>10} {'seconds':>8}")
+        for size in sizes:
+            path = _file(args, size)
+            before = rss_kb(args.pid)
+            peak = [before]
+            stop = asyncio.Event()
+            sampler = asyncio.create_task(sample_rss(args.pid, peak, stop))
+            started = time.perf_counter()
+            results = await asyncio.gather(*(upload(client, token, path) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await sampler
+            statuses = ",".join(sorted({str(status) for status, _ in results}))
+            print(f"{size:>5} MB {before / 1024:>8.0f} MB {peak[0] / 1024:>6.0f} MB "
+                  f"{(peak[0] - before) / 1024 / args.concurrency:>8.1f} MB {statuses:>10} {elapsed:>8.1f}")
+
+
+def _file(args, size_mb: int) -> str:
+    path = os.path.join(args.dir, f"upload_{size_mb}mb.wav")
+    write_wav(path, size_mb)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server memory while uploading large audio files")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--pid", type=int, required=True, help="the uvicorn process, for /proc/<pid>/status")
+    parser.add_argument("--sizes", default="10,100", help="file sizes in MB, comma separated")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--dir", default="/tmp/bench_upload", help="where the test files are written")
+    args = parser.parse_args()
+    asyncio.run(run(args))
@@ -0,0 +1,112 @@
+"""
+Load test for the /voice/realtime WebSocket against benchmarks/fake_live.py.
+
+    cd backend
+    python -m benchmarks.fake_live --port 8091 &
+    SSL_CERT_FILE=/tmp/fake_live/cert.pem LLM_LIVE_BASE_URL=https://127.0.0.1:8091 API_KEY=fake \\
+        uvicorn app.main:app --port 8000 &
+    python -m benchmarks.bench_voice --sessions 200 --seconds 10
+
+Every session streams --seconds of silence as 100 ms PCM frames at real
+time speed (what a browser mic does), reads whatever comes back, then sends
+{"type": "end"}. Sessions are spread over --users users. Reports sessions
+that ran to the end, replies per session, time from the start of a spoken
+turn's audio to the first reply audio (p50/p95), and how far the sender fell
+behind real time: that lag is the backpressure of the mic queue.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import httpx
+from websockets.asyncio.client import connect
+
+from benchmarks.bench_concurrency import get_token, percentile
+
+FRAME_SECONDS = 0.1
+FRAME = bytes(int(16000 * 2 * FRAME_SECONDS))  # 100 ms of 16 kHz 16-bit silence
+
+
+async def voice_session(url: str, token: str, args, results: dict):
+    reply_latencies = results["reply_latencies"]
+    try:
+        async with connect(f"{url}/voice/realtime?token={token}", max_size=None, compression=None) as ws:
+            turn_started = time.perf_counter()
+            waiting_reply = False
+            events = Counter()
+
+            async def reader():
+                nonlocal waiting_reply
+                async for message in ws:
+                    if isinstance(message, bytes):
+                        events["audio"] += 1
+                        if waiting_reply:
+                            reply_latencies.append(time.perf_counter() - turn_started)
+                            waiting_reply = False
+                    else:
+                        event = json.loads(message)
+                        events[event["type"]] += 1
+                        if event["type"] == "error":
+                            results["errors"]["model"] += 1
+
+            reading = asyncio.create_task(reader())
+            reading.add_done_callback(lambda task: task.cancelled() or task.exception())
+            started = time.perf_counter()
+            frames = int(args.seconds / FRAME_SECONDS)
+            frames_per_turn = int(args.turn_seconds / FRAME_SECONDS)
+            for i in range(frames):
+                if i % frames_per_turn == frames_per_turn - 1:
+                    # the fake answers once a full turn has arrived
+                    turn_started = time.perf_counter()
+                    waiting_reply = True
+                await ws.send(FRAME)
+                # keep real time; the send itself waits when the server stops reading
+                await asyncio.sleep(max(0.0, started + (i + 1) * FRAME_SECONDS - time.perf_counter()))
+            results["lag"].append(time.perf_counter() - started - args.seconds)
+            await asyncio.sleep(args.drain)
+            await ws.send(json.dumps({"type": "end"}))
+            await asyncio.wait_for(reading, 10)
+            results["ok"] += 1
+            results["events"].update(events)
+    except Exception as exc:
+        results["errors"][type(exc).__name__] += 1
+
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        tokens = [await get_token(client, f"voice{i}@example.com", "bench-password") for i in range(args.users)]
+    ws_url = args.url.replace("http", "ws", 1)
+    results = {"ok": 0, "errors": Counter(), "events": Counter(), "reply_latencies": [], "lag": []}
+    started = time.perf_counter()
+    sessions = []
+    for i in range(args.sessions):
+        sessions.append(asyncio.create_task(voice_session(ws_url, tokens[i % len(tokens)], args, results)))
+        await asyncio.sleep(args.ramp / args.sessions)
+    await asyncio.gather(*sessions)
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(results["reply_latencies"])
+    lag = sorted(results["lag"])
+    print(f"sessions ok: {results['ok']}/{args.sessions} in {elapsed:.1f}s, errors: {dict(results['errors'])}")
+    print(f"events: {dict(results['events'])}")
+    if latencies:
+        print(f"first reply audio: p50 {percentile(latencies, 50) * 1000:.0f}ms  "
+              f"p95 {percentile(latencies, 95) * 1000:.0f}ms  ({len(latencies)} turns)")
+    if lag:
+        print(f"sender behind real time: p50 {percentile(lag, 50) * 1000:.0f}ms  "
+              f"max {lag[-1] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent realtime voice sessions")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=10, help="audio streamed per session")
+    parser.add_argument("--turn-seconds", type=float, default=2.0, help="must match fake_live --turn-seconds")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions are opened")
+    parser.add_argument("--drain", type=float, default=1.0, help="seconds to listen after the last frame")
+    args = parser.parse_args()
+    asyncio.run(run(args))
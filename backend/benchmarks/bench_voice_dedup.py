@@ -0,0 +1,95 @@
+"""
+Benchmark for repeated /voice/upload requests (app/src/upload_dedup.py).
+
+Each round uploads a voice note, then retries it --retries times the ways a
+flaky mobile client does: the same file, the same Idempotency-Key, and the
+same recording re-wrapped with an extra WAV chunk (a new file, the same
+speech):
+
+    cd backend
+    python -m benchmarks.fake_gemini --port 8090 --latency 1.5 &
+    API_KEY=fake LLM_BASE_URL=http://127.0.0.1:8090 uvicorn app.main:app --port 8000 &
+    python -m benchmarks.bench_voice_dedup --rounds 10 --size-mb 2
+
+Reports, per kind, the time until the result was there and how many
+transactions were created. Only the first upload of a round should create
+any, or reach the model (fake_gemini's GET /stats counts the calls);
+retries answer with its result.
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+
+from benchmarks.bench_concurrency import get_token, percentile
+from benchmarks.bench_upload_memory import write_wav
+
+
+def rewrap(data: bytes, tag: bytes) -> bytes:
+    """The same WAV with a LIST chunk after fmt, as a re-encoding client would write it."""
+    chunk = b"LIST" + len(tag).to_bytes(4, "little") + tag + b"\0" * (len(tag) & 1)  # word aligned
+    data = data[:36] + chunk + data[36:]
+    return data[:4] + (len(data) - 8).to_bytes(4, "little") + data[8:]
+
+
+async def upload(client, token: str, data: bytes, key: str | None = None) -> tuple[float, list[int]]:
+    headers = {"Authorization": f"Bearer {token}"}
+    started = time.perf_counter()
+    response = await client.post(
+        "/voice/upload", files={"file": ("note.wav", data, "audio/wav")},
+        headers=headers | ({"Idempotency-Key": key} if key else {}),
+    )
+    response.raise_for_status()
+    response = await client.get(f"/jobs/{response.json()['id']}/result", params={"wait": 30}, headers=headers)
+    response.raise_for_status()
+    return time.perf_counter() - started, [t["id"] for t in response.json()["transactions"]]
+
+
+async def run(args):
+    os.makedirs(args.dir, exist_ok=True)
+    wav = os.path.join(args.dir, f"upload_{args.size_mb}mb.wav")
+    write_wav(wav, args.size_mb)
+    with open(wav, "rb") as f:
+        base = f.read()
+
+    timings = {"first": [], "same file": [], "same key": [], "rewrapped": []}
+    created = dict.fromkeys(timings, 0)
+    async with httpx.AsyncClient(base_url=args.url, timeout=600) as client:
+        token = await get_token(client, f"dedup-{uuid.uuid4().hex[:8]}@example.com", "bench-password")
+        seen: set[int] = set()
+        for round_ in range(args.rounds):
+            # a new recording per round (a click in the middle), the caches only know earlier rounds
+            middle = 44 + (len(base) - 44) // 8 * 4
+            click = ((round_ + 1) * 1000).to_bytes(2, "little") * 256
+            data = base[:middle] + click + base[middle + len(click):]
+            key = uuid.uuid4().hex
+            attempts = [("first", data, key)] + [
+                kind for _ in range(args.retries)
+                for kind in (("same file", data, None), ("same key", data, key),
+                             ("rewrapped", rewrap(data, b"retry..."), None))
+            ]
+            for kind, body, idempotency_key in attempts:
+                seconds, ids = await upload(client, token, body, idempotency_key)
+                timings[kind].append(seconds)
+                created[kind] += len(set(ids) - seen)
+                seen.update(ids)
+
+    print(f"{args.rounds} voice notes of {args.size_mb} MB, each retried {args.retries}x three ways")
+    for kind, values in timings.items():
+        values.sort()
+        print(f"{kind:<10} p50 {percentile(values, 50) * 1000:>7.1f}ms p95 {percentile(values, 95) * 1000:>7.1f}ms   "
+              f"transactions created {created[kind]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retried voice uploads against the dedup caches")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--retries", type=int, default=2, help="retries of each kind per round")
+    parser.add_argument("--size-mb", type=int, default=2)
+    parser.add_argument("--dir", default="/tmp/bench_voice_dedup", help="where the test file is written")
+    args = parser.parse_args()
+    asyncio.run(run(args))
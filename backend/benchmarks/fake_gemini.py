@@ -0,0 +1,168 @@
+"""
+Local stand-in for the Gemini text API, with injected latency and errors.
+
+Answers generateContent (and streamGenerateContent, as SSE) for any model
+after sleeping --latency seconds (plus --ms-per-1k-tokens of prompt, to
+model prompt processing time), fails --error-rate of them with a 503, and
+counts upstream requests so callers can check coalescing. POST /control
+changes latency/jitter/error_rate on the fly. Point the app or a benchmark
+at it with LLM_BASE_URL:
+
+    cd backend
+    python -m benchmarks.fake_gemini --port 8090 --latency 1.5 &
+    API_KEY=fake LLM_BASE_URL=http://127.0.0.1:8090 python -m benchmarks.bench_llm
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+app.state.latency = 1.0
+app.state.jitter = 0.0
+app.state.ms_per_1k_tokens = 0.0
+app.state.error_rate = 0.0
+app.state.requests = 0
+app.state.in_flight = 0
+app.state.max_in_flight = 0
+app.state.cancelled = 0  # streams the client walked away from
+app.state.errors = 0
+
+REPLY = {
+    "narrative": "You kept most of your spending in line with your goals this period. "
+                 "Dining out crept up, but groceries and bills stayed steady.",
+    "key_insights": ["Dining out is your fastest growing category"],
+    "recommendations": ["Set a weekly dining budget"],
+}
+
+
+# voice uploads (llm_caller.extract_expenses) send the speech inline as audio/wav
+EXTRACTION = {
+    "transcription": "Spent 25.50 on coffee at the corner cafe",
+    "expenses": [{"amount": 25.5, "category": "Food & Dining", "description": "Corner Cafe"}],
+    "confidence": 0.9,
+}
+
+
+def _failing() -> bool:
+    if random.random() < app.state.error_rate:
+        app.state.errors += 1
+        return True
+    return False
+
+
+def _error() -> JSONResponse:
+    return JSONResponse(
+        {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}},
+        status_code=503,
+    )
+
+
+def _response(text: str) -> dict:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": len(text.split())},
+    }
+
+
+async def _wait(prompt_bytes: int):
+    prompt_tokens = prompt_bytes / 4
+    await asyncio.sleep(
+        app.state.latency
+        + random.uniform(0, app.state.jitter)
+        + prompt_tokens / 1000 * app.state.ms_per_1k_tokens / 1000
+    )
+
+
+@app.post("/{version}/models/{model}:generateContent")
+async def generate_content(version: str, model: str, request: Request):
+    body = await request.body()
+    app.state.requests += 1
+    app.state.in_flight += 1
+    app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+    try:
+        await _wait(len(body))
+    finally:
+        app.state.in_flight -= 1
+    if _failing():
+        return _error()
+    return _response(json.dumps(EXTRACTION if b"audio/wav" in body else REPLY))
+
+
+@app.post("/{version}/models/{model}:streamGenerateContent")
+async def stream_generate_content(version: str, model: str, request: Request):
+    body = await request.body()
+    app.state.requests += 1
+    if _failing():
+        await _wait(len(body))
+        return _error()
+    # narrative text first, structured parts after the marker line (see STREAM_PROMPT)
+    extras = {"key_insights": REPLY["key_insights"], "recommendations": REPLY["recommendations"]}
+    text = REPLY["narrative"] + "\n---INSIGHTS---\n" + json.dumps(extras)
+    pieces = [text[i:i + 24] for i in range(0, len(text), 24)]
+
+    async def events():
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            # first token after the latency, the rest trickle in
+            await _wait(len(body))
+            for piece in pieces:
+                yield f"data: {json.dumps(_response(piece))}\r\n\r\n"
+                await asyncio.sleep(0.02)
+        except asyncio.CancelledError:
+            app.state.cancelled += 1
+            raise
+        finally:
+            app.state.in_flight -= 1
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "requests": app.state.requests,
+        "in_flight": app.state.in_flight,
+        "max_in_flight": app.state.max_in_flight,
+        "cancelled": app.state.cancelled,
+        "errors": app.state.errors,
+    }
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    app.state.requests = 0
+    app.state.max_in_flight = 0
+    app.state.cancelled = 0
+    app.state.errors = 0
+    return {"ok": True}
+
+
+@app.post("/control")
+async def control(request: Request):
+    """{"latency": 5, "error_rate": 0.5, ...}: change the injected behaviour."""
+    for name, value in (await request.json()).items():
+        if name in ("latency", "jitter", "error_rate", "ms_per_1k_tokens"):
+            setattr(app.state, name, float(value))
+    return {"latency": app.state.latency, "jitter": app.state.jitter, "error_rate": app.state.error_rate}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Gemini text API")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds before each answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds, 0..jitter")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=0.0, help="extra delay per 1000 prompt tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with a 503")
+    args = parser.parse_args()
+    app.state.latency = args.latency
+    app.state.jitter = args.jitter
+    app.state.ms_per_1k_tokens = args.ms_per_1k_tokens
+    app.state.error_rate = args.error_rate
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
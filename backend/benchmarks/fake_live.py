@@ -0,0 +1,182 @@
+"""
+Local stand-in for the Gemini Live API (BidiGenerateContent over wss).
+
+Accepts the SDK's setup message (answering after --setup-latency, what the
+real service spends before setupComplete), then counts the realtime audio
+it is sent.
+Every --turn-seconds of 16 kHz 16-bit audio it plays one utterance of
+--items expenses:
+1. a toolCall with --items add_to_database calls
+2. once every call has its response (after --latency), an output
+   transcription, --reply-ms of 24 kHz audio and turnComplete
+
+The time from the toolCall to the last function response is reported as
+tool_ms (p50/p95): what the app spends executing one turn's tools.
+
+The SDK always connects with wss, so the server generates a self-signed
+certificate for 127.0.0.1 and the app has to trust it through
+SSL_CERT_FILE:
+
+    cd backend
+    python -m benchmarks.fake_live --port 8091 &
+    SSL_CERT_FILE=/tmp/fake_live/cert.pem LLM_LIVE_BASE_URL=https://127.0.0.1:8091 API_KEY=fake \\
+        uvicorn app.main:app --port 8000
+"""
+import argparse
+import asyncio
+import base64
+import datetime
+import ipaddress
+import json
+import os
+import ssl
+import time
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+BYTES_PER_SECOND = 16000 * 2  # 16 kHz, 16-bit mono in
+
+stats = {"sessions": 0, "open": 0, "max_open": 0, "audio_bytes": 0, "turns": 0}
+tool_seconds = []
+
+
+def self_signed_cert(directory: str) -> tuple[str, str]:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    if os.path.exists(cert_path) and os.path.exists(key_path):
+        return cert_path, key_path
+    os.makedirs(directory, exist_ok=True)
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=30))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.IPAddress(ipaddress.ip_address("127.0.0.1")), x509.DNSName("localhost"),
+        ]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+def server_content(**content) -> str:
+    return json.dumps({"serverContent": content})
+
+
+async def play_turn(ws, turn: int, items: int) -> set[str]:
+    calls = [{
+        "id": f"call-{turn}-{item}",
+        "name": "add_to_database",
+        "args": {"amount": 4.5 + (turn + item) % 10, "category": "Food & Dining", "description": f"Coffee {item}"},
+    } for item in range(items)]
+    await ws.send(json.dumps({"toolCall": {"functionCalls": calls}}))
+    return {call["id"] for call in calls}
+
+
+async def finish_turn(ws, args, turn: int):
+    await asyncio.sleep(args.latency)
+    reply = bytes(int(24000 * 2 * args.reply_ms / 1000))
+    try:
+        await ws.send(server_content(outputTranscription={"text": f"Got it, coffee number {turn} is logged."}))
+        await ws.send(server_content(modelTurn={"parts": [{"inlineData": {
+            "mimeType": "audio/pcm;rate=24000", "data": base64.b64encode(reply).decode(),
+        }}]}))
+        await ws.send(server_content(turnComplete=True))
+    except ConnectionClosed:
+        return  # the client hung up mid-reply
+    stats["turns"] += 1
+
+
+async def session(ws, args):
+    stats["sessions"] += 1
+    stats["open"] += 1
+    stats["max_open"] = max(stats["max_open"], stats["open"])
+    try:
+        await ws.recv()  # setup
+        await asyncio.sleep(args.setup_latency)
+        await ws.send(json.dumps({"setupComplete": {}}))
+        heard = 0
+        turn = 0
+        replies = set()
+        waiting = set()  # call ids of the current turn without a response yet
+        asked = 0.0
+        async for raw in ws:
+            message = json.loads(raw)
+            realtime = message.get("realtime_input") or message.get("realtimeInput")
+            if realtime:
+                audio = realtime.get("audio") or (realtime.get("mediaChunks") or [{}])[0]
+                size = len(base64.b64decode(audio.get("data", "")))
+                stats["audio_bytes"] += size
+                heard += size
+                if heard >= args.turn_seconds * BYTES_PER_SECOND:
+                    heard = 0
+                    turn += 1
+                    waiting = await play_turn(ws, turn, args.items)
+                    asked = time.perf_counter()
+            elif "tool_response" in message or "toolResponse" in message:
+                response = message.get("tool_response") or message.get("toolResponse")
+                for function_response in response.get("function_responses") or response.get("functionResponses") or []:
+                    waiting.discard(function_response.get("id"))
+                if waiting:
+                    continue
+                tool_seconds.append(time.perf_counter() - asked)
+                # reply in the background, keep reading audio meanwhile
+                reply = asyncio.create_task(finish_turn(ws, args, turn))
+                replies.add(reply)
+                reply.add_done_callback(replies.discard)
+    except Exception:
+        pass
+    finally:
+        stats["open"] -= 1
+
+
+async def report():
+    while True:
+        await asyncio.sleep(5)
+        line = f"fake_live: {stats}"
+        if tool_seconds:
+            ordered = sorted(tool_seconds)
+            p50, p95 = ordered[len(ordered) // 2], ordered[int(len(ordered) * 0.95)]
+            line += f" tool_ms p50 {p50 * 1000:.1f} p95 {p95 * 1000:.1f} ({len(ordered)} turns)"
+        print(line, flush=True)
+
+
+async def main(args):
+    cert, key = self_signed_cert(args.cert_dir)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    print(f"fake_live on wss://127.0.0.1:{args.port}, trust it with SSL_CERT_FILE={cert}", flush=True)
+    async with serve(lambda ws: session(ws, args), "127.0.0.1", args.port, ssl=context, max_size=None):
+        await report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gemini Live API")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--cert-dir", default="/tmp/fake_live")
+    parser.add_argument("--setup-latency", type=float, default=0.0, help="seconds before setupComplete")
+    parser.add_argument("--turn-seconds", type=float, default=2.0, help="audio heard per spoken expense")
+    parser.add_argument("--items", type=int, default=1, help="expenses (function calls) per utterance")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds from tool response to the reply")
+    parser.add_argument("--reply-ms", type=int, default=500, help="length of the spoken reply")
+    args = parser.parse_args()
+    asyncio.run(main(args))
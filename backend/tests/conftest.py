@@ -0,0 +1,139 @@
+"""
+Shared test setup: run from backend/ with `python -m pytest`.
+
+Settings are read once, at import, so the environment is set here before
+anything from app is imported: throwaway databases and spool directory,
+dummy API keys, no background peer stats refresh and no live pool.
+"""
+import io
+import os
+import tempfile
+import uuid
+import wave
+
+import numpy as np
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="budget-tracker-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_tmp}/budget_tracker.db",
+    "JOB_DATABASE_URL": f"sqlite:///{_tmp}/jobs.db",
+    "JOB_SPOOL_DIR": f"{_tmp}/job_spool",
+    "PEER_STATS_REFRESH_SECONDS": "0",
+    "LIVE_POOL_SIZE": "0",
+})
+for name in ("SECRET_KEY", "ANTHROPIC_API_KEY", "OPENAI_API_KEY", "OPIK_API_KEY", "OPIK_WORKSPACE"):
+    os.environ.setdefault(name, "test")
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    The app with its lifespan running, shared by the whole session: the
+    lifespan shuts the password hasher down, so it can only run once per
+    process.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Returns headers(email=None) -> Authorization headers of a newly registered user."""
+
+    def headers(email: str | None = None) -> dict:
+        email = email or f"{uuid.uuid4().hex[:12]}@example.com"
+        client.post("/auth/register", json={
+            "firstname": "Test", "lastname": "User", "email": email, "password": "test-password",
+        })
+        response = client.post("/auth/login", data={"username": email, "password": "test-password"})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return headers
+
+
+@pytest.fixture
+def registered_user(client, auth_headers):
+    """Returns registered_user() -> (user id, Authorization headers) of a newly registered user."""
+
+    def make() -> tuple[int, dict]:
+        headers = auth_headers()
+        return client.get("/auth/me", headers=headers).json()["id"], headers
+
+    return make
+
+
+@pytest.fixture
+def add_transactions():
+    """
+    Returns add(user_id, rows) -> the Transactions written, rows being dicts
+    of Transaction fields (category Other and date now unless given). Goes
+    through an ORM session, so the flush hooks run as they do for the API.
+    """
+    from datetime import datetime
+    from app.database import SessionLocal
+    from app.models.transactions import Transaction
+
+    def add(user_id: int, rows: list[dict]) -> list:
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            transactions = [
+                Transaction(**{"category": "Other", "date": datetime.utcnow(), **row}, user_id=user_id)
+                for row in rows
+            ]
+            db.add_all(transactions)
+            db.commit()
+            return transactions
+        finally:
+            db.close()
+
+    return add
+
+
+@pytest.fixture
+def speech_wav():
+    """Returns speech_wav(seed=0) -> a 4 s 16 kHz WAV: speech-level noise between two silences."""
+
+    def make(seed: int = 0) -> bytes:
+        pcm = np.zeros(64000, dtype=np.int16)
+        pcm[16000:40000] = (np.random.default_rng(seed).standard_normal(24000) * 6000).clip(-32768, 32767)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(16000)
+            out.writeframes(pcm.tobytes())
+        return buffer.getvalue()
+
+    return make
+
+
+@pytest.fixture(autouse=True)
+def fake_extraction(monkeypatch):
+    """
+    No test reaches Gemini: voice uploads are extracted by this stand-in.
+    Returns its state, calls (the PCM of each call) and reply (a
+    VoiceExtraction, or an exception to raise), for tests to check or change.
+    """
+    from types import SimpleNamespace
+    from app.ai_services import voice
+    from app.schemas.voice import VoiceExtraction
+
+    model = SimpleNamespace(calls=[], reply=VoiceExtraction(
+        transcription="Spent 25.50 on coffee at the corner cafe",
+        expenses=[{"amount": 25.5, "category": "Food & Dining", "description": "Corner Cafe"}],
+        confidence=0.9,
+    ))
+
+    async def extract_expenses(pcm: bytes):
+        model.calls.append(bytes(pcm))
+        if isinstance(model.reply, Exception):
+            raise model.reply
+        return model.reply
+
+    monkeypatch.setattr(voice, "extract_expenses", extract_expenses)
+    return model
@@ -0,0 +1,128 @@
+"""AdmissionController and CircuitBreaker (app/src/admission.py)."""
+import asyncio
+
+import pytest
+
+from app.src.admission import CLOSED, HALF_OPEN, OPEN, AdmissionController, CircuitBreaker, ClientGone, Rejected
+
+
+def make(max_in_flight: int = 1, max_queued: int = 4, queue_timeout: float = 5.0) -> AdmissionController:
+    breaker = CircuitBreaker(window=4, min_calls=2, failure_rate=0.5, slow_seconds=10, cooldown_seconds=0.05)
+    return AdmissionController(max_in_flight, max_queued, queue_timeout, breaker)
+
+
+async def call(admission: AdmissionController, fail: bool = False):
+    async with admission.admit():
+        if fail:
+            raise RuntimeError("model error")
+
+
+async def open_breaker(admission: AdmissionController):
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await call(admission, fail=True)
+    assert admission.breaker.state == OPEN
+
+
+def test_failures_open_the_breaker_and_a_probe_closes_it():
+    async def scenario():
+        admission = make()
+        await open_breaker(admission)
+        with pytest.raises(Rejected) as shed:
+            await call(admission)
+        assert shed.value.reason == "circuit_open"
+        await asyncio.sleep(0.06)
+        await call(admission)  # the probe
+        assert admission.breaker.state == CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_a_failed_probe_opens_it_again():
+    async def scenario():
+        admission = make()
+        await open_breaker(admission)
+        await asyncio.sleep(0.06)
+        with pytest.raises(RuntimeError):
+            await call(admission, fail=True)
+        assert admission.breaker.state == OPEN
+
+    asyncio.run(scenario())
+
+
+def test_a_probe_cancelled_while_queued_lets_the_next_request_probe():
+    async def scenario():
+        admission = make(max_in_flight=1)
+        release = asyncio.Event()
+
+        async def holder():
+            async with admission.admit():
+                await release.wait()
+
+        holding = asyncio.create_task(holder())
+        await asyncio.sleep(0.01)
+        admission.breaker._open()
+        await asyncio.sleep(0.06)
+
+        probe = asyncio.create_task(call(admission))
+        await asyncio.sleep(0.01)  # queued behind the holder
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert admission.breaker.state == HALF_OPEN and not admission.breaker._probing
+
+        release.set()
+        await holding  # admitted before it opened: doesn't decide the half open state
+        assert admission.breaker.state == HALF_OPEN
+        await call(admission)
+        assert admission.breaker.state == CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_a_probe_whose_client_left_neither_closes_nor_opens_the_breaker():
+    async def scenario():
+        admission = make()
+        await open_breaker(admission)
+        await asyncio.sleep(0.06)
+        with pytest.raises(ClientGone):
+            async with admission.admit():
+                raise ClientGone
+        assert admission.breaker.state == HALF_OPEN and not admission.breaker._probing
+        with pytest.raises(RuntimeError):
+            await call(admission, fail=True)  # the next request probes
+        assert admission.breaker.state == OPEN
+
+        closed = make()
+        with pytest.raises(ClientGone):
+            async with closed.admit():
+                raise ClientGone
+        assert closed.breaker.stats()["recent_calls"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_overload_and_queue_timeout_are_shed():
+    async def scenario():
+        admission = make(max_in_flight=1, max_queued=1, queue_timeout=0.05)
+        release = asyncio.Event()
+
+        async def holder():
+            async with admission.admit():
+                await release.wait()
+
+        holding = asyncio.create_task(holder())
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(call(admission))
+        await asyncio.sleep(0.01)  # waiting for the slot
+        with pytest.raises(Rejected) as overloaded:
+            await call(admission)
+        with pytest.raises(Rejected) as timed_out:
+            await queued
+        release.set()
+        await holding
+        assert (overloaded.value.reason, timed_out.value.reason) == ("overloaded", "queue_timeout")
+        assert admission.stats()["shed"] == {"overloaded": 1, "queue_timeout": 1, "circuit_open": 0}
+        assert admission.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
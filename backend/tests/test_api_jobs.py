@@ -0,0 +1,40 @@
+"""The 202 + long-poll flow of /voice/upload and /jobs (app/api/jobs.py)."""
+import numpy as np
+
+
+def upload(client, headers, data: bytes, content_type: str = "audio/wav"):
+    return client.post("/voice/upload", files={"file": ("note.wav", data, content_type)}, headers=headers)
+
+
+def test_upload_answers_202_and_the_result_is_long_polled(client, auth_headers, speech_wav):
+    headers = auth_headers()
+    response = upload(client, headers, speech_wav())
+    assert response.status_code == 202
+    job = response.json()
+    assert response.headers["Location"] == f"/jobs/{job['id']}"
+    assert job["kind"] == "voice_upload"
+
+    result = client.get(f"/jobs/{job['id']}/result", params={"wait": 10}, headers=headers)
+    assert result.status_code == 200
+    assert result.json()["transactions"][0]["input_method"] == "voice"
+
+    status = client.get(f"/jobs/{job['id']}", headers=headers).json()
+    assert status["status"] == "succeeded"
+    assert [listed["id"] for listed in client.get("/jobs", headers=headers).json()] == [job["id"]]
+
+
+def test_a_failed_job_answers_with_the_routes_error(client, auth_headers, speech_wav):
+    headers = auth_headers()
+    silence = speech_wav()[:44] + np.zeros(32000, dtype=np.int16).tobytes()
+    job = upload(client, headers, silence).json()
+    result = client.get(f"/jobs/{job['id']}/result", params={"wait": 10}, headers=headers)
+    assert result.status_code == 400
+    assert result.json()["detail"] == "No speech found in the audio"
+
+
+def test_jobs_are_private_and_non_audio_is_refused_up_front(client, auth_headers, speech_wav):
+    owner, other = auth_headers(), auth_headers()
+    job = upload(client, owner, speech_wav(1)).json()
+    assert client.get(f"/jobs/{job['id']}", headers=other).status_code == 404
+    assert client.get(f"/jobs/{job['id']}/result", headers=other).status_code == 404
+    assert upload(client, owner, b"text", content_type="text/plain").status_code == 400
@@ -0,0 +1,125 @@
+"""Streaming audio preprocessing (app/src/audio_pipeline.py): WavDecoder, Resampler, SpeechGate."""
+import struct
+
+import numpy as np
+import pytest
+
+from app.src.audio_pipeline import (
+    SAMPLE_RATE, WAVE_FORMAT_FLOAT, WAVE_FORMAT_PCM, AudioLimitExceeded, Resampler, SpeechGate,
+    WavDecoder, WavSpeechStream,
+)
+
+
+def chunk(chunk_id: bytes, body: bytes, size: int | None = None) -> bytes:
+    size = len(body) if size is None else size
+    return chunk_id + struct.pack("<I", size) + body + b"\0" * (len(body) & 1)
+
+
+def wav(data: bytes, rate: int = SAMPLE_RATE, channels: int = 1, bits: int = 16, tag: int = WAVE_FORMAT_PCM,
+        before: bytes = b"", after: bytes = b"", data_size: int | None = None) -> bytes:
+    block = channels * -(-bits // 8)
+    fmt = struct.pack("<HHIIHH", tag, channels, rate, rate * block, block, bits)
+    body = b"WAVE" + chunk(b"fmt ", fmt) + before + chunk(b"data", data, data_size) + after
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def decode(data: bytes, step: int | None = None) -> np.ndarray:
+    decoder = WavDecoder()
+    step = step or len(data)
+    pieces = [decoder.feed(data[start:start + step]) for start in range(0, len(data), step)]
+    return np.concatenate([piece for piece in pieces if piece is not None])
+
+
+def tone(seconds: float, rate: int = SAMPLE_RATE, hz: float = 220.0, amplitude: float = 0.25) -> np.ndarray:
+    return (np.sin(2 * np.pi * hz * np.arange(int(seconds * rate)) / rate) * amplitude).astype(np.float32)
+
+
+def to_pcm(samples: np.ndarray) -> np.ndarray:
+    return (samples * 32767).astype(np.int16)
+
+
+def test_wav_decodes_the_same_fed_whole_or_byte_by_byte():
+    pcm = np.arange(-500, 500, dtype=np.int16)
+    data = wav(pcm.tobytes(), before=chunk(b"LIST", b"INFOodd"), after=chunk(b"id3 ", b"tag"))
+    assert decode(data).tolist() == pcm.tolist()
+    assert decode(data, step=1).tolist() == pcm.tolist()  # word aligned odd LIST chunk, trailing chunk dropped
+
+
+def test_wav_data_of_unknown_length_runs_to_the_end_of_the_file():
+    pcm = np.arange(100, dtype=np.int16)
+    assert decode(wav(pcm.tobytes(), data_size=0), step=7).tolist() == pcm.tolist()
+
+
+def test_24_bit_and_float_wavs_decode():
+    values = np.array([0, 1, -1, 2 ** 23 - 1, -(2 ** 23)], dtype=np.int32)
+    packed = b"".join(int(v).to_bytes(4, "little", signed=True)[:3] for v in values)
+    decoder = WavDecoder()
+    samples = decoder.feed(wav(packed, bits=24))
+    assert (samples >> 8).tolist() == values.tolist()
+    assert decoder.to_mono(samples).max() == pytest.approx(1.0, abs=1e-6)
+
+    floats = np.array([0.5, -0.25], dtype="<f4")
+    decoder = WavDecoder()
+    assert decoder.feed(wav(floats.tobytes(), bits=32, tag=WAVE_FORMAT_FLOAT)).tolist() == [0.5, -0.25]
+    assert not decoder.is_model_format
+
+    decoder = WavDecoder()
+    assert decoder.feed(wav(np.array([16, -16], dtype=np.int16).tobytes(), bits=12)).tolist() == [16, -16]
+    assert decoder.width == 2
+
+
+@pytest.mark.parametrize("data", [
+    b"OggS" + b"\0" * 40,
+    b"RIFF\0\0\0\0WAVE" + chunk(b"data", b"\0\0"),  # data before fmt
+    wav(b"\0\0", tag=2),  # ADPCM
+])
+def test_broken_or_unsupported_wavs_are_refused(data):
+    with pytest.raises(ValueError):
+        WavDecoder().feed(data)
+
+
+def test_resampler_joins_blocks_up_exactly():
+    samples = tone(1.0, rate=48000)
+    whole = Resampler(48000).feed(samples)
+    resampler = Resampler(48000)
+    blocks = np.concatenate([resampler.feed(samples[start:start + 4321]) for start in range(0, len(samples), 4321)])
+    assert abs(len(whole) - SAMPLE_RATE) <= 1
+    np.testing.assert_allclose(blocks, whole, atol=1e-5)
+
+
+def test_resampler_filters_what_would_alias():
+    speech_band = Resampler(48000).feed(tone(0.5, rate=48000, hz=1000))
+    too_high = Resampler(48000).feed(tone(0.5, rate=48000, hz=15000))
+    assert np.abs(speech_band[100:-100]).max() == pytest.approx(0.25, rel=0.05)
+    assert np.abs(too_high[100:-100]).max() < 0.025
+
+
+def test_speech_gate_cuts_the_silence_around_speech():
+    pcm = np.zeros(4 * SAMPLE_RATE, dtype=np.int16)
+    pcm[SAMPLE_RATE:2 * SAMPLE_RATE] = to_pcm(tone(1.0))
+    kept = SpeechGate().feed(pcm, final=True)
+    # the speech plus AUDIO_VAD_PADDING_MS (200 ms) on each side, in whole frames
+    assert SAMPLE_RATE <= len(kept) <= 1.5 * SAMPLE_RATE
+
+
+def test_speech_gate_keeps_audio_without_any_silence():
+    assert len(SpeechGate().feed(to_pcm(tone(2.0)), final=True)) >= 1.9 * SAMPLE_RATE
+    envelope = 10 ** (12 / 20 * (0.5 + 0.5 * np.sin(2 * np.pi * 2 * np.arange(2 * SAMPLE_RATE) / SAMPLE_RATE))) / 4
+    noise = np.random.default_rng(0).standard_normal(2 * SAMPLE_RATE) * 0.2 * envelope
+    assert len(SpeechGate().feed(to_pcm(noise.clip(-1, 1)), final=True)) >= 1.9 * SAMPLE_RATE
+
+
+def test_speech_gate_drops_silence_and_room_hiss():
+    hiss = (np.random.default_rng(0).standard_normal(2 * SAMPLE_RATE) * 3).astype(np.int16)
+    assert len(SpeechGate().feed(np.zeros(SAMPLE_RATE, dtype=np.int16), final=True)) == 0
+    assert len(SpeechGate().feed(hiss, final=True)) == 0
+
+
+def test_speech_stream_resamples_and_stops_past_max_seconds():
+    stereo = np.repeat(to_pcm(tone(1.0, rate=44100)), 2)
+    stream = WavSpeechStream()
+    speech = np.concatenate((stream.feed(wav(stereo.tobytes(), rate=44100, channels=2)), stream.flush()))
+    assert speech.dtype == np.int16 and abs(len(speech) - SAMPLE_RATE) < 0.05 * SAMPLE_RATE
+
+    with pytest.raises(AudioLimitExceeded):
+        WavSpeechStream(max_seconds=0.5).feed(wav(to_pcm(tone(1.0)).tobytes()))
@@ -0,0 +1,85 @@
+"""
+The /auth routes, the principal cache behind get_current_user
+(app/src/principal_cache.py) and the password hashing pool (app/src/security.py).
+"""
+import asyncio
+import threading
+import uuid
+
+import pytest
+
+from app.src.principal_cache import principal_cache
+from app.src.security import PasswordHasher, PasswordHasherBusy, password_hasher
+
+
+def new_user(client, auth_headers) -> tuple[str, dict]:
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    return email, auth_headers(email)
+
+
+def misses_after(client, headers) -> int:
+    before = principal_cache.misses
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    return principal_cache.misses - before
+
+
+def test_a_token_is_verified_once_then_served_from_the_cache(client, auth_headers):
+    _, headers = new_user(client, auth_headers)
+    misses_after(client, headers)
+    assert misses_after(client, headers) == 0
+
+
+def test_a_profile_change_is_seen_by_the_next_request(client, auth_headers):
+    _, headers = new_user(client, auth_headers)
+    misses_after(client, headers)
+    response = client.put("/auth/me", json={"goals": {"save_for": "bike", "target": 800}}, headers=headers)
+    assert response.status_code == 200
+    assert client.get("/auth/me", headers=headers).json()["goals"] == {"save_for": "bike", "target": 800}
+
+
+def test_a_password_change_drops_the_users_cached_tokens(client, auth_headers):
+    email, headers = new_user(client, auth_headers)
+    misses_after(client, headers)
+    response = client.put(
+        "/auth/password", json={"email": email, "oldPass": "test-password", "newPass": "new-password"}, headers=headers,
+    )
+    assert response.status_code == 200
+    assert misses_after(client, headers) == 1
+    assert client.post("/auth/login", data={"username": email, "password": "new-password"}).status_code == 200
+
+
+def test_a_deleted_users_token_stops_working_at_once(client, auth_headers):
+    _, headers = new_user(client, auth_headers)
+    misses_after(client, headers)
+    response = client.delete("/auth/me", headers=headers)
+    assert (response.status_code, response.content) == (204, b"")
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_hash_calls_past_max_pending_fail_fast_instead_of_queueing():
+    hasher = PasswordHasher(workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def main():
+        waiting = [asyncio.create_task(hasher._run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(PasswordHasherBusy):
+            await hasher._run(release.wait)
+        release.set()
+        assert await asyncio.gather(*waiting) == [True, True]
+
+    asyncio.run(main())
+    hasher.shutdown()
+    assert (hasher.pending, hasher.rejected) == (0, 1)
+
+
+def test_a_busy_hasher_answers_503_with_retry_after(client, auth_headers, monkeypatch):
+    email, _ = new_user(client, auth_headers)
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+    responses = [
+        client.post("/auth/login", data={"username": email, "password": "test-password"}),
+        client.post("/auth/register", json={
+            "firstname": "Busy", "lastname": "User", "email": f"busy-{email}", "password": "test-password",
+        }),
+    ]
+    assert [(r.status_code, r.headers.get("Retry-After")) for r in responses] == [(503, "1"), (503, "1")]
@@ -0,0 +1,83 @@
+"""Anomaly scoring (app/src/category_stats.py) and the category_stats rows behind it."""
+import numpy as np
+from sqlalchemy import create_engine, select
+
+from app.database import Base, SessionLocal, engine
+from app.models.rollup import CategoryStats, SpendingRollup
+from app.models.transactions import Transaction
+from app.models.user import User
+from app.src.category_stats import RunningStats, rebuild_category_stats, track_amounts
+
+
+def stats_rows(user_id: int) -> dict:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(CategoryStats.category, CategoryStats.count, CategoryStats.mean, CategoryStats.m2)
+            .where(CategoryStats.user_id == user_id)
+        )
+        return {category: (count, round(mean, 6), round(m2, 6)) for category, count, mean, m2 in rows}
+
+
+def test_running_stats_add_and_remove_match_numpy():
+    amounts = [12.5, 3.0, 48.2, 7.7, 7.7, 101.0, 0.4]
+    running = RunningStats()
+    for amount in amounts:
+        running.add(amount)
+    running.remove(48.2)
+    running.remove(12.5)
+    rest = [3.0, 7.7, 7.7, 101.0, 0.4]
+    assert running.count == len(rest)
+    assert np.isclose(running.mean, np.mean(rest)) and np.isclose(running.std, np.std(rest, ddof=1))
+
+    running.remove(3.0)
+    for amount in [7.7, 7.7, 101.0, 0.4]:
+        running.remove(amount)
+    assert (running.count, running.mean, running.m2) == (0, 0.0, 0.0)
+
+
+def test_an_amount_is_scored_against_the_history_before_it(tmp_path):
+    scratch = create_engine(f"sqlite:///{tmp_path}/stats.db")
+    Base.metadata.create_all(scratch, tables=[User.__table__, CategoryStats.__table__])
+    with scratch.begin() as conn:
+        history = [10.0, 11.0, 9.0, 10.5, 9.5]
+        scores = track_amounts(conn, [(1, "Other", amount, 1) for amount in history + [30.0, 10.0]])
+        assert scores[:5] == [None] * 5  # under ANOMALY_MIN_HISTORY
+        expected = (30.0 - np.mean(history)) / np.std(history, ddof=1)
+        assert np.isclose(scores[5], expected, atol=1e-3) and scores[5] > 3
+        assert track_amounts(conn, [(1, "Other", 30.0, -1)]) == [None]
+    scratch.dispose()
+
+
+def test_orm_writes_keep_the_stats_equal_to_a_rebuild(registered_user, add_transactions):
+    user_id, _ = registered_user()
+    rows = add_transactions(user_id, [
+        {"amount": amount, "category": category}
+        for amount, category in [(4, "Food & Dining"), (6, "Food & Dining"), (9, "Food & Dining"), (30, "Shopping")]
+    ])
+    db = SessionLocal()
+    try:
+        db.get(Transaction, rows[0].id).amount = 40
+        db.get(Transaction, rows[1].id).category = "Shopping"
+        db.delete(db.get(Transaction, rows[2].id))
+        db.commit()
+    finally:
+        db.close()
+    incremental = stats_rows(user_id)
+
+    with engine.begin() as conn:
+        rebuild_category_stats(conn, user_id)
+    assert incremental == stats_rows(user_id) and sum(count for count, _, _ in incremental.values()) == 3
+
+
+def test_outliers_are_listed_and_a_deleted_user_takes_their_stats_with_them(
+    client, registered_user, add_transactions,
+):
+    user_id, headers = registered_user()
+    add_transactions(user_id, [{"amount": amount} for amount in [20, 22, 19, 21, 20, 18, 200]])
+    anomalies = client.get("/insights/anomalies", headers=headers).json()
+    assert [t["amount"] for t in anomalies] == [200]
+
+    assert client.delete("/auth/me", headers=headers).status_code == 204
+    assert stats_rows(user_id) == {}
+    with engine.connect() as conn:
+        assert conn.execute(select(SpendingRollup).where(SpendingRollup.user_id == user_id)).all() == []
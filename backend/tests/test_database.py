@@ -0,0 +1,39 @@
+"""upgrade_schema (app/database.py) on a database created before anomaly_score and the indexes."""
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import upgrade_schema
+from app.models.transactions import Transaction
+
+OLD_TRANSACTIONS = """
+CREATE TABLE transactions (
+    id INTEGER NOT NULL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    amount FLOAT NOT NULL,
+    category VARCHAR(17) NOT NULL,
+    merchant VARCHAR,
+    date DATETIME,
+    notes VARCHAR,
+    input_method VARCHAR,
+    created_at DATETIME
+)
+"""
+
+
+def test_old_databases_get_the_new_column_and_indexes_and_keep_their_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    with engine.begin() as conn:
+        conn.execute(text(OLD_TRANSACTIONS))
+        conn.execute(text("INSERT INTO transactions (user_id, amount, category) VALUES (1, 9.5, 'OTHER')"))
+
+    for _ in range(2):  # runs on every startup
+        with engine.begin() as conn:
+            upgrade_schema(conn)
+
+    inspector = inspect(engine)
+    assert "anomaly_score" in {column["name"] for column in inspector.get_columns("transactions")}
+    assert {index.name for index in Transaction.__table__.indexes} <= {
+        index["name"] for index in inspector.get_indexes("transactions")
+    }
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT amount, anomaly_score FROM transactions")).all() == [(9.5, None)]
+    engine.dispose()
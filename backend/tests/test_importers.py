@@ -0,0 +1,47 @@
+"""Bank export parsing (app/src/importers.py) and the /transactions/import job."""
+import io
+
+from app.src import importers
+from app.src.importers import parse_csv, parse_ofx
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240131120000.000[-5:EST]<TRNAMT>-12.50<NAME>Corner Cafe<MEMO>lunch</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240201<TRNAMT>2500.00<NAME>Payroll</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240202<TRNAMT>abc<NAME>Garbled</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def test_csv_rows_keep_known_columns_in_any_order():
+    rows = list(parse_csv(io.StringIO("Merchant,extra,AMOUNT\nCafe,x,4.50\n\n,y,\n")))
+    assert rows == [(1, {"merchant": "Cafe", "amount": "4.50"}), (3, {"merchant": None, "amount": None})]
+    assert list(parse_csv(io.StringIO(""))) == []
+
+
+def test_ofx_debits_become_spending_and_credits_are_skipped(monkeypatch):
+    monkeypatch.setattr(importers, "OFX_READ_SIZE", 16)  # transactions split across reads
+    rows = list(parse_ofx(io.StringIO(OFX)))
+    assert [number for number, _ in rows] == [1, 2, 3]
+    assert rows[0][1] == {
+        "amount": 12.5, "category": "Other", "merchant": "Corner Cafe",
+        "date": "2024-01-31T12:00:00", "notes": "lunch",
+    }
+    assert rows[1][1] is None
+    assert rows[2][1]["amount"] == "abc"  # left for TransactionCreate to reject
+
+
+def test_import_job_reports_imported_skipped_and_failed_rows(client, auth_headers):
+    headers = auth_headers()
+    response = client.post(
+        "/transactions/import", files={"file": ("statement.ofx", OFX.encode(), "application/x-ofx")}, headers=headers,
+    )
+    assert response.status_code == 202
+    result = client.get(f"/jobs/{response.json()['id']}/result", params={"wait": 10}, headers=headers).json()
+    assert (result["imported"], result["skipped"], result["failed"]) == (1, 1, 1)
+    assert result["errors"][0]["row"] == 3
+
+    listed = client.get("/transactions", headers=headers).json()["items"]
+    assert [(item["merchant"], item["amount"], item["input_method"]) for item in listed] == [
+        ("Corner Cafe", 12.5, "import"),
+    ]
@@ -0,0 +1,188 @@
+"""JobQueue (app/src/jobs.py): scheduling caps, outcomes, resume after a restart, spool cleanup."""
+import asyncio
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete
+
+from app.config import get_settings
+from app.database import JobBase, JobSessionLocal, job_engine
+from app.models.job import Job
+from app.src.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobFailed, JobLimitExceeded, JobQueue
+
+settings = get_settings()
+
+
+def make_queue(**overrides) -> JobQueue:
+    return JobQueue(**{"workers": 4, "max_running_per_user": 2, "max_pending_per_user": 20, "max_attempts": 3,
+                       **overrides})
+
+
+def run(scenario):
+    """Run scenario() on its own event loop, against an empty jobs table."""
+    async def wrapped():
+        os.makedirs(settings.JOB_SPOOL_DIR, exist_ok=True)
+        async with job_engine.begin() as conn:
+            await conn.run_sync(JobBase.metadata.create_all)
+            await conn.execute(delete(Job))
+        try:
+            return await scenario()
+        finally:
+            await job_engine.dispose()  # its connections belong to this loop
+    return asyncio.run(wrapped())
+
+
+async def submit(queue: JobQueue, user_id: int, kind: str, data: bytes = b"upload") -> Job:
+    async with queue.spooled(user_id, io.BytesIO(data)) as upload:
+        return await queue.submit(user_id, kind, upload)
+
+
+def test_next_keeps_each_user_under_the_running_cap():
+    queue = make_queue(max_running_per_user=2)
+    for n in range(4):
+        queue._enqueue(f"a{n}", 1, "voice_upload")
+    queue._enqueue("b0", 2, "voice_upload")
+
+    assert [queue._next()[0] for _ in range(3)] == ["a0", "a1", "b0"]
+    assert queue._next() is None  # a2 and a3 wait for one of user 1's jobs
+
+
+def test_next_keeps_each_kind_under_its_cap():
+    queue = make_queue()
+    queue.register("import", None, max_running=1)
+    queue._enqueue("i0", 1, "import")
+    queue._enqueue("i1", 2, "import")
+    queue._enqueue("v0", 3, "voice_upload")
+
+    assert [queue._next()[0] for _ in range(2)] == ["i0", "v0"]
+    assert queue._next() is None
+
+
+def test_spooled_enforces_the_pending_cap_and_removes_unsubmitted_uploads():
+    async def scenario():
+        queue = make_queue(max_pending_per_user=1)
+        async with queue.spooled(1, io.BytesIO(b"first")) as upload:
+            with open(upload.path, "rb") as spooled:
+                assert spooled.read() == b"first"
+            assert upload.sha256 == hashlib.sha256(b"first").hexdigest()
+            with pytest.raises(JobLimitExceeded):
+                async with queue.spooled(1, io.BytesIO(b"second")):
+                    pass
+            async with queue.spooled(2, io.BytesIO(b"another user")):
+                pass
+        assert not os.path.exists(upload.path)
+
+        job = await submit(queue, 1, "voice_upload", b"kept")
+        assert os.path.exists(job.spool_path)
+        assert job.params["sha256"] == hashlib.sha256(b"kept").hexdigest()
+        with pytest.raises(JobLimitExceeded):  # the submitted job is still pending
+            async with queue.spooled(1, io.BytesIO(b"more")):
+                pass
+        assert queue.counts["rejected"] == 2
+
+    run(scenario)
+
+
+def test_jobs_end_with_their_outcome_stored_and_their_upload_removed():
+    async def scenario():
+        queue = make_queue()
+
+        async def echo(job):
+            with open(job.spool_path, "rb") as upload:
+                return {"echo": upload.read().decode()}
+
+        async def refuse(job):
+            raise JobFailed(413, "Audio is too long")
+
+        async def crash(job):
+            raise RuntimeError("a bug")
+
+        for kind, handler in (("echo", echo), ("refuse", refuse), ("crash", crash)):
+            queue.register(kind, handler)
+        await queue.start()
+        try:
+            jobs = {kind: await submit(queue, 1, kind, kind.encode()) for kind in ("echo", "refuse", "crash")}
+            for job in jobs.values():
+                await queue.wait(job.id, 5)
+        finally:
+            await queue.close()
+
+        async with JobSessionLocal() as db:
+            rows = {kind: await db.get(Job, job.id) for kind, job in jobs.items()}
+        assert (rows["echo"].status, rows["echo"].result, rows["echo"].attempts) == (SUCCEEDED, {"echo": "echo"}, 1)
+        assert (rows["refuse"].status, rows["refuse"].error_status, rows["refuse"].error) == (FAILED, 413, "Audio is too long")
+        assert (rows["crash"].status, rows["crash"].error_status) == (FAILED, 500)
+        assert not any(os.path.exists(job.spool_path) for job in jobs.values())
+        assert queue.stats()["running"] == 0 and queue._pending[1] == 0
+
+    run(scenario)
+
+
+def test_running_jobs_stay_under_the_caps():
+    async def scenario():
+        queue = make_queue(workers=4, max_running_per_user=2)
+        running: dict[int, int] = {}
+        peak: dict[int, int] = {}
+        started: list[int] = []
+        submitted = asyncio.Event()
+
+        async def slow(job):
+            started.append(job.user_id)
+            running[job.user_id] = running.get(job.user_id, 0) + 1
+            peak[job.user_id] = max(peak.get(job.user_id, 0), running[job.user_id])
+            # held until everything is queued, however slow the submits are
+            await submitted.wait()
+            await asyncio.sleep(0.01)
+            running[job.user_id] -= 1
+            return {}
+
+        queue.register("voice_upload", slow)
+        await queue.start()
+        try:
+            jobs = [await submit(queue, 1, "voice_upload") for _ in range(4)]
+            jobs.append(await submit(queue, 2, "voice_upload"))
+            submitted.set()
+            for job in jobs:
+                await queue.wait(job.id, 5)
+        finally:
+            await queue.close()
+
+        assert peak == {1: 2, 2: 1}
+        assert started.index(2) < 3  # user 2 didn't wait behind all of user 1's jobs
+
+    run(scenario)
+
+
+def test_resume_queues_unfinished_jobs_again_and_fails_the_ones_out_of_attempts():
+    async def scenario():
+        spool = os.path.join(settings.JOB_SPOOL_DIR, "exhausted")
+        open(spool, "wb").close()
+        now = datetime.utcnow()
+        async with JobSessionLocal() as db:
+            db.add_all([
+                Job(id="queued", user_id=1, kind="voice_upload", status=QUEUED, attempts=0, created_at=now),
+                Job(id="cut-off", user_id=1, kind="voice_upload", status=RUNNING, attempts=1,
+                    created_at=now - timedelta(seconds=1)),
+                Job(id="exhausted", user_id=1, kind="voice_upload", status=RUNNING, attempts=3, spool_path=spool,
+                    created_at=now - timedelta(seconds=2)),
+                Job(id="done", user_id=1, kind="voice_upload", status=SUCCEEDED, attempts=1, created_at=now),
+            ])
+            await db.commit()
+
+        queue = make_queue(max_attempts=3)
+        await queue.resume()
+        assert [job_id for job_id, _, _ in queue._queue] == ["cut-off", "queued"]  # oldest first
+        assert queue._pending[1] == 2 and queue.counts["resumed"] == 2
+
+        async with JobSessionLocal() as db:
+            exhausted = await db.get(Job, "exhausted")
+        assert (exhausted.status, exhausted.error_status) == (FAILED, 500)
+        assert not os.path.exists(spool)
+
+        await queue.resume()  # jobs it already holds aren't queued twice
+        assert len(queue._queue) == 2
+
+    run(scenario)
@@ -0,0 +1,122 @@
+"""LiveSessionPool (app/src/live_pool.py) against a fake live.connect()."""
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from app.src.live_pool import LiveSessionPool
+
+
+class FakeSession:
+    def __init__(self):
+        self.pong = True
+        self.closed = False
+        self._ws = SimpleNamespace(state=SimpleNamespace(name="OPEN"), ping=self.ping)
+
+    async def ping(self):
+        pong = asyncio.get_running_loop().create_future()
+        if self.pong:
+            pong.set_result(None)
+        else:
+            pong.set_exception(ConnectionError("no pong"))
+        return pong
+
+
+class FakeServer:
+    """live.connect() stand-in: records every session, refuses to connect while `down`."""
+
+    def __init__(self):
+        self.sessions: list[FakeSession] = []
+        self.attempts = 0
+        self.down = False
+
+    @asynccontextmanager
+    async def connect(self):
+        self.attempts += 1
+        if self.down:
+            raise ConnectionError("refused")
+        session = FakeSession()
+        self.sessions.append(session)
+        try:
+            yield session
+        finally:
+            session.closed = True
+            session._ws.state.name = "CLOSED"
+
+    def open_sessions(self) -> int:
+        return sum(not session.closed for session in self.sessions)
+
+
+async def settle(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "pool never settled"
+        await asyncio.sleep(0.01)
+
+
+def test_warm_sessions_are_handed_out_and_used_ones_never_come_back():
+    async def main():
+        server = FakeServer()
+        pool = LiveSessionPool(server.connect, size=2, max_idle_seconds=60, health_seconds=60)
+        pool.start()
+        await settle(lambda: len(pool._idle) == 2)
+
+        async with pool.session() as warm:
+            warm.used = True
+            used = warm.session
+        async with pool.session() as warm:
+            untouched = warm.session
+        await settle(lambda: len(pool._idle) == 2 and used.closed)
+
+        assert untouched in [warm.session for warm in pool._idle] and not untouched.closed
+        assert {key: pool.stats()[key] for key in ("hits", "misses", "recycled", "opened")} == {
+            "hits": 2, "misses": 0, "recycled": 1, "opened": 3,
+        }
+        await pool.close()
+        assert server.open_sessions() == 0
+
+    asyncio.run(main())
+
+
+def test_without_the_maintainer_every_session_is_connected_on_demand_and_closed():
+    async def main():
+        server = FakeServer()
+        pool = LiveSessionPool(server.connect, size=2, max_idle_seconds=60, health_seconds=60)
+        async with pool.session() as warm:
+            assert warm.session is server.sessions[0]
+        await settle(lambda: server.open_sessions() == 0)
+        assert (pool.stats()["misses"], pool.stats()["idle"]) == (1, 0)
+
+    asyncio.run(main())
+
+
+def test_idle_sessions_that_stop_answering_or_grow_old_are_replaced():
+    async def main():
+        server = FakeServer()
+        pool = LiveSessionPool(server.connect, size=2, max_idle_seconds=60, health_seconds=0.05)
+        pool.start()
+        await settle(lambda: len(pool._idle) == 2)
+        pool._idle[0].session.pong = False
+        pool._idle[1].opened_at -= 60
+        await settle(lambda: pool.counts["unhealthy"] == 1 and pool.counts["expired"] == 1 and len(pool._idle) == 2)
+        await settle(lambda: server.open_sessions() == 2)
+        assert len(server.sessions) == 4
+        await pool.close()
+
+    asyncio.run(main())
+
+
+def test_failed_connects_back_off_instead_of_retrying_in_a_loop():
+    async def main():
+        server = FakeServer()
+        server.down = True
+        pool = LiveSessionPool(server.connect, size=3, max_idle_seconds=60, health_seconds=60)
+        pool.start()
+        await asyncio.sleep(0.3)  # inside the first one second backoff
+        assert server.attempts == 3 and pool.counts["connect_errors"] == 3 and pool._backoff == 1.0
+
+        server.down = False
+        async with pool.session() as warm:  # a miss still connects on the spot
+            assert not warm.session.closed
+        await pool.close()
+
+    asyncio.run(main())
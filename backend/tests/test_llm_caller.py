@@ -0,0 +1,83 @@
+"""Coalescing of identical in-flight prompts in llm_caller.generate_text."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.src import llm_caller
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """A fake model: every call waits for `release`, then answers or raises `reply`."""
+    state = SimpleNamespace(calls=[], cancelled=0, release=None, reply=None)
+
+    async def generate_content(model, contents):
+        state.calls.append(contents)
+        try:
+            await state.release.wait()
+        except asyncio.CancelledError:
+            state.cancelled += 1
+            raise
+        if isinstance(state.reply, BaseException):
+            raise state.reply
+        return SimpleNamespace(text=f"answer to {contents}", usage_metadata=None)
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    monkeypatch.setattr(llm_caller, "get_client", lambda: client)
+    return state
+
+
+def test_identical_prompts_in_flight_share_one_upstream_call(upstream):
+    async def main():
+        upstream.release = asyncio.Event()
+        callers = [asyncio.create_task(llm_caller.generate_text(prompt)) for prompt in ["a", "a", "b", "a"]]
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        answers = [response.text for response in await asyncio.gather(*callers)]
+        assert answers == ["answer to a", "answer to a", "answer to b", "answer to a"]
+        assert sorted(upstream.calls) == ["a", "b"]
+
+        # finished calls are forgotten, the next one goes upstream again
+        await llm_caller.generate_text("a")
+        assert upstream.calls.count("a") == 2 and llm_caller._inflight == {}
+
+    asyncio.run(main())
+
+
+def test_the_upstream_call_is_cancelled_only_when_its_last_caller_goes(upstream):
+    async def main():
+        upstream.release = asyncio.Event()
+        first = asyncio.create_task(llm_caller.generate_text("a"))
+        second = asyncio.create_task(llm_caller.generate_text("a"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert upstream.cancelled == 0
+        upstream.release.set()
+        assert (await second).text == "answer to a"
+
+        upstream.release = asyncio.Event()
+        callers = [asyncio.create_task(llm_caller.generate_text("b")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert upstream.cancelled == 1 and llm_caller._inflight == {}
+
+    asyncio.run(main())
+
+
+def test_an_upstream_error_reaches_every_caller(upstream):
+    async def main():
+        upstream.release = asyncio.Event()
+        upstream.reply = TimeoutError()
+        callers = [asyncio.create_task(llm_caller.generate_text("a")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(result, TimeoutError) for result in results)
+        assert upstream.calls == ["a"] and llm_caller._inflight == {}
+
+    asyncio.run(main())
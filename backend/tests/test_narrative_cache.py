@@ -0,0 +1,78 @@
+"""The /insights/narrative cache (app/src/narrative_cache.py)."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.api import ai_insights
+from app.database import engine
+from app.models.narrative import NarrativeCacheEntry
+from app.models.transactions import Transaction
+from app.src.narrative_cache import narrative_cache
+
+
+@pytest.fixture
+def fake_narrative(monkeypatch):
+    """Stands in for the model; counts the narratives written per user."""
+    calls = []
+
+    async def narrative_for_user(db, user_id, goals, time_period, start_date):
+        calls.append(user_id)
+        return {
+            "narrative": f"story {len(calls)}", "key_insights": [], "spending_by_category": {},
+            "recommendations": [], "generated_at": datetime.utcnow().isoformat(),
+        }
+
+    monkeypatch.setattr(ai_insights, "narrative_for_user", narrative_for_user)
+    return calls
+
+
+def narrative(client, headers, time_period="month"):
+    response = client.post("/insights/narrative", json={"time_period": time_period}, headers=headers)
+    assert response.status_code == 200 and "X-Degraded" not in response.headers
+    return response.headers["X-Cache"], response.headers.get("X-Cache-Tier"), response.json()["narrative"]
+
+
+def persisted_rows(user_id: int) -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(NarrativeCacheEntry).where(NarrativeCacheEntry.user_id == user_id)
+        ).scalar()
+
+
+def test_the_same_inputs_hit_the_memory_then_the_db_tier(client, registered_user, add_transactions, fake_narrative):
+    user_id, headers = registered_user()
+    add_transactions(user_id, [{"amount": 12}])
+    assert narrative(client, headers) == ("MISS", None, "story 1")
+    assert narrative(client, headers) == ("HIT", "memory", "story 1")
+    narrative_cache.invalidate_user(user_id)  # as if served by another worker
+    assert narrative(client, headers) == ("HIT", "db", "story 1")
+    assert narrative(client, headers, "year") == ("MISS", None, "story 2")  # its own entry
+    assert fake_narrative == [user_id, user_id]
+
+
+def test_an_orm_write_drops_the_users_entries_from_both_tiers(
+    client, registered_user, add_transactions, fake_narrative,
+):
+    user_id, headers = registered_user()
+    other_id, other_headers = registered_user()
+    narrative(client, headers)
+    narrative(client, other_headers)
+    assert persisted_rows(user_id) == 1
+
+    add_transactions(user_id, [{"amount": 30}])
+    assert persisted_rows(user_id) == 0 and persisted_rows(other_id) == 1
+    assert not any(key[0] == user_id for key in narrative_cache._entries)
+    assert narrative(client, headers)[0] == "MISS"
+    assert narrative(client, other_headers)[0] == "HIT"
+
+
+def test_a_write_behind_the_orms_back_changes_the_fingerprint(client, registered_user, fake_narrative):
+    user_id, headers = registered_user()
+    assert narrative(client, headers)[0] == "MISS"
+    with engine.begin() as conn:  # no flush hook runs
+        conn.execute(insert(Transaction).values(
+            user_id=user_id, amount=8, category="OTHER", date=datetime.utcnow(),
+        ))
+    assert persisted_rows(user_id) == 1
+    assert narrative(client, headers) == ("MISS", None, "story 2")
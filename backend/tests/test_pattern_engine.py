@@ -0,0 +1,68 @@
+"""Spending pattern detection (app/ai_services/pattern_engine.py)."""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.ai_services.pattern_engine import _rows_to_arrays, detect_patterns, patterns_for_users, rolling_mean
+from app.database import engine
+
+END = datetime(2026, 6, 1, 12)
+WEEKS = 12
+
+
+def weekly(user_id: int, category: str, amounts: list[float], end: datetime = END) -> list[tuple]:
+    """One row per week, amounts oldest first; zero weeks are skipped."""
+    return [
+        (user_id, category, end - timedelta(weeks=len(amounts) - 1 - week), amount)
+        for week, amount in enumerate(amounts) if amount
+    ]
+
+
+def test_rolling_mean_trails_over_the_last_axis():
+    series = np.array([[1.0, 2.0, 3.0, 4.0, 5.0]])
+    assert rolling_mean(series, 2).tolist() == [[1.5, 2.5, 3.5, 4.5]]
+
+
+def test_each_category_gets_its_pattern_and_users_are_scored_independently():
+    rows = (
+        weekly(1, "Food & Dining", [10 + 5 * week for week in range(WEEKS)])
+        + weekly(1, "Shopping", [100 - 7 * week for week in range(WEEKS)])
+        + weekly(1, "Transportation", [19, 21] * (WEEKS // 2))
+        + weekly(1, "Entertainment", [0, 0, 200, 0, 0, 0, 0, 150, 0, 0, 0, 180])
+        + weekly(1, "Other", [0] * 10 + [40, 40])  # two active weeks, too few
+        + weekly(2, "Food & Dining", [30] * WEEKS)
+        + weekly(2, "Shopping", [500] + [0] * (WEEKS - 1), end=END - timedelta(weeks=WEEKS))  # before the window
+    )
+    patterns = detect_patterns(*_rows_to_arrays(rows), END, WEEKS)
+
+    assert {p.category: p.pattern_type for p in patterns[1]} == {
+        "Food & Dining": "increasing",
+        "Shopping": "decreasing",
+        "Transportation": "stable",
+        "Entertainment": "irregular",
+    }
+    food = next(p for p in patterns[1] if p.category == "Food & Dining")
+    # weeks 8-11 (50..65) average 57.50, weeks 4-7 (30..45) 37.50
+    assert food.description == "Food & Dining spending is rising: 57.50 a week lately, up from 37.50."
+    assert [(p.category, p.pattern_type) for p in patterns[2]] == [("Food & Dining", "stable")]
+    assert detect_patterns(*_rows_to_arrays(rows), END, WEEKS) == patterns  # deterministic
+
+
+def test_the_route_and_the_batch_job_agree(client, registered_user, add_transactions):
+    now = datetime.utcnow()
+    users = []
+    for slope in (3, -3):
+        user_id, headers = registered_user()
+        add_transactions(user_id, [
+            {"amount": 100 + slope * week, "category": "Food & Dining", "date": now - timedelta(weeks=25 - week)}
+            for week in range(26)
+        ])
+        users.append((user_id, headers))
+
+    with engine.connect() as conn:
+        batch = patterns_for_users(conn, [user_id for user_id, _ in users] + [-1], weeks=26, chunk_size=1)
+    assert batch[-1] == []
+    for (user_id, headers), expected in zip(users, ["increasing", "decreasing"]):
+        route = client.get("/insights/patterns", headers=headers).json()
+        assert [p["pattern_type"] for p in route] == [expected]
+        assert route == [p.model_dump() for p in batch[user_id]]
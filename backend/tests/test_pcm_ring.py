@@ -0,0 +1,109 @@
+"""PcmRing (app/src/pcm_ring.py): wrap-around, the three overflow policies, close."""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.src.pcm_ring import BLOCK, DROP_NEWEST, DROP_OLDEST, PcmRing
+
+
+def frame(value: int, frame_bytes: int = 4) -> bytes:
+    return bytes([value]) * frame_bytes
+
+
+def test_write_nowait_fills_the_ring_then_refuses():
+    ring = PcmRing(capacity_frames=2, frame_bytes=4)
+    assert ring.write_nowait(frame(1))
+    assert ring.write_nowait(frame(2))
+    assert not ring.write_nowait(frame(3))
+    assert ring.stats() == {"buffered": 8, "written": 8, "dropped": 0}
+
+
+def test_reads_join_up_across_the_end_of_the_buffer():
+    async def scenario():
+        ring = PcmRing(capacity_frames=3, frame_bytes=4)
+        await ring.write(frame(1) + frame(2))
+        assert await ring.read() == frame(1) + frame(2)
+        await ring.write(frame(3) + frame(4))  # wraps around
+        assert await ring.read() == frame(3) + frame(4)
+
+    asyncio.run(scenario())
+
+
+def test_peek_and_consume_hand_out_views_without_copying():
+    ring = PcmRing(capacity_frames=2, frame_bytes=4)
+    ring.write_nowait(np.array([1, -2, 3, -4], dtype=np.int16).tobytes())
+    samples = ring.peek_samples()
+    assert samples.tolist() == [1, -2, 3, -4]
+    assert np.shares_memory(samples, ring.samples)
+    ring.consume(samples.nbytes)
+    assert len(ring) == 0 and ring.free == ring.capacity
+
+
+def test_block_waits_for_the_reader():
+    async def scenario():
+        ring = PcmRing(capacity_frames=2, frame_bytes=4, overflow=BLOCK)
+        await ring.write(frame(1) + frame(2))
+        writer = asyncio.create_task(ring.write(frame(3)))
+        await asyncio.sleep(0.01)
+        assert not writer.done()
+        assert await ring.read() == frame(1) + frame(2)
+        await asyncio.wait_for(writer, 1)
+        assert await ring.read() == frame(3)
+        assert ring.dropped == 0
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_keeps_the_freshest_whole_frames():
+    async def scenario():
+        ring = PcmRing(capacity_frames=2, frame_bytes=4, overflow=DROP_OLDEST)
+        for value in (1, 2, 3):
+            await ring.write(frame(value))
+        assert await ring.read() == frame(2) + frame(3)
+        assert ring.dropped == 4
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_never_overwrites_frames_a_reader_holds():
+    async def scenario():
+        ring = PcmRing(capacity_frames=2, frame_bytes=4, overflow=DROP_OLDEST)
+        await ring.write(frame(1) + frame(2))
+        held = ring.peek()
+        await ring.write(frame(3))  # dropped instead
+        assert bytes(held) == frame(1) + frame(2)
+        assert ring.dropped == 4
+
+    asyncio.run(scenario())
+
+
+def test_drop_newest_discards_what_does_not_fit():
+    async def scenario():
+        ring = PcmRing(capacity_frames=2, frame_bytes=4, overflow=DROP_NEWEST)
+        await ring.write(frame(1))
+        await ring.write(frame(2) + frame(3))
+        assert await ring.read() == frame(1) + frame(2)
+        assert ring.dropped == 4
+
+    asyncio.run(scenario())
+
+
+def test_close_releases_a_blocked_writer_and_drains_the_reader():
+    async def scenario():
+        ring = PcmRing(capacity_frames=1, frame_bytes=4)
+        await ring.write(frame(1))
+        writer = asyncio.create_task(ring.write(frame(2)))
+        await asyncio.sleep(0.01)
+        ring.close()
+        await asyncio.wait_for(writer, 1)
+        assert await ring.read() == frame(1)
+        assert await ring.read() == b""
+        assert not ring.write_nowait(frame(3))
+
+    asyncio.run(scenario())
+
+
+def test_unknown_policy_is_refused():
+    with pytest.raises(ValueError):
+        PcmRing(capacity_frames=1, frame_bytes=4, overflow="bogus")
@@ -0,0 +1,75 @@
+"""KLLSketch and SignedQuantileSketch (app/src/quantile_sketch.py): accuracy, merge, serialize."""
+import random
+
+import numpy as np
+import pytest
+
+from app.src.quantile_sketch import KLLSketch, SignedQuantileSketch
+
+N = 50_000
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    random.seed(0)  # compaction flips coins
+
+
+def values(seed: int, n: int = N) -> np.ndarray:
+    return np.random.default_rng(seed).lognormal(3, 1, n)
+
+
+def sketch_of(data) -> KLLSketch:
+    sketch = KLLSketch()
+    for value in data:
+        sketch.update(float(value))
+    return sketch
+
+
+def max_rank_error(sketch: KLLSketch, data: np.ndarray) -> float:
+    ordered = np.sort(data)
+    probes = np.quantile(ordered, np.linspace(0.01, 0.99, 99))
+    exact = np.searchsorted(ordered, probes, side="right")
+    return max(abs(sketch.rank(p) - e) for p, e in zip(probes, exact)) / len(data)
+
+
+def test_ranks_are_within_one_percent_and_memory_stays_small():
+    data = values(1)
+    sketch = sketch_of(data)
+    assert sketch.n == N
+    assert max_rank_error(sketch, data) < 0.01
+    assert sketch.size < 1000
+    assert sketch.quantile(0.5) == pytest.approx(np.median(data), rel=0.05)
+    assert KLLSketch().quantile(0.5) is None
+
+
+def test_merged_shards_are_as_accurate_as_one_sketch():
+    shards = [values(seed, N // 4) for seed in range(4)]
+    merged = sketch_of(shards[0])
+    for shard in shards[1:]:
+        merged.merge(sketch_of(shard))
+    data = np.concatenate(shards)
+    assert merged.n == len(data)
+    assert max_rank_error(merged, data) < 0.01
+
+
+def test_serialized_sketch_round_trips():
+    sketch = sketch_of(values(2))
+    restored = KLLSketch.from_bytes(sketch.to_bytes())
+    assert (restored.n, restored.k, restored.size) == (sketch.n, sketch.k, sketch.size)
+    assert restored.compactors == sketch.compactors
+    restored.update(1.0)  # and keeps working
+    assert restored.n == sketch.n + 1
+
+
+def test_signed_sketch_replaces_values():
+    sketch = SignedQuantileSketch()
+    for value in range(1, 101):
+        sketch.insert(float(value))
+    sketch.replace(100.0, 1000.0)
+    assert sketch.count == 100
+    assert sketch.percentile_of(50.0) == pytest.approx(50, abs=2)
+    assert sketch.quantile(0.99) >= 99.0
+
+    inserted, retracted = sketch.to_bytes()
+    restored = SignedQuantileSketch.from_bytes(inserted, retracted, sketch.total)
+    assert restored.count == 100 and restored.percentile_of(50.0) == sketch.percentile_of(50.0)
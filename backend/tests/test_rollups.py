@@ -0,0 +1,62 @@
+"""spending_rollups (app/src/rollups.py) kept in step with transactions."""
+import io
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.api.transactions import run_import
+from app.database import SessionLocal, engine
+from app.models.rollup import SpendingRollup
+from app.models.transactions import Transaction
+from app.src.importers import parse_csv
+from app.src.rollups import rebuild_rollups
+
+
+def rollup_rows(user_id: int) -> list[tuple]:
+    with engine.connect() as conn:
+        rows = conn.execute(select(
+            SpendingRollup.category, SpendingRollup.month, SpendingRollup.total, SpendingRollup.count,
+            SpendingRollup.min_amount, SpendingRollup.max_amount, SpendingRollup.sum_squares,
+        ).where(SpendingRollup.user_id == user_id).order_by(SpendingRollup.category, SpendingRollup.month))
+        return [(category, month, round(total, 6), count, low, high, round(squares, 6))
+                for category, month, total, count, low, high, squares in rows]
+
+
+def test_incremental_rollups_equal_a_rebuild_after_adds_edits_deletes_and_an_import(
+    registered_user, add_transactions,
+):
+    user_id, _ = registered_user()
+    rows = add_transactions(user_id, [
+        {"amount": 5, "date": datetime(2026, 1, 3)},
+        {"amount": 12, "date": datetime(2026, 1, 30)},
+        {"amount": 40, "date": datetime(2026, 1, 31, 23, 59), "category": "Shopping"},
+        {"amount": 7, "date": datetime(2026, 2, 1)},
+    ])
+    assert [(category.value, month, count) for category, month, _, count, *_ in rollup_rows(user_id)] == [
+        ("Other", "2026-01", 2), ("Other", "2026-02", 1), ("Shopping", "2026-01", 1),
+    ]
+
+    db = SessionLocal()
+    try:
+        db.get(Transaction, rows[1].id).amount = 3  # the January max leaves the bucket
+        moved = db.get(Transaction, rows[2].id)
+        moved.date, moved.category = datetime(2026, 2, 14), "Other"  # its January bucket empties
+        db.delete(db.get(Transaction, rows[3].id))
+        db.commit()
+    finally:
+        db.close()
+
+    run_import(user_id, parse_csv(io.StringIO(
+        "amount,category,date\n9.5,Other,2026-02-20\n100,Shopping,2025-12-24T10:00:00\n"
+    )))
+    incremental = rollup_rows(user_id)
+
+    with engine.begin() as conn:
+        rebuild_rollups(conn, user_id)
+    assert incremental == rollup_rows(user_id)
+    assert [(category.value, month, total, count, low, high) for category, month, total, count, low, high, _
+            in incremental] == [
+        ("Other", "2026-01", 8, 2, 3, 5),
+        ("Other", "2026-02", 49.5, 2, 9.5, 40),
+        ("Shopping", "2025-12", 100, 1, 100, 100),
+    ]
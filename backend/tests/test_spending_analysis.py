@@ -0,0 +1,72 @@
+"""The token-budgeted narrative prompt (app/ai_services/spending_analysis.py)."""
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.ai_services import spending_analysis
+from app.ai_services.spending_analysis import SpendingSummary, build_prompt, estimate_tokens
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def summary_of(rows) -> SpendingSummary:
+    summary = SpendingSummary()
+    for row in rows:
+        summary.add(*row)
+    return summary
+
+
+def test_the_summary_keeps_totals_outliers_and_week_over_week():
+    monday = datetime(2026, 3, 2, 9)
+    summary = summary_of(
+        [(monday + timedelta(days=day), "Food & Dining", "Cafe", 10.0) for day in range(14)]
+        + [(monday + timedelta(days=3), "Food & Dining", "Steakhouse", 180.0),
+           (monday + timedelta(days=8), "Shopping", None, 45.5)]
+    )
+    assert summary.spending_by_category() == {"Food & Dining": 320.0, "Shopping": 45.5}
+    assert summary.outliers() == [(180.0, "2026-03-05", "Food & Dining", "Steakhouse")]
+
+    text = summary.render(weeks=12, merchants=1, outliers=5)
+    assert "- Food & Dining: 320.00 over 15 transactions (avg 21.33)" in text
+    assert "- week of 2026-03-09: 115.50 (-54%)" in text
+    assert "Top merchants:\n- Steakhouse: 180.00" in text
+    assert "- 2026-03-05 Food & Dining 180.00 at Steakhouse (usual 21.33)" in text
+
+
+def test_a_tight_budget_drops_detail_but_keeps_every_category_total(monkeypatch):
+    rng = random.Random(5)
+    start = datetime(2025, 1, 1)
+    categories = ["Food & Dining", "Shopping", "Transportation", "Entertainment", "Other"]
+    summary = summary_of(
+        (start + timedelta(hours=rng.randrange(24 * 365)), rng.choice(categories), f"Merchant {rng.randrange(400)}",
+         round(rng.lognormvariate(3, 1), 2))
+        for _ in range(20_000)
+    )
+    fixed = estimate_tokens(build_prompt(SpendingSummary(), [], None, "year"))
+
+    for summary_budget, level in [(10_000, (12, 10, 5)), (260, (8, 5, 3)), (120, (2, 0, 0)), (1, (0, 0, 0))]:
+        monkeypatch.setattr(settings, "NARRATIVE_PROMPT_TOKEN_BUDGET", fixed + summary_budget)
+        prompt = build_prompt(summary, [], None, "year")
+        assert summary.render(*level) in prompt
+        for category, total in summary.spending_by_category().items():
+            assert f"- {category}: {total:.2f} over" in prompt
+
+
+def test_the_route_streams_the_window_into_the_prompt(client, registered_user, add_transactions, monkeypatch):
+    prompts = []
+
+    async def generate_text(prompt):
+        prompts.append(prompt)
+        return SimpleNamespace(text='{"narrative": "ok", "key_insights": [], "recommendations": []}')
+
+    monkeypatch.setattr(spending_analysis, "generate_text", generate_text)
+    user_id, headers = registered_user()
+    now = datetime.utcnow()
+    add_transactions(user_id, [
+        {"amount": 5, "date": now - timedelta(days=day), "merchant": f"Shop {day % 7}"} for day in range(20)
+    ] + [{"amount": 999, "date": now - timedelta(days=60)}])  # before the month window
+
+    response = client.post("/insights/narrative", json={"time_period": "month"}, headers=headers)
+    assert response.json()["spending_by_category"] == {"Other": 100.0}
+    assert "- Other: 100.00 over 20 transactions (avg 5.00)" in prompts[0]
@@ -0,0 +1,45 @@
+"""GET /transactions keyset pagination (app/api/transactions.py)."""
+import base64
+from datetime import datetime
+
+
+def all_pages(client, headers, **params) -> list[list[dict]]:
+    pages = []
+    while True:
+        page = client.get("/transactions", params=params, headers=headers).json()
+        pages.append(page["items"])
+        if page["next_cursor"] is None:
+            return pages
+        params = {**params, "cursor": page["next_cursor"]}
+
+
+def test_pages_walk_every_row_newest_first_and_ties_on_date_break_by_id(
+    client, registered_user, add_transactions,
+):
+    user_id, headers = registered_user()
+    same_day = datetime(2026, 3, 14, 12, 0)
+    rows = add_transactions(user_id, [
+        {"amount": 1, "date": datetime(2026, 3, 1)},
+        {"amount": 2, "date": same_day, "category": "Shopping"},
+        {"amount": 3, "date": same_day},
+        {"amount": 4, "date": datetime(2026, 3, 20), "category": "Shopping"},
+        {"amount": 5, "date": same_day, "category": "Shopping"},
+        {"amount": 6, "date": datetime(2026, 2, 2)},
+        {"amount": 7, "date": same_day},
+    ])
+    newest_first = sorted(rows, key=lambda t: (t.date, t.id), reverse=True)
+
+    pages = all_pages(client, headers, limit=2)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    assert [t["id"] for page in pages for t in page] == [t.id for t in newest_first]
+
+    # a page boundary inside the same-day run, with a filter on
+    pages = all_pages(client, headers, limit=1, category="Shopping")
+    assert [t["amount"] for page in pages for t in page] == [4, 5, 2]
+
+
+def test_a_cursor_that_does_not_decode_is_a_400(client, registered_user):
+    _, headers = registered_user()
+    for cursor in ["not a cursor", base64.urlsafe_b64encode(b"2026-03-14|seven").decode(), "//8="]:
+        response = client.get("/transactions", params={"cursor": cursor}, headers=headers)
+        assert (response.status_code, response.json()["detail"]) == (400, "Invalid cursor")
@@ -0,0 +1,62 @@
+"""TTLCache (app/src/ttl_cache.py) and the caches built on it."""
+import time
+
+from app.src.narrative_cache import NarrativeCache
+from app.src.principal_cache import AuthenticatedUser, PrincipalCache
+from app.src.ttl_cache import TTLCache
+
+
+def user(user_id: int) -> AuthenticatedUser:
+    return AuthenticatedUser(
+        id=user_id, firstname="Test", lastname="User", email=f"{user_id}@example.com", income_range=None, goals=None,
+    )
+
+
+def test_least_recently_used_entries_go_first():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts b, a was just used
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats() == {"size": 2, "hits": 3, "misses": 1}
+
+
+def test_expired_entries_miss_and_are_swept_on_put():
+    cache = TTLCache(max_entries=10, ttl=0.01)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    cache.put("c", 3)
+    assert cache.stats()["size"] == 1
+
+    long = TTLCache(max_entries=10, ttl=60)
+    long.put("short", 1, ttl=0.01)
+    long.put("capped", 2, ttl=3600)  # never past the cache's own ttl
+    time.sleep(0.02)
+    assert long.get("short") is None and long._entries["capped"][0] <= time.monotonic() + 60
+
+
+def test_principal_cache_keeps_its_per_user_index_in_step():
+    cache = PrincipalCache(max_entries=2, ttl=60)
+    cache.put("t1", user(1))
+    cache.put("t2", user(1))
+    cache.put("t3", user(2))  # evicts t1
+    assert cache._tokens_by_user == {1: {"t2"}, 2: {"t3"}}
+    cache.invalidate_user(1)
+    assert cache.get("t2") is None and cache.get("t3") == user(2)
+
+    cache.put("expired", user(3), token_exp=time.time() - 1)
+    assert cache.get("expired") is None and 3 not in cache._tokens_by_user
+    cache.clear()
+    assert cache._tokens_by_user == {} and cache.stats()["size"] == 0
+
+
+def test_narrative_cache_invalidates_one_users_entries():
+    cache = NarrativeCache(max_entries=10, ttl=60)
+    cache.put((1, "month", "f1"), {"narrative": "a"})
+    cache.put((1, "year", "f2"), {"narrative": "b"})
+    cache.put((2, "month", "f3"), {"narrative": "c"})
+    cache.invalidate_user(1)
+    assert cache.stats()["size"] == 1 and cache.get((2, "month", "f3")) == {"narrative": "c"}
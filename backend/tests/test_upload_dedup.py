@@ -0,0 +1,50 @@
+"""Retried /voice/upload requests (app/src/upload_dedup.py): answered once, never saved twice."""
+import struct
+
+
+def upload(client, headers, data: bytes, **extra_headers):
+    return client.post(
+        "/voice/upload", files={"file": ("note.wav", data, "audio/wav")}, headers={**headers, **extra_headers},
+    )
+
+
+def rewrapped(data: bytes) -> bytes:
+    """The same recording with a LIST chunk before the data, like a client writing metadata per attempt."""
+    info = b"LIST" + struct.pack("<I", 12) + b"INFOattempt2"
+    body = data[8:36] + info + data[36:]
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def result(client, headers, job_id: int) -> dict:
+    return client.get(f"/jobs/{job_id}/result", params={"wait": 10}, headers=headers).json()
+
+
+def test_the_same_file_or_idempotency_key_gets_the_first_job(client, auth_headers, speech_wav, fake_extraction):
+    headers = auth_headers()
+    first = upload(client, headers, speech_wav(10), **{"Idempotency-Key": "note-1"}).json()
+    result(client, headers, first["id"])
+
+    again = upload(client, headers, speech_wav(10))
+    assert again.status_code == 200 and again.headers["Idempotent-Replayed"] == "true"
+    assert again.json()["id"] == first["id"]
+    by_key = upload(client, headers, speech_wav(11), **{"Idempotency-Key": "note-1"})
+    assert by_key.json()["id"] == first["id"]
+
+    other_headers = auth_headers()
+    other_user = upload(client, other_headers, speech_wav(10))
+    assert other_user.status_code == 202 and other_user.json()["id"] != first["id"]
+    result(client, other_headers, other_user.json()["id"])
+    assert len(client.get("/transactions", headers=headers).json()["items"]) == 1
+    assert len(fake_extraction.calls) == 2  # the first upload and the other user's
+
+
+def test_the_same_recording_in_another_file_is_not_saved_twice(client, auth_headers, speech_wav, fake_extraction):
+    headers = auth_headers()
+    first = upload(client, headers, speech_wav(12)).json()
+    saved = result(client, headers, first["id"])["transactions"]
+
+    retry = upload(client, headers, rewrapped(speech_wav(12)))
+    assert retry.status_code == 202 and retry.json()["id"] != first["id"]  # the file differs
+    assert result(client, headers, retry.json()["id"])["transactions"] == saved
+    assert len(client.get("/transactions", headers=headers).json()["items"]) == len(saved)
+    assert len(fake_extraction.calls) == 1  # the retry never reached the model
@@ -0,0 +1,114 @@
+"""The realtime voice session: its add_to_database tool and the /voice/realtime session count."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.ai_services import voice
+from app.ai_services.voice import settings as voice_settings, voice_tools
+from app.api import voice as voice_api
+from app.src.llm_caller import AudioSession
+
+
+def token(headers: dict) -> str:
+    return headers["Authorization"].removeprefix("Bearer ")
+
+
+@pytest.mark.parametrize("amount", [-5, 0, "lots"])
+def test_model_arguments_are_validated_before_saving(amount):
+    result = asyncio.run(voice_tools(1)["add_to_database"](amount=amount, category="Groceries"))
+    assert result["error"].startswith("Not saved (amount")
+
+
+def test_implausible_amounts_are_sent_back_for_confirmation():
+    add = voice_tools(1)["add_to_database"]
+    result = asyncio.run(add(amount=voice_settings.VOICE_MAX_AMOUNT + 1))
+    assert "confirm the amount" in result["error"]
+
+
+def test_valid_arguments_are_saved(client, auth_headers):
+    headers = auth_headers()
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    result = asyncio.run(voice_tools(user_id)["add_to_database"](amount=4.5, category="Nonsense", description="Bakery"))
+    assert result["status"] == "saved" and result["category"] == "Other"
+    listed = client.get("/transactions", headers=headers).json()["items"]
+    assert [(item["id"], item["merchant"]) for item in listed] == [(result["transaction_id"], "Bakery")]
+
+
+def test_concurrent_tool_calls_share_a_group_commit_and_one_reply_per_turn(client, registered_user, monkeypatch):
+    commits = []
+
+    def commit_transactions(transactions):
+        commits.append(len(transactions))
+        return original(transactions)
+
+    original = voice._commit_transactions
+    monkeypatch.setattr(voice, "_commit_transactions", commit_transactions)
+    monkeypatch.setattr(voice, "_voice_writes", asyncio.Lock())  # not bound to another test's loop
+
+    class Live:
+        def __init__(self):
+            self.replies = []
+
+        async def send_tool_response(self, function_responses):
+            self.replies.append(function_responses)
+
+    def call(call_id, amount, description, name="add_to_database"):
+        return SimpleNamespace(id=call_id, name=name, args={"amount": amount, "category": "Food & Dining",
+                                                            "description": description})
+
+    async def turn(user_id, live, events, prefix):
+        async def output(event):
+            events.append(event)
+
+        session = AudioSession(None, voice_tools(user_id), output=output)
+        await session.handle_tool_call(live, [
+            call(f"{prefix}1", 4.5, "Coffee"), call(f"{prefix}2", -1, "Refund"),
+            call(f"{prefix}3", 2.8, "Bus"), call(f"{prefix}4", 1, "Oops", name="delete_everything"),
+            call(f"{prefix}5", 12, "Lunch"),
+        ])
+
+    users = [registered_user(), registered_user()]
+    lives, events = [Live(), Live()], [[], []]
+
+    async def main():
+        await asyncio.gather(*(
+            turn(user_id, live, sink, prefix)
+            for (user_id, _), live, sink, prefix in zip(users, lives, events, "ab")
+        ))
+
+    asyncio.run(main())
+    # every call queues its row before the first flush runs: both turns, one commit
+    assert commits == [6]
+    for (_, headers), live, sink, prefix in zip(users, lives, events, "ab"):
+        [reply] = live.replies
+        assert [response["id"] for response in reply] == [f"{prefix}{i}" for i in range(1, 6)]
+        assert [response["response"].get("status") for response in reply] == ["saved", None, "saved", None, "saved"]
+        assert [event["type"] for event in sink] == ["tool_result"] * 5
+        listed = client.get("/transactions", headers=headers).json()["items"]
+        assert sorted(item["id"] for item in listed) == sorted(
+            response["response"]["transaction_id"] for response in reply if "transaction_id" in response["response"]
+        )
+
+
+def test_a_session_that_fails_to_start_is_not_left_counted(client, auth_headers, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError("overflow must be one of block, drop_oldest, drop_newest")
+
+    monkeypatch.setattr(voice_api, "get_live_client", lambda: None)
+    monkeypatch.setattr(voice_api, "AudioSession", broken)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            with client.websocket_connect(f"/voice/realtime?token={token(auth_headers())}") as websocket:
+                websocket.receive_text()
+    assert voice_api.open_sessions == 0
+
+
+def test_sessions_past_the_cap_are_refused(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(voice_api.settings, "VOICE_MAX_SESSIONS", 0)
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect(f"/voice/realtime?token={token(auth_headers())}"):
+            pass
+    assert refused.value.code == 1013
+    assert voice_api.open_sessions == 0
@@ -0,0 +1,73 @@
+"""Voice upload extraction: llm_caller.extract_expenses and what process_voice_input saves from it."""
+import asyncio
+import io
+import wave
+from types import SimpleNamespace
+
+from app.schemas.voice import VoiceExtraction
+from app.src import llm_caller
+
+
+def upload_result(client, headers, data: bytes):
+    job = client.post("/voice/upload", files={"file": ("note.wav", data, "audio/wav")}, headers=headers).json()
+    return client.get(f"/jobs/{job['id']}/result", params={"wait": 10}, headers=headers)
+
+
+def test_the_speech_goes_to_the_model_as_one_wav_and_the_answer_is_parsed(monkeypatch):
+    sent = {}
+
+    async def generate_content(model, contents, config):
+        sent.update(model=model, contents=contents, config=config)
+        text = '{"transcription": "bus 2.80", "expenses": [{"amount": 2.8, "category": "Transportation"}], ' \
+               '"confidence": 0.8}'
+        return SimpleNamespace(text=text, usage_metadata=None)
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    monkeypatch.setattr(llm_caller, "get_client", lambda: client)
+    pcm = bytes(range(256)) * 10
+
+    extraction = asyncio.run(llm_caller.extract_expenses(pcm))
+    assert extraction.expenses[0].amount == 2.8 and extraction.expenses[0].description is None
+    prompt, audio = sent["contents"]
+    assert prompt == llm_caller.EXTRACTION_PROMPT and audio.inline_data.mime_type == "audio/wav"
+    with wave.open(io.BytesIO(audio.inline_data.data)) as wav:
+        assert (wav.getframerate(), wav.getnchannels(), wav.readframes(wav.getnframes())) == (16000, 1, pcm)
+    assert sent["config"].response_schema is VoiceExtraction
+
+
+def test_every_valid_expense_is_saved_and_the_rest_dropped(client, auth_headers, speech_wav, fake_extraction):
+    fake_extraction.reply = VoiceExtraction(transcription="coffee 4.50, bus 2.80 and a million on a yacht", expenses=[
+        {"amount": 4.5, "category": "Food & Dining", "description": "Coffee"},
+        {"amount": 2.8, "category": "Bus", "description": "Bus ticket"},  # unknown category: Other
+        {"amount": 1_000_000, "category": "Travel", "description": "Yacht"},  # over VOICE_MAX_AMOUNT
+        {"amount": -3, "category": "Other"},
+    ], confidence=0.7)
+    headers = auth_headers()
+    result = upload_result(client, headers, speech_wav(20)).json()
+
+    assert result["transcription"].startswith("coffee") and result["confidence"] == 0.7
+    assert [(t["merchant"], t["category"], t["amount"]) for t in result["transactions"]] == [
+        ("Coffee", "Food & Dining", 4.5), ("Bus ticket", "Other", 2.8),
+    ]
+    assert result["transaction"] == result["transactions"][0]
+    # the speech only: 1.5 s of it plus the padding, not the 4 s file
+    assert 1.5 * 32000 <= len(fake_extraction.calls[0]) <= 2.5 * 32000
+
+
+def test_nothing_to_save_or_a_failed_call_is_an_error_and_the_retry_asks_again(
+    client, auth_headers, speech_wav, fake_extraction,
+):
+    headers = auth_headers()
+    fake_extraction.reply = VoiceExtraction(transcription="what did I spend last week?", expenses=[], confidence=1)
+    response = upload_result(client, headers, speech_wav(21))
+    assert (response.status_code, response.json()["detail"]) == (422, "No expense found in the recording")
+
+    fake_extraction.reply = TimeoutError()
+    response = upload_result(client, headers, speech_wav(22))
+    assert (response.status_code, response.json()["detail"]) == (502, "Voice model unavailable, try again")
+
+    fake_extraction.reply = VoiceExtraction(
+        transcription="lunch 12", expenses=[{"amount": 12, "category": "Food & Dining"}], confidence=1,
+    )
+    assert upload_result(client, headers, speech_wav(22)).status_code == 200
+    assert len(fake_extraction.calls) == 3